@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""Micro-benchmark of the SHA512-CRYPT backends used by password_sync_with_postfix.py.
+
+Times one hash per backend at the rounds used in postfix-accounts.cf:
+
+  builtin          sha512_crypt_builtin (hashlib only)
+  crypt            stdlib crypt module / libc (removed in Python 3.13)
+  passlib-os       passlib with its os_crypt backend
+  passlib-builtin  passlib's own pure-Python backend
+
+Backends that are not installed are reported as skipped. With --check the
+built-in engine is first verified against the existing entries in
+postfix-accounts.cf using the passwords from .env.
+
+    python3 bench/bench_sha512_crypt.py --rounds 656000 --repeat 3 --check
+"""
+import argparse
+import pathlib
+import sys
+import time
+import warnings
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import password_sync_with_postfix as sync  # noqa: E402
+
+PASSWORD = "ParolParolParol2025!"
+SALT = "JpYCDVgNE5gpU12N"
+
+
+def backends():
+    """(name, callable(password, setting) or None, reason if skipped)"""
+    yield "builtin", sync.sha512_crypt_builtin, ""
+
+    crypt = sync._os_crypt()
+    yield "crypt", crypt.crypt if crypt else None, "no crypt module with SHA512"
+
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            from passlib.hash import sha512_crypt
+    except ImportError:
+        yield "passlib-os", None, "passlib not installed"
+        yield "passlib-builtin", None, "passlib not installed"
+        return
+    for backend in ("os_crypt", "builtin"):
+        name = "passlib-os" if backend == "os_crypt" else "passlib-builtin"
+        if not sha512_crypt.has_backend(backend):
+            yield name, None, f"passlib backend {backend} unavailable"
+            continue
+
+        def run(password, setting, backend=backend):
+            sha512_crypt.set_backend(backend)
+            rounds = int(setting.split("rounds=", 1)[1].split("$", 1)[0])
+            salt = setting.rsplit("$", 1)[1]
+            return sha512_crypt.using(rounds=rounds, salt=salt).hash(password)
+
+        yield name, run, ""
+
+
+def check_repo() -> bool:
+    env = sync.load_dotenv(ROOT / ".env")
+    accounts = ROOT / "srv_mailcow" / "config" / "postfix-accounts.cf"
+    ok = True
+    for email, rest in sync.parse_accounts(accounts.read_text(encoding="utf-8").splitlines()):
+        pw = env.get(sync.env_key_for_email(email)) if email else None
+        stored = rest.split("|", 1)[0] if email else ""
+        if not pw or not stored.startswith("{SHA512-CRYPT}"):
+            continue
+        hashed = stored[len("{SHA512-CRYPT}"):]
+        match = sync.sha512_crypt_builtin(pw, hashed) == hashed
+        ok &= match
+        print(f"# {email:<32} {'match' if match else 'MISMATCH'}", file=sys.stderr)
+    return ok
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rounds", type=int, default=656000)
+    parser.add_argument("--repeat", type=int, default=3, help="runs per backend; the best one is reported")
+    parser.add_argument("--check", action="store_true", help="verify the built-in engine against postfix-accounts.cf")
+    args = parser.parse_args()
+
+    if args.check and not check_repo():
+        return 1
+
+    setting = f"$6$rounds={args.rounds}${SALT}"
+    expected = sync.sha512_crypt_builtin(PASSWORD, setting)
+    results = []
+    print(f"{'backend':<16} {'best':>9} {'hashes/s':>9} {'vs builtin':>11}")
+    for name, fn, reason in backends():
+        if fn is None:
+            print(f"{name:<16} {'skipped':>9}  ({reason})")
+            continue
+        best = float("inf")
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            out = fn(PASSWORD, setting)
+            best = min(best, time.perf_counter() - started)
+        if out != expected:
+            print(f"{name:<16} output differs from builtin: {out}", file=sys.stderr)
+            return 1
+        results.append((name, best))
+        base = results[0][1]
+        print(f"{name:<16} {best:>8.3f}s {1 / best:>9.2f} {base / best:>10.2f}x", flush=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""End-to-end benchmark of the CSV translation pipeline (translation.Pipeline).
+
+Each configuration gets a fresh translate_standin.py server (in a thread),
+a fresh cache and a copy of mitre_technics.csv, optionally repeated --scale
+times with distinct IDs. It is translated twice: cold (empty cache) and warm
+(same cache, untranslated input again).
+
+  deep_translator  DeepTranslatorBackend against the stand-in's /m page
+                   (skipped when deep_translator is not installed)
+  rest-serial      GoogleRestBackend, one string per request, one worker:
+                   the request pattern of the original translate_rest.py
+  rest-concurrent  one string per request on --workers threads
+  rest-batched     batched requests on --workers threads
+
+Every run reports wall time, rows/s, strings sent, requests seen by the
+stand-in (including 429/503 answers) and client retries.
+
+    python3 bench/bench_translate.py --latency 0.05 --rate 10 --server-rate 20 --fail 0.02
+"""
+import argparse
+import contextlib
+import csv
+import io
+import json
+import pathlib
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+
+HERE = pathlib.Path(__file__).resolve().parent
+ROOT = HERE.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(HERE))
+
+import translation  # noqa: E402
+import translate_standin  # noqa: E402
+
+COLUMNS = [('название', 'name', 'whole'), ('описание', 'description', 'sentences'), ('тактики', 'tactics', 'list')]
+FIELDNAMES = ['ID', 'название', 'описание', 'тактики', 'platforms']
+CONFIGS = ('deep_translator', 'rest-serial', 'rest-concurrent', 'rest-batched')
+
+
+def make_input(path: pathlib.Path, scale: int):
+    """Write mitre_technics.csv repeated scale times (IDs suffixed .1, .2, ...)."""
+    with open(ROOT / 'mitre_technics.csv', encoding='utf-8-sig', newline='') as src:
+        rows = list(csv.DictReader(src, delimiter=';'))
+    with open(path, 'w', encoding='utf-8-sig', newline='') as out:
+        writer = csv.DictWriter(out, delimiter=';', fieldnames=FIELDNAMES, extrasaction='ignore')
+        writer.writeheader()
+        for k in range(scale):
+            for row in rows:
+                writer.writerow(dict(row, ID=row['ID'] if k == 0 else f"{row['ID']}.{k}"))
+    return len(rows) * scale
+
+
+def make_backend(config: str, base: str, workers: int):
+    if config == 'deep_translator':
+        try:
+            backend = translation.DeepTranslatorBackend('en', 'ru', base_url=base + '/m')
+        except ImportError:
+            return None
+        backend.name = 'standin-deep'
+        return backend
+    backend = translation.GoogleRestBackend('en', 'ru', url=base + '/translate_a/single', name='standin',
+                                            workers=workers)
+    if config != 'rest-batched':
+        backend.max_batch_strings = 1
+    return backend
+
+
+def stand_in_stats(base: str) -> dict:
+    with urllib.request.urlopen(base + '/stats', timeout=5) as resp:
+        return json.load(resp)
+
+
+def run_config(config: str, args, workdir: pathlib.Path):
+    srv = translate_standin.make_server(port=0, latency=args.latency, jitter=args.jitter, rate=args.server_rate,
+                                        fail=args.fail, garble=args.garble)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    base = f'http://127.0.0.1:{srv.server_address[1]}'
+    workers = 1 if config == 'rest-serial' else args.workers
+    backend = make_backend(config, base, workers)
+    if backend is None:
+        srv.shutdown()
+        return [{'config': config, 'skipped': 'deep_translator not installed'}]
+
+    cache = translation.TranslationCache(workdir / f'{config}.sqlite3')
+    results = []
+    try:
+        for phase in ('cold', 'warm'):
+            csv_path = workdir / f'{config}-{phase}.csv'
+            rows = make_input(csv_path, args.scale)
+            before = stand_in_stats(base)
+            retries = translation.retries_done
+            pipeline = translation.Pipeline(backend, cache, COLUMNS, translation.TokenBucket(args.rate, args.burst),
+                                            workers)
+            started = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                pipeline.run(csv_path, FIELDNAMES)
+            wall = time.perf_counter() - started
+            after = stand_in_stats(base)
+            seen = {k: after[k] - before[k] for k in after}
+            results.append({
+                'config': config,
+                'phase': phase,
+                'rows': rows,
+                'wall_s': round(wall, 2),
+                'rows_per_s': round(rows / wall, 1),
+                'segments': pipeline.stats['segments'],
+                'sent': pipeline.stats['sent'],
+                'requests': seen['requests'],
+                '429': seen['429'],
+                '503': seen['503'],
+                'retries': translation.retries_done - retries,
+                'fallbacks': pipeline.stats['fallbacks'],
+                'failed': pipeline.stats['failed'],
+            })
+    finally:
+        backend.close()
+        cache.close()
+        srv.shutdown()
+        srv.server_close()
+    return results
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--configs', default=','.join(CONFIGS), help='comma-separated subset of ' + ', '.join(CONFIGS))
+    parser.add_argument('--scale', type=int, default=1, help='repeat the catalog this many times')
+    parser.add_argument('--workers', type=int, default=translation.WORKERS)
+    parser.add_argument('--rate', type=float, default=translation.RATE, help='client token bucket, requests/s')
+    parser.add_argument('--burst', type=int, default=translation.BURST)
+    parser.add_argument('--latency', type=float, default=0.05, help='stand-in seconds per request')
+    parser.add_argument('--jitter', type=float, default=0.0)
+    parser.add_argument('--server-rate', type=float, default=0.0, help='stand-in requests/s before 429, 0 for none')
+    parser.add_argument('--fail', type=float, default=0.0, help='stand-in 503 probability')
+    parser.add_argument('--garble', type=float, default=0.0, help='stand-in probability of merging batch lines')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json', help='also write all results to this file')
+    args = parser.parse_args()
+    random.seed(args.seed)
+
+    print(f"{'config':<16} {'phase':<5} {'rows':>6} {'wall':>8} {'rows/s':>8} {'sent':>6} {'requests':>8} "
+          f"{'429':>5} {'503':>5} {'retries':>7} {'fallbk':>6} {'failed':>6}")
+    all_results = []
+    workdir = pathlib.Path(tempfile.mkdtemp(prefix='bench_translate_'))
+    try:
+        for config in [c.strip() for c in args.configs.split(',') if c.strip()]:
+            if config not in CONFIGS:
+                parser.error(f'unknown config {config!r}')
+            for r in run_config(config, args, workdir):
+                all_results.append(r)
+                if 'skipped' in r:
+                    print(f"{config:<16} skipped ({r['skipped']})", flush=True)
+                    continue
+                print(f"{r['config']:<16} {r['phase']:<5} {r['rows']:>6} {r['wall_s']:>7.2f}s {r['rows_per_s']:>8.1f} "
+                      f"{r['sent']:>6} {r['requests']:>8} {r['429']:>5} {r['503']:>5} {r['retries']:>7} "
+                      f"{r['fallbacks']:>6} {r['failed']:>6}", flush=True)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    if args.json:
+        pathlib.Path(args.json).write_text(json.dumps(all_results, indent=2) + '\n', encoding='utf-8')
+    return 0 if all(r.get('failed', 0) == 0 for r in all_results) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
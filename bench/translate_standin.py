@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""Local stand-in for the Google translation endpoints used by translation.py.
+
+Lets translate_mitre.py / translate_rest.py (TRANSLATE_BACKEND=standin) and
+bench_translate.py run offline. The "translation" is deterministic: every
+line of q gets a "[<tl>] " prefix.
+
+  GET /translate_a/single?sl=..&tl=..&q=..  gtx JSON, one chunk per sentence
+  GET /m?sl=..&tl=..&q=..                   HTML page as scraped by deep_translator
+  GET /stats                                request counters as JSON
+
+Simulated trouble:
+  --latency/--jitter  seconds added to every request
+  --rate              requests/s the server accepts (burst of the same size);
+                      beyond that it answers 429 with Retry-After: 1
+  --fail              probability of a 503
+  --garble            probability of merging two lines of a multi-line reply,
+                      which makes batch splitting ambiguous
+
+    python3 bench/translate_standin.py --port 8765 --latency 0.05 --rate 20 --fail 0.02
+"""
+import argparse
+import html
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+class Limiter:
+    """Server-side token bucket; take() is False when the client is over the rate."""
+
+    def __init__(self, rate):
+        self.rate = rate
+        self.tokens = rate
+        self.stamp = time.monotonic()
+        self.lock = threading.Lock()
+
+    def take(self):
+        if self.rate <= 0:
+            return True
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.rate, self.tokens + (now - self.stamp) * self.rate)
+            self.stamp = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            return False
+
+
+def fake_translate(q, tl):
+    return "\n".join(f"[{tl}] {line}" if line.strip() else line for line in q.split("\n"))
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, so pooled sessions are measurable
+    server_version = "translate-standin"
+
+    def log_message(self, fmt, *args):
+        if self.server.verbose:
+            super().log_message(fmt, *args)
+
+    def reply(self, status, body, ctype, headers=()):
+        data = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(data)))
+        for key, value in headers:
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def count(self, key, n=1):
+        with self.server.stats_lock:
+            self.server.stats[key] += n
+
+    def do_GET(self):
+        srv = self.server
+        url = urlparse(self.path)
+        if url.path == "/stats":
+            with srv.stats_lock:
+                return self.reply(200, json.dumps(srv.stats), "application/json")
+        if url.path not in ("/translate_a/single", "/m"):
+            return self.reply(404, "not found", "text/plain")
+
+        params = parse_qs(url.query)
+        q = params.get("q", [""])[0]
+        tl = params.get("tl", ["ru"])[0]
+        self.count("requests")
+        self.count("strings", q.count("\n") + 1)
+        time.sleep(max(0.0, srv.latency + random.uniform(-srv.jitter, srv.jitter)))
+        if not srv.limiter.take():
+            self.count("429")
+            return self.reply(429, "Too Many Requests", "text/plain", [("Retry-After", "1")])
+        if random.random() < srv.fail:
+            self.count("503")
+            return self.reply(503, "Service Unavailable", "text/plain")
+
+        out = fake_translate(q, tl)
+        if "\n" in out and random.random() < srv.garble:
+            self.count("garbled")
+            out = out.replace("\n", " ", 1)
+        self.count("ok")
+        if url.path == "/m":
+            page = f'<html><body><div class="result-container">{html.escape(out)}</div></body></html>'
+            return self.reply(200, page, "text/html; charset=utf-8")
+        sentences = out.split(". ")
+        chunks = [[s + (". " if i < len(sentences) - 1 else ""), "", None, None, 1] for i, s in enumerate(sentences)]
+        return self.reply(200, json.dumps([chunks, None, params.get("sl", ["en"])[0]]), "application/json")
+
+
+def make_server(host="127.0.0.1", port=8765, latency=0.0, jitter=0.0, rate=0.0, fail=0.0, garble=0.0, verbose=False):
+    srv = ThreadingHTTPServer((host, port), Handler)
+    srv.daemon_threads = True
+    srv.latency, srv.jitter, srv.fail, srv.garble, srv.verbose = latency, jitter, fail, garble, verbose
+    srv.limiter = Limiter(rate)
+    srv.stats = dict.fromkeys(("requests", "strings", "ok", "429", "503", "garbled"), 0)
+    srv.stats_lock = threading.Lock()
+    return srv
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds per request")
+    parser.add_argument("--jitter", type=float, default=0.0, help="+/- seconds of random latency")
+    parser.add_argument("--rate", type=float, default=0.0, help="accepted requests/s, 0 for unlimited")
+    parser.add_argument("--fail", type=float, default=0.0, help="probability of a 503")
+    parser.add_argument("--garble", type=float, default=0.0, help="probability of merging lines of a batch reply")
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("-v", "--verbose", action="store_true", help="log every request")
+    args = parser.parse_args()
+    if args.seed is not None:
+        random.seed(args.seed)
+    srv = make_server(args.host, args.port, args.latency, args.jitter, args.rate, args.fail, args.garble, args.verbose)
+    print(f"translate stand-in on http://{args.host}:{srv.server_address[1]}", flush=True)
+    try:
+        srv.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,20 @@
 #!/usr/bin/env python3
+import argparse
+import csv
+import hashlib
+import heapq
+import hmac
+import json
 import os
 import re
+import secrets
 import sys
+import tempfile
+import time
+import warnings
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import Dict, List, Tuple
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
 
 
 def load_dotenv(path: Path) -> Dict[str, str]:
@@ -28,35 +39,232 @@ def load_dotenv(path: Path) -> Dict[str, str]:
     return env
 
 
+_CRYPT_B64 = "./0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz"
+# Byte order of the final digest in the "$6$" encoding, three bytes per 4 chars
+_SHA512_CRYPT_ORDER = (
+    (0, 21, 42), (22, 43, 1), (44, 2, 23), (3, 24, 45), (25, 46, 4), (47, 5, 26), (6, 27, 48),
+    (28, 49, 7), (50, 8, 29), (9, 30, 51), (31, 52, 10), (53, 11, 32), (12, 33, 54), (34, 55, 13),
+    (56, 14, 35), (15, 36, 57), (37, 58, 16), (59, 17, 38), (18, 39, 60), (40, 61, 19), (62, 20, 41),
+)
+ROUNDS_DEFAULT = 5000  # implied when a hash has no "rounds=" field
+
+
+def _sha512_crypt_digest(password: bytes, salt: bytes, rounds: int) -> bytes:
+    """
+    Raw 64-byte SHA512-crypt digest (Drepper's spec) on top of hashlib.
+    The rounds loop only concatenates C with one of 42 precomputed byte
+    strings, and handles rounds in even/odd pairs so each pair costs two
+    hashlib calls and two small allocations.
+    """
+    sha512 = hashlib.sha512
+    plen = len(password)
+
+    b = sha512(password + salt + password).digest()
+    a = sha512(password + salt)
+    n = plen
+    while n > 64:
+        a.update(b)
+        n -= 64
+    a.update(b[:n])
+    n = plen
+    while n:
+        a.update(b if n & 1 else password)
+        n >>= 1
+    c = a.digest()
+
+    p = (sha512(password * plen).digest() * (plen // 64 + 1))[:plen]
+    s = sha512(salt * (16 + c[0])).digest()[:len(salt)]
+
+    # Round r hashes (P or C) [+ S if r % 3] [+ P if r % 7] + (C or P); the pattern repeats every 42 rounds
+    mid = [(s if r % 3 else b"") + (p if r % 7 else b"") for r in range(42)]
+    odd_prefix = [p + m for m in mid]
+    even_suffix = [m + p for m in mid]
+    pairs = [(even_suffix[r], odd_prefix[r + 1]) for r in range(0, 42, 2)]
+
+    full, rest = divmod(rounds, 42)
+    for _ in range(full):
+        for suffix, prefix in pairs:
+            c = sha512(prefix + sha512(c + suffix).digest()).digest()
+    for r in range(full * 42, rounds):
+        i = r % 42
+        c = sha512(odd_prefix[i] + c).digest() if r & 1 else sha512(c + even_suffix[i]).digest()
+    return c
+
+
+def _crypt_b64(digest: bytes) -> str:
+    out = []
+    for i, j, k in _SHA512_CRYPT_ORDER:
+        w = (digest[i] << 16) | (digest[j] << 8) | digest[k]
+        for _ in range(4):
+            out.append(_CRYPT_B64[w & 0x3F])
+            w >>= 6
+    w = digest[63]
+    out.append(_CRYPT_B64[w & 0x3F])
+    out.append(_CRYPT_B64[w >> 6])
+    return "".join(out)
+
+
+def sha512_crypt_builtin(password: str, setting: str) -> str:
+    """
+    crypt(3) for "$6$" settings or full hashes, without passlib or crypt:
+    "$6$[rounds=N$]salt[$...]" -> "$6$[rounds=N$]salt$<hash>".
+    """
+    if not setting.startswith("$6$"):
+        raise ValueError("not a SHA512-CRYPT setting")
+    fields = setting[3:].split("$")
+    rounds = ROUNDS_DEFAULT
+    prefix = "$6$"
+    if fields[0].startswith("rounds="):
+        rounds = min(max(int(fields.pop(0)[len("rounds="):]), 1000), 999999999)
+        prefix += f"rounds={rounds}$"
+    salt = fields[0][:16] if fields else ""
+    digest = _sha512_crypt_digest(password.encode("utf-8"), salt.encode("utf-8"), rounds)
+    return f"{prefix}{salt}${_crypt_b64(digest)}"
+
+
+def _os_crypt():
+    """The stdlib crypt module if it exists here and does SHA512 (gone in Python 3.13)."""
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", DeprecationWarning)
+            import crypt  # type: ignore
+    except ImportError:
+        return None
+    return crypt if getattr(crypt, "METHOD_SHA512", None) in getattr(crypt, "methods", ()) else None
+
+
 def sha512_crypt_hash(password: str, rounds: int = 656000) -> str:
     """
     Returns a string like "$6$rounds=656000$<salt>$<hash>" using SHA512-CRYPT.
     Prefixed with {SHA512-CRYPT} by caller when writing to postfix file.
-    Tries passlib first, then Python's crypt on Unix.
+    Uses the libc crypt (via the crypt module) when present, else the built-in engine.
     """
-    # Try passlib if available
-    try:
-        from passlib.hash import sha512_crypt as _sha512_crypt
+    salt = "".join(secrets.choice(_CRYPT_B64) for _ in range(16))
+    setting = f"$6$rounds={rounds}${salt}"
+    crypt = _os_crypt()
+    if crypt is not None:
+        hashed = crypt.crypt(password, setting)
+        if hashed and hashed.startswith(setting):
+            return hashed
+    return sha512_crypt_builtin(password, setting)
+
+
+def sha512_crypt_verify(password: str, hashed: str) -> bool:
+    """
+    True if password matches a "$6$..." hash (without the {SHA512-CRYPT} prefix).
+    Uses the same backends as sha512_crypt_hash; costs as much as one hash.
+    """
+    crypt = _os_crypt()
+    candidate = crypt.crypt(password, hashed) if crypt is not None else None
+    if not candidate:
+        try:
+            candidate = sha512_crypt_builtin(password, hashed)
+        except ValueError:
+            return False  # malformed hash
+    return hmac.compare_digest(candidate, hashed)
+
 
-        return _sha512_crypt.using(rounds=rounds).hash(password)
-    except Exception:
+def resolve_hash(item: Tuple[str, str]) -> Tuple[str, bool]:
+    """
+    (password, current hash) -> (hash to store, True if the current hash still matches).
+    A matching hash is kept so the accounts line does not change.
+    """
+    password, current = item
+    if current and sha512_crypt_verify(password, current):
+        return current, True
+    return sha512_crypt_hash(password), False
+
+
+def load_fingerprint_key(path: Path) -> bytes:
+    """Secret key for the fingerprint cache; created with mode 0600 on first use."""
+    try:
+        return path.read_bytes()
+    except FileNotFoundError:
         pass
+    key = secrets.token_bytes(32)
+    try:
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError:
+        return path.read_bytes()  # another run created it first
+    with os.fdopen(fd, "wb") as fh:
+        fh.write(key)
+    return key
+
 
-    # Fallback to crypt (Linux/Unix). Not available on Windows.
+def fingerprint(key: bytes, email: str, hashed: str, password: str) -> str:
+    """
+    Keyed fingerprint of (account, stored hash, password). Cheap to check,
+    and without the key it is useless for guessing the password offline.
+    """
+    msg = "\0".join((email, hashed, password)).encode("utf-8")
+    return hmac.new(key, msg, hashlib.sha256).hexdigest()
+
+
+def load_cache(path: Path) -> Dict[str, str]:
+    """Fingerprint cache: one "email<TAB>fingerprint" line per account, sorted by email."""
+    cache: Dict[str, str] = {}
     try:
-        import crypt  # type: ignore
+        fh = path.open(encoding="utf-8")
+    except OSError:
+        return cache
+    with fh:
+        for line in fh:
+            email, sep, fp = line.rstrip("\n").partition("\t")
+            if sep:
+                cache[email] = fp
+    return cache
+
+
+def format_cache(cache: Dict[str, str]) -> str:
+    return "".join(f"{email}\t{fp}\n" for email, fp in sorted(cache.items(), key=lambda kv: kv[0].lower()))
 
-        # crypt.mksalt supports rounds for METHOD_SHA512
+
+def write_atomic(path: Path, text: str, mode: int | None = None) -> None:
+    """
+    Replace path with text via a temp file in the same directory, so readers
+    (the mailserver's check-for-changes) never see a half-written file.
+    Keeps the current file mode unless mode is given.
+    """
+    if mode is None:
         try:
-            salt = crypt.mksalt(crypt.METHOD_SHA512, rounds=rounds)  # type: ignore[arg-type]
-        except TypeError:
-            # Older Python: no rounds param
-            salt = crypt.mksalt(crypt.METHOD_SHA512)
-        return crypt.crypt(password, salt)
-    except Exception as e:
-        raise RuntimeError(
-            "Unable to generate SHA512-CRYPT hash. Install 'passlib' or run on Linux with 'crypt' module."
-        ) from e
+            mode = path.stat().st_mode & 0o7777
+        except FileNotFoundError:
+            mode = 0o644
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as fh:
+            fh.write(text)
+            fh.flush()
+            os.fsync(fh.fileno())
+        os.chmod(tmp, mode)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except FileNotFoundError:
+            pass
+        raise
+
+
+def available_cores() -> int:
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def resolve_hashes(items: List[Tuple[str, str]], jobs: int) -> List[Tuple[str, bool]]:
+    """
+    resolve_hash for each (password, current hash), in the same order.
+    With jobs > 1 the work is spread over a process pool; each verify/hash is
+    CPU-bound (656000 rounds), so threads would not help.
+    """
+    if jobs <= 1 or len(items) <= 1:
+        return [resolve_hash(item) for item in items]
+    workers = min(jobs, len(items))
+    chunksize = max(1, len(items) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(resolve_hash, items, chunksize=chunksize))
 
 
 def parse_accounts(lines: List[str]) -> List[Tuple[str, str]]:
@@ -83,51 +291,387 @@ def env_key_for_email(email: str) -> str:
     return f"{norm}_PASSWORD"
 
 
-def main() -> int:
+def current_hash(rest: str) -> str:
+    """The "$6$..." hash of an accounts line (rest after email|), or "" if it is not SHA512-CRYPT."""
+    stored = rest.split("|", 1)[0]
+    return stored[len("{SHA512-CRYPT}"):] if stored.startswith("{SHA512-CRYPT}") else ""
+
+
+# ---------------------------------------------------------------------------
+# Provisioning (--provision users.yml|accounts.csv)
+# ---------------------------------------------------------------------------
+
+SORT_CHUNK = 50000  # records per sorted run spilled to disk by external_sort
+PROVISION_BATCH = 1024  # merged accounts handed to the hashing pool at a time
+
+
+def iter_users_yml(path: Path, env: Dict[str, str]) -> Iterator[Tuple[str, str]]:
+    """
+    Stream (email, password) from the staff: block of the pseudo-YAML users.yml.
+    The password comes from password_env (normalised like .env keys,
+    B.ANNA_PASSWORD -> B_ANNA_PASSWORD), else from env_key_for_email; "" if unset.
+    """
+    def finish(entry: Dict[str, str]) -> Optional[Tuple[str, str]]:
+        email = entry.get("mail", "")
+        if not email:
+            return None
+        key = entry.get("password_env")
+        key = re.sub(r"[^A-Za-z0-9]", "_", key).upper() if key else env_key_for_email(email)
+        return email, env.get(key, "")
+
+    entry: Optional[Dict[str, str]] = None
+    in_staff = False
+    with path.open(encoding="utf-8") as fh:
+        for raw in fh:
+            line = raw.split("#", 1)[0].rstrip()
+            if not line.strip():
+                continue
+            key, _, value = line.strip().partition(":")
+            if line[0].isspace() and not in_staff:
+                continue
+            if line[0].isspace() and value.strip():
+                if entry is not None:
+                    entry[key.strip()] = value.strip().strip("\"'")
+                continue
+            # a new person (or the next top-level key) ends the current entry
+            record = finish(entry) if entry else None
+            if record:
+                yield record
+            entry = {} if line[0].isspace() else None
+            if not line[0].isspace():
+                in_staff = key == "staff"
+    record = finish(entry) if entry else None
+    if record:
+        yield record
+
+
+def iter_accounts_csv(path: Path, env: Dict[str, str]) -> Iterator[Tuple[str, str]]:
+    """
+    Stream (email, password) from a CSV with a header row: an email (or mail)
+    column plus either password or password_env; rows with neither fall
+    back to env_key_for_email.
+    """
+    with path.open(encoding="utf-8", newline="") as fh:
+        for row in csv.DictReader(fh):
+            email = (row.get("email") or row.get("mail") or "").strip()
+            if not email:
+                continue
+            pw = row.get("password") or ""
+            if not pw:
+                key = (row.get("password_env") or "").strip()
+                key = re.sub(r"[^A-Za-z0-9]", "_", key).upper() if key else env_key_for_email(email)
+                pw = env.get(key, "")
+            yield email, pw
+
+
+def external_sort(records: Iterable[tuple], workdir: Path, chunk: int = SORT_CHUNK) -> Iterator[list]:
+    """
+    Yield records (tuples of str/int, compared as a whole) in sorted order
+    holding at most `chunk` of them in memory: full chunks are sorted and
+    spilled to JSON-lines runs under workdir, then merged with heapq.merge.
+    """
+    runs: List[Path] = []
+    buf: List[tuple] = []
+
+    def spill() -> None:
+        run = workdir / f"run{len(runs):05d}"
+        with run.open("w", encoding="utf-8") as fh:
+            for rec in sorted(buf):
+                fh.write(json.dumps(rec, ensure_ascii=False) + "\n")
+        runs.append(run)
+        buf.clear()
+
+    for rec in records:
+        buf.append(rec)
+        if len(buf) >= chunk:
+            spill()
+    if not runs:
+        yield from (list(rec) for rec in sorted(buf))
+        return
+    if buf:
+        spill()
+    files = [run.open(encoding="utf-8") for run in runs]
+    try:
+        yield from heapq.merge(*(map(json.loads, fh) for fh in files))
+    finally:
+        for fh in files:
+            fh.close()
+
+
+def iter_cache_sorted(path: Path) -> Iterator[Tuple[str, str, str]]:
+    """Stream (key, email, fingerprint) from a cache file written by format_cache."""
+    try:
+        fh = path.open(encoding="utf-8")
+    except OSError:
+        return
+    with fh:
+        for line in fh:
+            email, sep, fp = line.rstrip("\n").partition("\t")
+            if sep:
+                yield email.lower(), email, fp
+
+
+def provision(args: argparse.Namespace, env: Dict[str, str]) -> int:
+    """
+    Make postfix-accounts.cf hold exactly the accounts of args.provision.
+    Source, accounts file and fingerprint cache are each sorted by lowercased
+    email (the first two with external_sort, the cache is kept sorted) and
+    joined in one streaming pass: accounts only in the source are added,
+    ones in both get their password checked, ones only in the file are
+    removed. The result is sorted by email, comment lines first.
+    """
+    source_path: Path = args.provision
+    postfix_path: Path = args.accounts
+    if not source_path.exists():
+        print(f"Error: account source not found: {source_path}", file=sys.stderr)
+        return 1
+    reader = iter_accounts_csv if source_path.suffix.lower() == ".csv" else iter_users_yml
+
+    key = load_fingerprint_key(args.cache.with_suffix(".key"))
+    comments: List[str] = []
+
+    def account_lines() -> Iterator[Tuple[str, int, str]]:
+        if not postfix_path.exists():
+            return
+        with postfix_path.open(encoding="utf-8", errors="replace") as fh:
+            for n, raw in enumerate(fh):
+                line = raw.rstrip("\n")
+                email, rest = parse_accounts([line])[0]
+                if email:
+                    yield email.lower(), n, line
+                else:
+                    comments.append(line)
+
+    counts = dict.fromkeys(("added", "updated", "unchanged", "removed", "kept", "skipped", "duplicate"), 0)
+    started = time.perf_counter()
+    checked = 0
+
+    with tempfile.TemporaryDirectory(prefix="password_sync.") as tmp:
+        tmpdir = Path(tmp)
+        (tmpdir / "src").mkdir()
+        (tmpdir / "acc").mkdir()
+        source = external_sort(
+            ((email.lower(), n, email, pw) for n, (email, pw) in enumerate(reader(source_path, env))),
+            tmpdir / "src",
+        )
+        accounts = external_sort(account_lines(), tmpdir / "acc")
+        first_account = next(accounts, None)  # runs the sort, which also collects the comment lines
+        cache_iter = iter_cache_sorted(args.cache)
+        cache_head = next(cache_iter, None)
+
+        def cached_fp(k: str) -> str:
+            nonlocal cache_head
+            while cache_head is not None and cache_head[0] < k:
+                cache_head = next(cache_iter, None)
+            return cache_head[2] if cache_head is not None and cache_head[0] == k else ""
+
+        def joined() -> Iterator[Tuple[Optional[list], Optional[list]]]:
+            """(source record, accounts record) pairs by key; duplicates after the first are dropped."""
+            src = next(source, None)
+            acc = first_account
+            last = None
+            while src is not None or acc is not None:
+                if acc is None or (src is not None and src[0] < acc[0]):
+                    pair, src = (src, None), next(source, None)
+                elif src is None or acc[0] < src[0]:
+                    pair, acc = (None, acc), next(accounts, None)
+                else:
+                    pair, src, acc = (src, acc), next(source, None), next(accounts, None)
+                k = (pair[0] or pair[1])[0]
+                if k == last:
+                    counts["removed" if pair[1] is not None else "duplicate"] += 1
+                    continue
+                last = k
+                yield pair
+
+        out_fd, out_tmp = tempfile.mkstemp(dir=postfix_path.parent, prefix=f".{postfix_path.name}.", suffix=".tmp")
+        cache_fd, cache_tmp = tempfile.mkstemp(dir=args.cache.parent, prefix=f".{args.cache.name}.", suffix=".tmp")
+        try:
+            with os.fdopen(out_fd, "w", encoding="utf-8") as out, os.fdopen(cache_fd, "w", encoding="utf-8") as cache_out:
+                for line in comments:
+                    out.write(line + "\n")
+                batch: List[list] = []
+
+                def flush() -> None:
+                    nonlocal checked
+                    todo = [item for item in batch if item[3] is not None]
+                    results = resolve_hashes([(item[2], item[3]) for item in todo], args.jobs)
+                    checked += len(todo)
+                    for item, (hashed, kept) in zip(todo, results):
+                        email, pw = item[1], item[2]
+                        if kept:
+                            counts["unchanged"] += 1
+                        else:
+                            counts["updated" if item[0] else "added"] += 1
+                            item[0] = f"{email}|{{SHA512-CRYPT}}{hashed}"
+                        item[4] = fingerprint(key, email, hashed, pw)
+                    for line, email, _, _, fp in batch:
+                        out.write(line + "\n")
+                        if fp:
+                            cache_out.write(f"{email}\t{fp}\n")
+                    batch.clear()
+
+                for src, acc in joined():
+                    if src is None:
+                        counts["removed"] += 1
+                        continue
+                    email, pw = src[2], src[3]
+                    if acc is None and not pw:
+                        counts["skipped"] += 1
+                        print(f"Warning: no password for new account {email}, not added", file=sys.stderr)
+                        continue
+                    if acc is None:
+                        batch.append(["", email, pw, "", ""])  # no current hash: always hashed
+                    else:
+                        line = acc[2]
+                        current = current_hash(parse_accounts([line])[0][1])
+                        fp = fingerprint(key, email, current, pw) if pw and current else ""
+                        if not pw:
+                            counts["kept"] += 1
+                            batch.append([line, email, pw, None, ""])
+                        elif fp and hmac.compare_digest(cached_fp(src[0]), fp):
+                            counts["unchanged"] += 1
+                            batch.append([line, email, pw, None, fp])
+                        else:
+                            batch.append([line, email, pw, current, ""])
+                    if len(batch) >= PROVISION_BATCH:
+                        flush()
+                flush()
+                out.flush()
+                os.fsync(out.fileno())
+            changed = counts["added"] + counts["updated"] + counts["removed"]
+            if changed:
+                try:
+                    os.chmod(out_tmp, postfix_path.stat().st_mode & 0o7777)
+                except FileNotFoundError:
+                    os.chmod(out_tmp, 0o644)
+                os.replace(out_tmp, postfix_path)
+            os.replace(cache_tmp, args.cache)  # mkstemp already created it 0600
+        finally:
+            for leftover in (out_tmp, cache_tmp):
+                try:
+                    os.unlink(leftover)
+                except FileNotFoundError:
+                    pass
+
+    elapsed = time.perf_counter() - started
+    summary = ", ".join(f"{v} {k}" for k, v in counts.items() if v)
+    print(f"Provisioned from {source_path} in {elapsed:.2f}s ({checked} hashed/verified): {summary or 'nothing to do'}")
+    if changed:
+        print(f"Output: {postfix_path}")
+    else:
+        print(f"No account changes; {postfix_path} left untouched")
+    return 0
+
+
+def main(argv: List[str] | None = None) -> int:
     here = Path(__file__).resolve().parent
-    dotenv_path = here / ".env"
-    postfix_path = here / "srv_mailcow" / "config" / "postfix-accounts.cf"
+    parser = argparse.ArgumentParser(description="Sync mailbox passwords from .env into postfix-accounts.cf")
+    parser.add_argument("--env", type=Path, default=here / ".env", help="dotenv file with <LOCAL>_PASSWORD keys")
+    parser.add_argument(
+        "--accounts",
+        type=Path,
+        default=here / "srv_mailcow" / "config" / "postfix-accounts.cf",
+        help="postfix-accounts.cf to update",
+    )
+    parser.add_argument(
+        "--cache",
+        type=Path,
+        default=here / ".password_sync_cache.tsv",
+        help="fingerprint cache of unchanged passwords; its key lives next to it with a .key suffix",
+    )
+    parser.add_argument(
+        "--provision",
+        type=Path,
+        metavar="SOURCE",
+        help="make the accounts file match this users.yml (staff: block) or CSV: add, update and remove accounts",
+    )
+    parser.add_argument(
+        "-j", "--jobs", type=int, default=available_cores(), help="hashing processes (default: available cores)"
+    )
+    args = parser.parse_args(argv)
+    dotenv_path = args.env
+    postfix_path = args.accounts
 
     env = load_dotenv(dotenv_path)
     if not env:
         print(f"Warning: .env not found or empty at {dotenv_path}", file=sys.stderr)
 
+    if args.provision:
+        return provision(args, env)
+
     if not postfix_path.exists():
         print(f"Error: postfix accounts file not found: {postfix_path}", file=sys.stderr)
         return 1
 
-    orig_lines = postfix_path.read_text(encoding="utf-8", errors="replace").splitlines()
+    orig_text = postfix_path.read_text(encoding="utf-8", errors="replace")
+    orig_lines = orig_text.splitlines()
     parsed = parse_accounts(orig_lines)
 
+    key = load_fingerprint_key(args.cache.with_suffix(".key"))
+    cache = load_cache(args.cache)
+    new_cache: Dict[str, str] = {}
+
     new_lines: List[str] = []
-    changed = 0
+    # (index into new_lines, email, current hash, password) needing a verify or a new hash
+    pending: List[Tuple[int, str, str, str]] = []
     total_accounts = 0
+    cached = 0
 
-    for email, rest in parsed:
+    for line, (email, rest) in zip(orig_lines, parsed):
         if not email:
             # passthrough (comments/empty or malformed line)
             new_lines.append(rest if rest.endswith("\n") else rest)
             continue
 
         total_accounts += 1
-        key = env_key_for_email(email)
-        pw = env.get(key)
+        env_key = env_key_for_email(email)
+        pw = env.get(env_key)
         if pw is None or pw == "":
             # Keep existing line as-is
-            new_lines.append(f"{email}|{rest}")
+            new_lines.append(line)
             continue
 
-        # Generate new hash
-        hashed = sha512_crypt_hash(pw)
-        new_line = f"{email}|{{SHA512-CRYPT}}{hashed}"
-        if new_line != f"{email}|{rest}":
-            changed += 1
-        new_lines.append(new_line)
+        current = current_hash(rest)
+        fp = fingerprint(key, email, current, pw) if current else ""
+        if fp and hmac.compare_digest(cache.get(email, ""), fp):
+            # Verified on an earlier run and neither side changed since
+            cached += 1
+            new_cache[email] = fp
+            new_lines.append(line)
+            continue
+
+        pending.append((len(new_lines), email, current, pw))
+        new_lines.append(line)
+
+    # Verify cache misses against their current hash, re-hash the ones that differ
+    started = time.perf_counter()
+    results = resolve_hashes([(pw, current) for _, _, current, pw in pending], args.jobs)
+    elapsed = time.perf_counter() - started
+
+    changed = 0
+    for (idx, email, _, pw), (hashed, kept) in zip(pending, results):
+        new_cache[email] = fingerprint(key, email, hashed, pw)
+        if kept:
+            continue
+        changed += 1
+        new_lines[idx] = f"{email}|{{SHA512-CRYPT}}{hashed}"
 
-    postfix_path.write_text("\n".join(new_lines) + "\n", encoding="utf-8")
+    if changed:
+        write_atomic(postfix_path, "\n".join(new_lines) + "\n")
+    if new_cache != cache:
+        write_atomic(args.cache, format_cache(new_cache), mode=0o600)
 
-    print(
-        f"Synced passwords for {changed} of {total_accounts} account(s). Output: {postfix_path}")
+    if pending:
+        print(
+            f"Checked {len(pending)} password(s) in {elapsed:.2f}s "
+            f"({len(pending) / elapsed:.2f} hashes/s, {min(args.jobs, len(pending))} job(s)); "
+            f"{cached} unchanged per cache")
+    if changed:
+        print(
+            f"Synced passwords for {changed} of {total_accounts} account(s). Output: {postfix_path}")
+    else:
+        print(f"No password changes for {total_accounts} account(s); {postfix_path} left untouched")
     return 0
 
 
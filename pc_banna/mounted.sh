@@ -178,16 +178,22 @@ if [[ -n "${ANNA_PW}" ]]; then
   printf '%s' "${ANNA_PW}" > "/home/b.anna/.imap_pass" && chmod 600 "/home/b.anna/.imap_pass" && chown b.anna:b.anna "/home/b.anna/.imap_pass"
 fi
 
-# Set up cron job to poll mailbox every ~15 seconds (loop x4 each minute)
+# Set up cron job that keeps the mailbox watcher running. The watcher stays
+# connected and reacts to new mail via IMAP IDLE; cron only restarts it if it
+# died, flock keeps it to a single instance.
+# EMAIL_WATCH_MODE=poll restores the old poll-every-15s loop.
 # Use a user-writable lock file to avoid Permission denied on /var/run
 LOCK_DIR=/home/b.anna/.local/run
 mkdir -p "$LOCK_DIR" && chown -R b.anna:b.anna "$LOCK_DIR" || true
-cat > /usr/local/bin/run_email_watcher.sh << 'EOF'
+cat > /usr/local/bin/run_email_watcher.sh << EOF
 #!/usr/bin/env bash
 set -euo pipefail
 export PATH=/usr/local/sbin:/usr/local/bin:/usr/sbin:/usr/bin:/sbin:/bin
 LOCKFILE="/home/b.anna/.local/run/email_watcher.lock"
-exec /usr/bin/flock -n "$LOCKFILE" bash -c '
+if [[ "${EMAIL_WATCH_MODE:-idle}" == "idle" ]]; then
+  exec /usr/bin/flock -n "\$LOCKFILE" /usr/bin/python3 /opt/tools/email_watcher.py --idle >> /var/log/email_watcher.log 2>&1
+fi
+exec /usr/bin/flock -n "\$LOCKFILE" bash -c '
   for i in 1 2 3 4; do
     /usr/bin/python3 /opt/tools/email_watcher.py >> /var/log/email_watcher.log 2>&1 || true
     sleep 15
@@ -1,11 +1,25 @@
 #!/usr/bin/env python3
+import argparse
+import asyncio
+import binascii
+import codecs
+import collections
+import concurrent.futures
+import contextlib
 import email
+import email.parser
+import hashlib
 import imaplib
+import json
 import os
 import re
+import select
 import sys
 import subprocess
 import tempfile
+import time
+from email.header import decode_header, make_header
+from email.utils import collapse_rfc2231_value, decode_rfc2231
 from pathlib import Path
 
 IMAP_HOST = os.getenv("MAIL_IMAP_HOST", "192.168.0.20")
@@ -18,6 +32,38 @@ MAIL_PASS = os.getenv("B_ANNA_PASSWORD", "Annab3lla")
 HOME = Path(os.environ.get("HOME", f"/home/{MAIL_USER.split('@')[0]}"))
 DOWNLOAD_DIR = HOME  # save to home per requirement
 LOG = Path("/var/log/email_watcher.log")
+# Last processed UID and the UIDVALIDITY it belongs to
+STATE_FILE = Path(os.getenv("EMAIL_STATE_FILE", str(HOME / ".email_watcher_state.json")))
+FETCH_BATCH = int(os.getenv("EMAIL_FETCH_BATCH", "10"))
+# Body sections are pulled in pieces of this size (partial FETCH)
+FETCH_CHUNK = int(os.getenv("EMAIL_FETCH_CHUNK", str(256 * 1024)))
+# Keep a normalised copy of the latest message in ~/email.eml. The whole
+# message is then fetched once and texts and archives are split out of that
+# stream; with 0 only the sections that matter are fetched
+SAVE_EML = os.getenv("EMAIL_SAVE_EML", "1") != "0"
+
+# Multi-account mode (--accounts users.yml): per-account download directory
+# and state live under HOME_TEMPLATE, latency stats go to STATUS_FILE
+HOME_TEMPLATE = os.getenv("EMAIL_HOME_TEMPLATE", "/home/{login}")
+STATUS_FILE = Path(os.getenv("EMAIL_STATUS_FILE", str(HOME / ".email_watcher_status.json")))
+REPORT_INTERVAL = int(os.getenv("EMAIL_REPORT_INTERVAL", "300"))
+
+# Headers copied into the --bulk report, for checking Junk routing
+SPAM_HEADERS = ("X-Spam", "X-Spam-Flag", "X-Spam-Status", "X-Spam-Score", "X-Rspamd-Score", "X-Rspamd-Action")
+
+# Persistent mode (--idle): IDLE is re-issued well below the 29 minute limit
+# of RFC 2177; POLL_INTERVAL only applies to servers without IDLE
+WATCH_MODE = os.getenv("EMAIL_WATCH_MODE", "poll")
+IDLE_TIMEOUT = int(os.getenv("EMAIL_IDLE_TIMEOUT", "300"))
+POLL_INTERVAL = int(os.getenv("EMAIL_POLL_INTERVAL", "15"))
+RECONNECT_BACKOFF_MAX = int(os.getenv("EMAIL_RECONNECT_BACKOFF_MAX", "60"))
+CONNECT_TIMEOUT = 30
+
+_NEW_MAIL_RE = re.compile(rb"\* \d+ (EXISTS|RECENT)")
+_TOKEN_RE = re.compile(rb'[()]|"(?:[^"\\]|\\.)*"|[^\s()"]+')
+_B64_JUNK_RE = re.compile(rb"[^A-Za-z0-9+/=]")
+_LITERAL_RE = re.compile(rb"\{(\d+)\}\r\n$")
+_UIDVALIDITY_RE = re.compile(rb"\[UIDVALIDITY (\d+)\]")
 
 ARCHIVE_EXTS = {".zip", ".7z"}
 ARCHIVE_MIMES = {
@@ -65,28 +111,45 @@ def extract_all_text(msg) -> str:
     return "\n".join(parts)
 
 
-def is_archive_part(part, filename: str | None) -> bool:
+def is_archive(ctype: str | None, filename: str | None) -> bool:
     if not filename:
         return False
     name = filename.lower()
     if any(name.endswith(ext) for ext in ARCHIVE_EXTS):
         return True
-    ctype = (part.get_content_type() or "").lower()
-    if ctype in ARCHIVE_MIMES:
+    if (ctype or "").lower() in ARCHIVE_MIMES:
         return True
     return False
 
 
+def is_archive_part(part, filename: str | None) -> bool:
+    return is_archive(part.get_content_type(), filename)
+
+
 def save_part_to_file(part, path: str | Path) -> None:
-    data = part.get_payload(decode=True) or b""
+    save_stream_to_file([part.get_payload(decode=True) or b""], path)
+
+
+def save_stream_to_file(chunks, path: str | Path) -> None:
+    with atomic_writer(path) as fh:
+        for data in chunks:
+            fh.write(data)
+
 
+@contextlib.contextmanager
+def atomic_writer(path: str | Path):
     path = Path(path)
     # 1) РіР°СЂР°РЅС‚РёСЂСѓРµРј, С‡С‚Рѕ РєР°С‚Р°Р»РѕРіРё СЃСѓС‰РµСЃС‚РІСѓСЋС‚
     path.parent.mkdir(parents=True, exist_ok=True)
 
     # 2) Р°С‚РѕРјР°СЂРЅР°СЏ Р·Р°РїРёСЃСЊ С‡РµСЂРµР· РІСЂРµРјРµРЅРЅС‹Р№ С„Р°Р№Р» РІ С‚РѕР№ Р¶Рµ РґРёСЂРµРєС‚РѕСЂРёРё
     with tempfile.NamedTemporaryFile(dir=path.parent, delete=False) as tmp:
-        tmp.write(data)
+        try:
+            yield tmp
+        except BaseException:
+            tmp.close()
+            os.unlink(tmp.name)
+            raise
         tmp.flush()
         os.fsync(tmp.fileno())
         tmppath = Path(tmp.name)
@@ -135,7 +198,7 @@ def run_agent_background(agent_path: Path) -> None:
         log(f"Failed to start agent.py: {e}")
 
 
-def main() -> int:
+def read_password() -> str | None:
     pw = MAIL_PASS
     if not pw:
         # Try password file in home
@@ -144,68 +207,1290 @@ def main() -> int:
             pw = pw_file.read_text(encoding="utf-8", errors="ignore").strip()
         except Exception:
             pw = None
-    if not pw:
-        log("No mailbox password available (env or ~/.imap_pass)")
-        return 1
+    return pw or None
+
+
+def connect(pw: str) -> imaplib.IMAP4:
+    imap = imaplib.IMAP4(IMAP_HOST, IMAP_PORT, timeout=CONNECT_TIMEOUT)
+    imap.login(MAIL_USER, pw)
+    typ, _ = imap.select("Junk")
+    if typ != "OK":
+        raise imaplib.IMAP4.error(f"SELECT Junk failed: {typ}")
+    return imap
+
+
+def load_state(path: Path | None = None) -> dict:
     try:
-        imap = imaplib.IMAP4(IMAP_HOST, IMAP_PORT)
-        imap.login(MAIL_USER, pw)
-        imap.select("Junk")
-        typ, data = imap.search(None, "ALL")
+        return json.loads((path or STATE_FILE).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+
+
+def save_state(state: dict, path: Path | None = None) -> None:
+    path = path or STATE_FILE
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(json.dumps(state), encoding="utf-8")
+    tmp.replace(path)
+
+
+def _sexp_tokens(data):
+    # imaplib hands FETCH responses over as bytes lines and (line, literal)
+    # tuples; literals become string tokens in place of their {n} marker
+    for piece in data:
+        head, literal = piece if isinstance(piece, tuple) else (piece, None)
+        if literal is not None:
+            head = head[:head.rindex(b"{")]
+        for tok in _TOKEN_RE.findall(head):
+            if tok.startswith(b'"'):
+                yield "str", re.sub(rb"\\(.)", rb"\1", tok[1:-1])
+            else:
+                yield "atom", tok
+        if literal is not None:
+            yield "str", literal
+
+
+def parse_fetch(data) -> list[dict]:
+    """Parse imaplib FETCH response data into one {ITEM: value} dict per message.
+
+    Parenthesized lists become lists, quoted strings and literals bytes,
+    NIL None and other atoms str.
+    """
+    out = []
+    stack = []
+    for kind, tok in _sexp_tokens(data):
+        if kind == "atom" and tok == b"(":
+            stack.append([])
+        elif kind == "atom" and tok == b")":
+            done = stack.pop()
+            if stack:
+                stack[-1].append(done)
+            else:
+                out.append({str(k).upper(): v for k, v in zip(done[::2], done[1::2])})
+        elif stack:
+            if kind == "str":
+                stack[-1].append(tok)
+            elif tok.upper() == b"NIL":
+                stack[-1].append(None)
+            else:
+                stack[-1].append(tok.decode("ascii", "replace"))
+    return out
+
+
+def _text(value) -> str:
+    if isinstance(value, bytes):
+        return value.decode("utf-8", "replace")
+    return value or ""
+
+
+def _params(value) -> dict:
+    if not isinstance(value, list):
+        return {}
+    return {_text(k).lower(): _text(v) for k, v in zip(value[::2], value[1::2])}
+
+
+def _part_filename(params: dict, disposition) -> str | None:
+    # Same precedence as Message.get_filename(): disposition, then type "name"
+    candidates = [_params(disposition[1]) if isinstance(disposition, list) and len(disposition) > 1 else {}, params]
+    for p in candidates:
+        for key in ("filename", "name"):
+            if key in p:
+                return str(make_header(decode_header(p[key])))
+            if key + "*" in p:
+                return collapse_rfc2231_value(decode_rfc2231(p[key + "*"]))
+    return None
+
+
+def walk_structure(body, section: str = ""):
+    """Yield (section, part) for every leaf of a parsed BODYSTRUCTURE.
+
+    part is a dict with type, params, encoding, size and filename; section is
+    the BODY[...] part specifier. Attached messages are descended into, like
+    Message.walk() does.
+    """
+    if body and isinstance(body[0], list):
+        children = []
+        for child in body:
+            if not isinstance(child, list):
+                break
+            children.append(child)
+        for i, child in enumerate(children, 1):
+            yield from walk_structure(child, f"{section}.{i}" if section else str(i))
+        return
+    ctype = f"{_text(body[0])}/{_text(body[1])}".lower()
+    params = _params(body[2])
+    ext = 7
+    if ctype.startswith("text/"):
+        ext = 8
+    elif ctype == "message/rfc822":
+        ext = 10
+    disposition = body[ext + 1] if len(body) > ext + 1 else None
+    section = section or "1"
+    yield section, {
+        "type": ctype,
+        "params": params,
+        "encoding": _text(body[5]).lower(),
+        "size": int(body[6] or 0),
+        "filename": _part_filename(params, disposition),
+    }
+    if ctype == "message/rfc822" and len(body) > 8 and isinstance(body[8], list):
+        inner = body[8]
+        multipart = inner and isinstance(inner[0], list)
+        yield from walk_structure(inner, section if multipart else section + ".1")
+
+
+def fetch_section(imap: imaplib.IMAP4, uid: int, section: str):
+    """Yield BODY[section] in FETCH_CHUNK byte pieces via partial fetches.
+
+    BODY.PEEK leaves the \\Seen flag alone; check_mailbox() sets it once the
+    message has been handled.
+    """
+    offset = 0
+    while True:
+        typ, data = imap.uid("FETCH", str(uid), f"(BODY.PEEK[{section}]<{offset}.{FETCH_CHUNK}>)")
         if typ != "OK":
-            log(f"IMAP search failed: {typ}")
-            return 1
-        ids = data[0].split()
-        if not ids:
-            return 0
-        # Process only the latest message
-        for msg_id in ids[-1:]:
+            raise imaplib.IMAP4.error(f"FETCH BODY[{section}] failed: {typ}")
+        chunk = b""
+        for item in parse_fetch(data):
+            for key, value in item.items():
+                if key.startswith("BODY["):
+                    chunk = value if isinstance(value, bytes) else b""
+        if chunk:
+            yield chunk
+        offset += len(chunk)
+        if len(chunk) < FETCH_CHUNK:
+            return
+
+
+def transfer_decoder(encoding: str):
+    """Return feed(chunk, final=False) -> bytes undoing a Content-Transfer-Encoding."""
+    rest = b""
+
+    def base64(chunk: bytes, final: bool = False) -> bytes:
+        nonlocal rest
+        data = rest + _B64_JUNK_RE.sub(b"", chunk)
+        cut = len(data) - len(data) % 4
+        rest = data[cut:]
+        out = binascii.a2b_base64(data[:cut]) if cut else b""
+        if final and rest.rstrip(b"="):
+            # Truncated final quantum; decode what we can, like email does
             try:
-                t, d = imap.fetch(msg_id, "(RFC822)")
-                if t != "OK":
+                out += binascii.a2b_base64(rest + b"=" * (-len(rest) % 4))
+            except binascii.Error:
+                pass
+        return out
+
+    def quoted_printable(chunk: bytes, final: bool = False) -> bytes:
+        # Soft line breaks never span a newline, so decode whole lines only
+        nonlocal rest
+        data = rest + chunk
+        cut = len(data) if final else data.rfind(b"\n") + 1
+        rest = data[cut:]
+        return binascii.a2b_qp(data[:cut]) if cut else b""
+
+    if encoding == "base64":
+        return base64
+    if encoding == "quoted-printable":
+        return quoted_printable
+    return lambda chunk, final=False: chunk
+
+
+def decode_transfer(chunks, encoding: str):
+    """Undo a Content-Transfer-Encoding chunk by chunk."""
+    feed = transfer_decoder(encoding)
+    for chunk in chunks:
+        out = feed(chunk)
+        if out:
+            yield out
+    out = feed(b"", final=True)
+    if out:
+        yield out
+
+
+def decode_text(payload: bytes, part: dict) -> str:
+    charset = part["params"].get("charset") or "utf-8"
+    try:
+        return payload.decode(charset, errors="ignore")
+    except LookupError:
+        return payload.decode("utf-8", errors="ignore")
+
+
+def eml_normaliser():
+    """Return feed(chunk, final=False) -> bytes doing the email.eml clean-up.
+
+    Same result as decoding the whole message, turning every line ending
+    into LF, collapsing runs of 3+ newlines to 2 and writing CRLF back out.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    newlines = 0
+    pending_cr = False
+
+    def convert(text: str) -> bytes:
+        nonlocal newlines
+        out = []
+        for run in re.findall(r"\n+|[^\n]+", text.replace("\r\n", "\n").replace("\r", "\n")):
+            if run[0] == "\n":
+                out.append("\r\n" * (min(newlines + len(run), 2) - min(newlines, 2)))
+                newlines += len(run)
+            else:
+                newlines = 0
+                out.append(run)
+        return "".join(out).encode("utf-8")
+
+    def feed(chunk: bytes, final: bool = False) -> bytes:
+        nonlocal pending_cr
+        text = ("\r" if pending_cr else "") + decoder.decode(chunk, final)
+        # A CR at the end may be the first half of a CRLF
+        pending_cr = text.endswith("\r") and not final
+        return convert(text[:-1] if pending_cr else text)
+
+    return feed
+
+
+def normalise_eml(chunks):
+    """Streaming form of the email.eml clean-up, see eml_normaliser()."""
+    feed = eml_normaliser()
+    for chunk in chunks:
+        yield feed(chunk)
+    yield feed(b"", final=True)
+
+
+def classify_parts(structure: list) -> tuple[list, list]:
+    """Split BODYSTRUCTURE leaves into (text parts, archive parts)."""
+    texts = []
+    archives = []
+    for section, part in walk_structure(structure):
+        if part["type"] in ("text/plain", "text/html"):
+            texts.append((section, part))
+        if is_archive(part["type"], part["filename"]):
+            archives.append((section, part))
+    return texts, archives
+
+
+def mime_splitter(sinks: dict):
+    """Return feed(chunk, final=False) routing leaf bodies of a raw message to sinks.
+
+    sinks maps BODY[...] sections, numbered as walk_structure() does, to
+    lists of feed(data, final=False) callables that get the still encoded
+    body. Only the current line and part headers are buffered.
+    """
+    frames = []  # [b"--boundary", section of the multipart, children seen]
+    headers = []
+    pending = []
+    targets = []
+    state = "headers"
+    base, child = "", False
+    rest = eol = b""
+    midline = False
+
+    def flush() -> None:
+        if pending:
+            data = b"".join(pending)
+            pending.clear()
+            for sink in targets:
+                sink(data)
+
+    def end_body() -> None:
+        nonlocal targets, eol
+        flush()
+        for sink in targets:
+            sink(b"", final=True)
+        targets, eol = [], b""
+
+    def start_entity() -> None:
+        nonlocal state, base, child, targets
+        msg = email.parser.BytesHeaderParser().parsebytes(b"".join(headers))
+        headers.clear()
+        ctype = msg.get_content_type()
+        boundary = msg.get_boundary()
+        section = base if child else (f"{base}.1" if base else "1")
+        if ctype.startswith("multipart/") and boundary:
+            frames.append([b"--" + boundary.encode("ascii", "surrogateescape"), base, 0])
+            state = "skip"
+        elif ctype == "message/rfc822" and section not in sinks:
+            # Attached message: its own headers follow, parts nest below it
+            base, child = section, False
+        else:
+            targets = sinks.get(section, [])
+            state = "body"
+
+    def line(data: bytes) -> None:
+        nonlocal state, base, child, eol, midline
+        content = data.rstrip(b"\r\n")
+        if midline:
+            # Tail of an over-long line, never a boundary
+            midline = False
+        elif state == "headers":
+            if content:
+                headers.append(data)
+            else:
+                start_entity()
+            return
+        elif content.startswith(b"--") and frames:
+            marker = content.rstrip()
+            for depth in range(len(frames) - 1, -1, -1):
+                frame = frames[depth]
+                if marker not in (frame[0], frame[0] + b"--"):
+                    continue
+                # The line break before a boundary belongs to the boundary
+                end_body()
+                del frames[depth + 1:]
+                if marker == frame[0]:
+                    frame[2] += 1
+                    base = f"{frame[1]}.{frame[2]}" if frame[1] else str(frame[2])
+                    child, state = True, "headers"
+                else:
+                    frames.pop()
+                    state = "skip"
+                return
+        if state == "body" and targets:
+            pending.append(eol + content)
+            eol = data[len(content):]
+
+    def feed(chunk: bytes, final: bool = False) -> None:
+        nonlocal rest, eol, midline
+        data = rest + chunk
+        pos = 0
+        while True:
+            if state == "body" and not midline and not data.startswith(b"--", pos):
+                # Fast path: whole lines up to the next one starting with "--"
+                cut = data.find(b"\n--", pos)
+                end = cut + 1 if cut >= 0 else data.rfind(b"\n", pos) + 1
+                if end > pos:
+                    if targets:
+                        last = data[max(pos, data.rfind(b"\n", pos, end - 1) + 1):end]
+                        tail = len(last) - len(last.rstrip(b"\r\n"))
+                        pending.append(eol + data[pos:end - tail])
+                        eol = data[end - tail:end]
+                    pos = end
+                    continue
+            nl = data.find(b"\n", pos)
+            if nl < 0:
+                break
+            line(data[pos:nl + 1])
+            pos = nl + 1
+        rest = data[pos:]
+        if final:
+            if rest:
+                line(rest)
+            rest = b""
+            if state == "body":
+                pending.append(eol)
+            end_body()
+            return
+        if state == "body" and len(rest) > FETCH_CHUNK:
+            # Binary body without line breaks: pass it on instead of buffering
+            if targets:
+                pending.append(eol + rest)
+            rest, eol, midline = b"", b"", True
+        flush()
+
+    return feed
+
+
+@contextlib.contextmanager
+def full_pass(structure: list, download_dir: Path, prefix: str = ""):
+    """Save email.eml and the parts that matter from one BODY[] pass.
+
+    Yields (feed, result): feed every chunk of the full message; once the
+    block ends result["password"] and result["saved"] are filled in. Texts
+    and archives are decoded as they stream by, archives straight to disk.
+    """
+    text_parts, archives = classify_parts(structure)
+    texts = []
+    result = {"password": "", "saved": []}
+    with contextlib.ExitStack() as stack:
+        eml = stack.enter_context((download_dir / "email.eml").open("wb"))
+        normalise = eml_normaliser()
+        sinks = {}
+
+        def sink(part: dict, write):
+            decode = transfer_decoder(part["encoding"])
+            return lambda data, final=False: write(decode(data, final))
+
+        for section, part in text_parts:
+            chunks = []
+            texts.append((chunks, part))
+            sinks.setdefault(section, []).append(sink(part, chunks.append))
+        for section, part in archives:
+            dst = download_dir / part["filename"]
+            print(f"{prefix}Saving to: {dst}")
+            sinks.setdefault(section, []).append(sink(part, stack.enter_context(atomic_writer(dst)).write))
+            result["saved"].append(dst)
+        split = mime_splitter(sinks)
+
+        def feed(chunk: bytes) -> None:
+            eml.write(normalise(chunk))
+            split(chunk)
+
+        yield feed, result
+        eml.write(normalise(b"", final=True))
+        split(b"", final=True)
+    text = "\n".join(decode_text(b"".join(chunks), part) for chunks, part in texts)
+    result["password"] = find_password(text) or ""
+    print(f"{prefix}Extracted password from email: {result['password']}")
+
+
+def open_archives(saved: list[Path], pwd: str, download_dir: Path) -> None:
+    # Try to extract each saved archive
+    for arch in saved:
+        try:
+            outdir = download_dir / f"{arch.stem}_extracted"
+            print(f'Looking in {outdir}')
+            extract_with_7z(arch, pwd, outdir)
+            agent = find_agent_py(outdir)
+            if agent:
+                run_agent_background(agent)
+                log(f"Started agent from {agent}")
+        except subprocess.CalledProcessError:
+            log(f"Extraction failed for {arch}")
+
+
+def process_message(imap: imaplib.IMAP4, uid: int, structure: list) -> None:
+    """Handle one message using only the parts that matter.
+
+    The BODYSTRUCTURE tells which sections are text and which are archives;
+    only those are fetched, in FETCH_CHUNK pieces, and attachments are
+    decoded straight to disk so memory stays flat for large messages.
+    With SAVE_EML the whole message is fetched once for email.eml and the
+    parts are split out of that same stream by full_pass().
+    """
+    try:
+        if SAVE_EML:
+            try:
+                DOWNLOAD_DIR.mkdir(parents=True, exist_ok=True)
+                with full_pass(structure, DOWNLOAD_DIR) as (feed, result):
+                    for chunk in fetch_section(imap, uid, ""):
+                        feed(chunk)
+            except (ConnectionError, TimeoutError):
+                raise
+            except OSError as e:
+                # Fall back to fetching just the parts below
+                log(f"Failed to save email.eml: {e}")
+            else:
+                open_archives(result["saved"], result["password"], DOWNLOAD_DIR)
+                return
+        text_parts, archives = classify_parts(structure)
+        texts = []
+        for section, part in text_parts:
+            payload = b"".join(decode_transfer(fetch_section(imap, uid, section), part["encoding"]))
+            texts.append(decode_text(payload, part))
+        pwd = find_password("\n".join(texts)) or ""
+        print("Extracted password from email: "+pwd)
+        saved = []
+        for section, part in archives:
+            dst = DOWNLOAD_DIR / part["filename"]
+            print(f'Saving to: {dst}')
+            save_stream_to_file(decode_transfer(fetch_section(imap, uid, section), part["encoding"]), dst)
+            saved.append(dst)
+        open_archives(saved, pwd, DOWNLOAD_DIR)
+    except (imaplib.IMAP4.abort, ConnectionError, TimeoutError):
+        # The connection is gone; let the caller reconnect
+        raise
+    except Exception as e:
+        log(f"Process message error: {e}")
+
+
+def _uid_set(uids: list[int]) -> str:
+    # Compress runs of consecutive UIDs: 5,6,7,9 -> 5:7,9
+    out = []
+    start = prev = uids[0]
+    for uid in uids[1:] + [None]:
+        if uid is not None and uid == prev + 1:
+            prev = uid
+            continue
+        out.append(str(start) if start == prev else f"{start}:{prev}")
+        if uid is not None:
+            start = prev = uid
+    return ",".join(out)
+
+
+def _uidvalidity(imap: imaplib.IMAP4) -> int:
+    # Left in untagged_responses by SELECT; read without consuming it
+    values = imap.untagged_responses.get("UIDVALIDITY") or [b"0"]
+    return int(values[-1])
+
+
+def start_uid(state: dict, validity: int, prefix: str = "") -> int | None:
+    """Last processed UID from state, or None when it cannot be trusted."""
+    if state.get("uidvalidity") != validity:
+        if state:
+            log(f"{prefix}UIDVALIDITY changed ({state.get('uidvalidity')} -> {validity}), resetting state")
+        return None
+    return state.get("last_uid", 0)
+
+
+def pick_new_uids(found: list[int], last_uid: int | None) -> list[int]:
+    uids = sorted(found)
+    if last_uid is None:
+        # Fresh state: do not replay the whole folder, take only the latest
+        return uids[-1:]
+    # "n:*" always matches the highest UID, even when it is below n
+    return [u for u in uids if u > last_uid]
+
+
+def check_mailbox(imap: imaplib.IMAP4) -> int:
+    """Process every message that arrived since the last run, exactly once.
+
+    The last processed UID is persisted in STATE_FILE together with the
+    mailbox UIDVALIDITY, so each cycle only asks the server for UIDs above
+    it. Without usable state (first run, UIDVALIDITY changed) only the
+    latest message is processed and becomes the new high-water mark.
+    """
+    validity = _uidvalidity(imap)
+    last_uid = start_uid(load_state(), validity)
+
+    if last_uid is None:
+        typ, data = imap.uid("SEARCH", None, "ALL")
+    else:
+        typ, data = imap.uid("SEARCH", None, "UID", f"{last_uid + 1}:*")
+    if typ != "OK":
+        log(f"IMAP search failed: {typ}")
+        return 1
+    uids = pick_new_uids([int(u) for u in data[0].split()], last_uid)
+    if not uids:
+        if last_uid is None:
+            save_state({"uidvalidity": validity, "last_uid": 0})
+        return 0
+
+    for i in range(0, len(uids), FETCH_BATCH):
+        batch = uids[i:i + FETCH_BATCH]
+        # One UID FETCH per batch for the structures; parts are fetched per message
+        typ, data = imap.uid("FETCH", _uid_set(batch), "(UID BODYSTRUCTURE)")
+        if typ != "OK":
+            log(f"IMAP fetch failed: {typ}")
+            return 1
+        structures = {int(item["UID"]): item.get("BODYSTRUCTURE") for item in parse_fetch(data) if "UID" in item}
+        for uid in sorted(structures):
+            process_message(imap, uid, structures[uid] or [])
+            # Advance the mark right after each message so a crash or
+            # reconnect never hands the same message to the user twice
+            save_state({"uidvalidity": validity, "last_uid": uid})
+        # mark as seen
+        imap.uid("STORE", _uid_set(batch), "+FLAGS", "(\\Seen)")
+    return 0
+
+
+def _read_line(imap: imaplib.IMAP4) -> bytes:
+    line = imap.readline()
+    if not line:
+        raise imaplib.IMAP4.abort("socket closed during IDLE")
+    if line.startswith(b"* BYE"):
+        raise imaplib.IMAP4.abort(line.decode("utf-8", "replace").strip())
+    return line
+
+
+def _wait_readable(imap: imaplib.IMAP4, timeout: float) -> bool:
+    # imaplib reads through a buffered file; a line may already sit in the
+    # buffer where select() on the socket cannot see it
+    sock = imap.sock
+    saved = sock.gettimeout()
+    sock.setblocking(False)
+    try:
+        if imap.file.peek(1):
+            return True
+    finally:
+        sock.settimeout(saved)
+    ready, _, _ = select.select([sock], [], [], timeout)
+    return bool(ready)
+
+
+def idle(imap: imaplib.IMAP4, timeout: float) -> bool:
+    """Wait in IMAP IDLE (RFC 2177) for up to timeout seconds.
+
+    Returns True as soon as the server reports new mail (EXISTS/RECENT).
+    imaplib has no IDLE support, so the command is driven by hand.
+    """
+    tag = imap._new_tag()
+    imap.send(tag + b" IDLE\r\n")
+    changed = False
+    while True:
+        line = _read_line(imap)
+        if line.startswith(b"+"):
+            break
+        if line.startswith(tag):
+            raise imaplib.IMAP4.error(f"IDLE rejected: {line.decode('utf-8', 'replace').strip()}")
+        changed |= bool(_NEW_MAIL_RE.match(line))
+    deadline = time.monotonic() + timeout
+    while not changed:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0 or not _wait_readable(imap, remaining):
+            break
+        changed = bool(_NEW_MAIL_RE.match(_read_line(imap)))
+    imap.send(b"DONE\r\n")
+    while True:
+        line = _read_line(imap)
+        if line.startswith(tag + b" "):
+            if not line[len(tag) + 1:].startswith(b"OK"):
+                raise imaplib.IMAP4.error(f"IDLE failed: {line.decode('utf-8', 'replace').strip()}")
+            return changed
+        changed |= bool(_NEW_MAIL_RE.match(line))
+
+
+def _take_new_mail(imap: imaplib.IMAP4) -> bool:
+    # EXISTS/RECENT pushed alongside other responses end up here
+    exists = imap.untagged_responses.pop("EXISTS", None)
+    recent = imap.untagged_responses.pop("RECENT", None)
+    return bool(exists or recent)
+
+
+def watch(pw: str) -> int:
+    """Keep one connection open and react to new mail via IDLE.
+
+    Falls back to NOOP polling when the server lacks IDLE, sends a NOOP
+    keepalive after every quiet IDLE round and reconnects with exponential
+    backoff when the connection drops.
+    """
+    backoff = 1
+    while True:
+        imap = None
+        try:
+            imap = connect(pw)
+            use_idle = "IDLE" in imap.capabilities
+            log(f"Watching Junk on {IMAP_HOST}:{IMAP_PORT} ({'IDLE' if use_idle else 'NOOP polling'})")
+            backoff = 1
+            changed = True
+            while True:
+                if changed:
+                    _take_new_mail(imap)
+                    check_mailbox(imap)
+                # Mail that arrived while we were busy processing
+                if _take_new_mail(imap):
+                    changed = True
                     continue
-                raw = d[0][1]
-                msg = email.message_from_bytes(raw)
+                if use_idle:
+                    changed = idle(imap, IDLE_TIMEOUT)
+                else:
+                    time.sleep(POLL_INTERVAL)
+                    changed = False
+                if not changed:
+                    # Keepalive; also collects EXISTS from servers that batch them
+                    imap.noop()
+                    changed = _take_new_mail(imap)
+        except KeyboardInterrupt:
+            return 0
+        except (imaplib.IMAP4.error, OSError) as e:
+            log(f"IMAP connection lost: {e}; reconnecting in {backoff}s")
+        finally:
+            if imap is not None:
                 try:
-                    eml_path = DOWNLOAD_DIR / "email.eml"
-                    cleaned = raw.decode("utf-8", errors="replace").replace("\r\n","\n").replace("\r","\n")
-                    cleaned = re.sub("\n{3,}", "\n\n", cleaned).replace("\n","\r\n")
-                    DOWNLOAD_DIR.mkdir(parents=True, exist_ok=True)
-                    eml_path.write_text(cleaned, encoding="utf-8", newline="")
-                except Exception as e:
-                    log(f"Failed to save email.eml: {e}")
-                text = extract_all_text(msg)
-                pwd = find_password(text) or ""
-                print("Extracted password from email: "+pwd)
-                saved = []
-                for part in msg.walk():
-                    fname = part.get_filename()
-                    if is_archive_part(part, fname):
-                        name = fname or "archive.bin"
-                        dst = DOWNLOAD_DIR / name
-                        print(f'Saving to: {dst}')
-                        save_part_to_file(part, dst)
-                        saved.append(dst)
-                # Try to extract each saved archive
-                for arch in saved:                    
-                    arch = Path(arch)
-                    try:
-                        outdir = DOWNLOAD_DIR / f"{arch.stem}_extracted"
-                        print(f'Looking in {outdir}')
-                        extract_with_7z(arch, pwd, outdir)
-                        agent = find_agent_py(outdir)
-                        if agent:
-                            run_agent_background(agent)
-                            log(f"Started agent from {agent}")
-                    except subprocess.CalledProcessError:
-                        log(f"Extraction failed for {arch}")
-                # mark as seen
-                imap.store(msg_id, '+FLAGS', '\\Seen')
+                    imap.logout()
+                except Exception:
+                    pass
+        time.sleep(backoff)
+        backoff = min(backoff * 2, RECONNECT_BACKOFF_MAX)
+
+
+def load_accounts(path: Path) -> list[dict]:
+    """Read the staff mailboxes from the pseudo-YAML users.yml.
+
+    Only the `staff:` block is looked at: one mapping per person with mail,
+    login and password_env. password_env is normalised the way .env keys
+    are named (B.ANNA_PASSWORD -> B_ANNA_PASSWORD); when that variable is
+    unset, /home/<login>/.imap_pass is tried.
+    """
+    entries = []
+    in_staff = False
+    for raw in path.read_text(encoding="utf-8").splitlines():
+        line = raw.split("#", 1)[0].rstrip()
+        if not line.strip():
+            continue
+        key, _, value = line.strip().partition(":")
+        if not line[0].isspace():
+            in_staff = key == "staff"
+        elif in_staff:
+            if not value.strip():
+                entries.append({})
+            elif entries:
+                entries[-1][key.strip()] = value.strip().strip("\"'")
+
+    accounts = []
+    for entry in entries:
+        if "mail" not in entry:
+            continue
+        login = entry.get("login") or entry["mail"].split("@", 1)[0]
+        env_key = re.sub(r"[^A-Za-z0-9]", "_", entry.get("password_env") or f"{login}_PASSWORD").upper()
+        home = Path(HOME_TEMPLATE.format(login=login))
+        password = os.getenv(env_key)
+        if not password:
+            try:
+                password = (home / ".imap_pass").read_text(encoding="utf-8", errors="ignore").strip()
+            except OSError:
+                password = None
+        if not password:
+            log(f"[{login}] no password ({env_key} or {home}/.imap_pass), skipping")
+            continue
+        accounts.append({
+            "mail": entry["mail"],
+            "login": login,
+            "password": password,
+            "home": home,
+            "state_file": home / STATE_FILE.name,
+            "stats": {"connected": False, "processed": 0, "errors": 0},
+        })
+    return accounts
+
+
+class IMAPError(Exception):
+    pass
+
+
+# Failures that mean the account's connection has to be rebuilt
+_CONNECTION_ERRORS = (IMAPError, ConnectionError, asyncio.IncompleteReadError, asyncio.TimeoutError)
+
+
+def _imap_quote(arg: str) -> str:
+    return '"' + arg.replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+class AsyncIMAP:
+    """Just enough of an asyncio IMAP4rev1 client for the multi-account mode.
+
+    Untagged responses come back in imaplib's shape (bytes lines and
+    (line, literal) tuples) so parse_fetch() serves both code paths.
+    """
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.reader = reader
+        self.writer = writer
+        self.tag = 0
+        # Set whenever the server reports EXISTS/RECENT, whatever the command
+        self.new_mail = False
+
+    @classmethod
+    async def connect(cls, host: str, port: int) -> "AsyncIMAP":
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), CONNECT_TIMEOUT)
+        imap = cls(reader, writer)
+        greeting = await asyncio.wait_for(reader.readline(), CONNECT_TIMEOUT)
+        if not greeting.startswith(b"* OK"):
+            writer.close()
+            raise IMAPError(f"unexpected greeting: {greeting!r}")
+        return imap
+
+    async def _read_line(self) -> bytes:
+        line = await self.reader.readline()
+        if not line:
+            raise ConnectionError("connection closed by server")
+        return line
+
+    async def _response(self) -> list:
+        pieces = []
+        line = await self._read_line()
+        while True:
+            m = _LITERAL_RE.search(line)
+            if not m:
+                pieces.append(line.rstrip(b"\r\n"))
+                return pieces
+            literal = await self.reader.readexactly(int(m.group(1)))
+            pieces.append((line.rstrip(b"\r\n"), literal))
+            line = await self._read_line()
+
+    def _note(self, line: bytes) -> None:
+        if line.startswith(b"* BYE"):
+            raise ConnectionError(line.decode("utf-8", "replace").strip())
+        if _NEW_MAIL_RE.match(line):
+            self.new_mail = True
+
+    async def command(self, *args: str) -> list:
+        """Run one command; returns its untagged responses, raises on NO/BAD."""
+        self.tag += 1
+        tag = b"A%04d" % self.tag
+        self.writer.write(tag + b" " + " ".join(args).encode("utf-8") + b"\r\n")
+        await self.writer.drain()
+        untagged = []
+        while True:
+            pieces = await asyncio.wait_for(self._response(), CONNECT_TIMEOUT)
+            first = pieces[0][0] if isinstance(pieces[0], tuple) else pieces[0]
+            if first.startswith(tag + b" "):
+                if not first[len(tag) + 1:].startswith(b"OK"):
+                    raise IMAPError(f"{args[0]} failed: {first.decode('utf-8', 'replace')}")
+                return untagged
+            self._note(first)
+            untagged.append(pieces)
+
+    async def idle(self, timeout: float) -> bool:
+        """Async twin of idle(): True once the server reports new mail."""
+        self.tag += 1
+        tag = b"A%04d" % self.tag
+        self.writer.write(tag + b" IDLE\r\n")
+        await self.writer.drain()
+        while True:
+            line = await asyncio.wait_for(self._read_line(), CONNECT_TIMEOUT)
+            if line.startswith(b"+"):
+                break
+            if line.startswith(tag):
+                raise IMAPError(f"IDLE rejected: {line.decode('utf-8', 'replace').strip()}")
+            self._note(line)
+        deadline = time.monotonic() + timeout
+        while not self.new_mail:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                # readline() is cancellation-safe: a partial line stays buffered
+                line = await asyncio.wait_for(self.reader.readline(), remaining)
+            except asyncio.TimeoutError:
+                break
+            if not line:
+                raise ConnectionError("connection closed during IDLE")
+            self._note(line)
+        self.writer.write(b"DONE\r\n")
+        await self.writer.drain()
+        while True:
+            line = await asyncio.wait_for(self._read_line(), CONNECT_TIMEOUT)
+            if line.startswith(tag + b" "):
+                if not line[len(tag) + 1:].startswith(b"OK"):
+                    raise IMAPError(f"IDLE failed: {line.decode('utf-8', 'replace').strip()}")
+                return self.new_mail
+            self._note(line)
+
+    async def close(self) -> None:
+        try:
+            await asyncio.wait_for(self.command("LOGOUT"), 5)
+        except Exception:
+            pass
+        self.writer.close()
+
+
+def _untagged(untagged: list, keyword: bytes) -> list:
+    # Flatten the responses of one kind (e.g. b"FETCH") for parse_fetch()
+    out = []
+    for pieces in untagged:
+        first = pieces[0][0] if isinstance(pieces[0], tuple) else pieces[0]
+        # "* 12 FETCH (...)" or "* SEARCH ..."
+        if keyword in first.split(b" ", 3)[1:3]:
+            out.extend(pieces)
+    return out
+
+
+async def fetch_section_async(imap: AsyncIMAP, uid: int, section: str):
+    """Async twin of fetch_section()."""
+    offset = 0
+    while True:
+        untagged = await imap.command("UID", "FETCH", str(uid), f"(BODY.PEEK[{section}]<{offset}.{FETCH_CHUNK}>)")
+        chunk = b""
+        for item in parse_fetch(_untagged(untagged, b"FETCH")):
+            for key, value in item.items():
+                if key.startswith("BODY["):
+                    chunk = value if isinstance(value, bytes) else b""
+        if chunk:
+            yield chunk
+        offset += len(chunk)
+        if len(chunk) < FETCH_CHUNK:
+            return
+
+
+async def process_message_async(acct: dict, imap: AsyncIMAP, uid: int, structure: list, pool) -> None:
+    """process_message() for one account of the multi-account mode.
+
+    IMAP transfers run on the event loop; 7z and the agent start go to the
+    shared worker pool so a slow extraction never stalls other mailboxes.
+    """
+    home = acct["home"]
+    prefix = f"[{acct['login']}]"
+    home.mkdir(parents=True, exist_ok=True)
+    if SAVE_EML:
+        # Single full pass, as in process_message()
+        try:
+            with full_pass(structure, home, f"{prefix} ") as (feed, result):
+                async for chunk in fetch_section_async(imap, uid, ""):
+                    feed(chunk)
+        except _CONNECTION_ERRORS:
+            raise
+        except OSError as e:
+            log(f"{prefix} Failed to save email.eml: {e}")
+        else:
+            if result["saved"]:
+                await asyncio.get_running_loop().run_in_executor(
+                    pool, open_archives, result["saved"], result["password"], home
+                )
+            return
+    text_parts, archives = classify_parts(structure)
+    texts = []
+    for section, part in text_parts:
+        feed = transfer_decoder(part["encoding"])
+        payload = [feed(chunk) async for chunk in fetch_section_async(imap, uid, section)]
+        payload.append(feed(b"", final=True))
+        texts.append(decode_text(b"".join(payload), part))
+    pwd = find_password("\n".join(texts)) or ""
+    print(f"{prefix} Extracted password from email: {pwd}")
+    saved = []
+    for section, part in archives:
+        dst = home / part["filename"]
+        print(f"{prefix} Saving to: {dst}")
+        feed = transfer_decoder(part["encoding"])
+        with atomic_writer(dst) as fh:
+            async for chunk in fetch_section_async(imap, uid, section):
+                fh.write(feed(chunk))
+            fh.write(feed(b"", final=True))
+        saved.append(dst)
+    if saved:
+        await asyncio.get_running_loop().run_in_executor(pool, open_archives, saved, pwd, home)
+
+
+def _record_latency(stats: dict, received: float | None, started: float) -> None:
+    now = time.time()
+    stats["processed"] += 1
+    stats["last_processing_s"] = round(now - started, 3)
+    if received is not None:
+        # Delivery (INTERNALDATE, 1 s resolution) to handled
+        latency = max(0.0, now - received)
+        n = stats.get("latency_samples", 0) + 1
+        stats["latency_samples"] = n
+        stats["last_latency_s"] = round(latency, 3)
+        stats["avg_latency_s"] = round(stats.get("avg_latency_s", 0.0) + (latency - stats.get("avg_latency_s", 0.0)) / n, 3)
+        stats["max_latency_s"] = round(max(stats.get("max_latency_s", 0.0), latency), 3)
+
+
+def _internaldate(value) -> float | None:
+    if not isinstance(value, bytes):
+        return None
+    parsed = imaplib.Internaldate2tuple(b'INTERNALDATE "' + value + b'"')
+    return time.mktime(parsed) if parsed else None
+
+
+async def check_account(acct: dict, imap: AsyncIMAP, validity: int, pool) -> None:
+    """check_mailbox() for one account of the multi-account mode."""
+    stats = acct["stats"]
+    last_uid = start_uid(load_state(acct["state_file"]), validity, f"[{acct['login']}] ")
+    criteria = "ALL" if last_uid is None else f"UID {last_uid + 1}:*"
+    found = []
+    for pieces in await imap.command("UID", "SEARCH", criteria):
+        line = pieces[0] if isinstance(pieces[0], bytes) else pieces[0][0]
+        if line.startswith(b"* SEARCH"):
+            found += [int(u) for u in line.split()[2:]]
+    uids = pick_new_uids(found, last_uid)
+    if not uids:
+        if last_uid is None:
+            save_state({"uidvalidity": validity, "last_uid": 0}, acct["state_file"])
+        return
+    for i in range(0, len(uids), FETCH_BATCH):
+        batch = uids[i:i + FETCH_BATCH]
+        untagged = await imap.command("UID", "FETCH", _uid_set(batch), "(UID INTERNALDATE BODYSTRUCTURE)")
+        items = {int(item["UID"]): item for item in parse_fetch(_untagged(untagged, b"FETCH")) if "UID" in item}
+        for uid in sorted(items):
+            started = time.time()
+            try:
+                await process_message_async(acct, imap, uid, items[uid].get("BODYSTRUCTURE") or [], pool)
+            except _CONNECTION_ERRORS:
+                raise
             except Exception as e:
-                log(f"Process message error: {e}")
-                continue
+                log(f"[{acct['login']}] Process message error: {e}")
+            save_state({"uidvalidity": validity, "last_uid": uid}, acct["state_file"])
+            _record_latency(stats, _internaldate(items[uid].get("INTERNALDATE")), started)
+            stats["last_uid"] = uid
+            log(f"[{acct['login']}] uid {uid} handled in {stats['last_processing_s']}s"
+                f" ({stats.get('last_latency_s', '?')}s after delivery)")
+            write_status_file(STATUS_FILE, [acct])
+        await imap.command("UID", "STORE", _uid_set(batch), "+FLAGS", "(\\Seen)")
+
+
+async def watch_account(acct: dict, pool) -> None:
+    """watch() for one account: IDLE, NOOP keepalive, reconnect with backoff."""
+    stats = acct["stats"]
+    backoff = 1
+    while True:
+        imap = None
+        try:
+            imap = await AsyncIMAP.connect(IMAP_HOST, IMAP_PORT)
+            await imap.command("LOGIN", _imap_quote(acct["mail"]), _imap_quote(acct["password"]))
+            capabilities = set()
+            for pieces in await imap.command("CAPABILITY"):
+                line = pieces[0] if isinstance(pieces[0], bytes) else pieces[0][0]
+                if line.startswith(b"* CAPABILITY"):
+                    capabilities |= set(line.decode("ascii", "replace").upper().split()[2:])
+            validity = 0
+            for pieces in await imap.command("SELECT", "Junk"):
+                line = pieces[0] if isinstance(pieces[0], bytes) else pieces[0][0]
+                m = _UIDVALIDITY_RE.search(line)
+                if m:
+                    validity = int(m.group(1))
+            use_idle = "IDLE" in capabilities
+            log(f"[{acct['login']}] Watching Junk ({'IDLE' if use_idle else 'NOOP polling'})")
+            stats["connected"] = True
+            write_status_file(STATUS_FILE, [acct])
+            backoff = 1
+            changed = True
+            while True:
+                if changed:
+                    imap.new_mail = False
+                    await check_account(acct, imap, validity, pool)
+                # Mail that arrived while we were busy processing
+                if imap.new_mail:
+                    changed = True
+                    continue
+                if use_idle:
+                    changed = await imap.idle(IDLE_TIMEOUT)
+                else:
+                    await asyncio.sleep(POLL_INTERVAL)
+                    changed = False
+                if not changed:
+                    await imap.command("NOOP")
+                    changed = imap.new_mail
+        except _CONNECTION_ERRORS + (OSError,) as e:
+            log(f"[{acct['login']}] IMAP connection lost: {e or type(e).__name__}; reconnecting in {backoff}s")
+            stats["connected"] = False
+            stats["errors"] += 1
+            stats["last_error"] = str(e) or type(e).__name__
+            write_status_file(STATUS_FILE, [acct])
+        finally:
+            if imap is not None:
+                await imap.close()
+        await asyncio.sleep(backoff)
+        backoff = min(backoff * 2, RECONNECT_BACKOFF_MAX)
+
+
+_status: dict = {}
+
+
+def write_status_file(path: Path, accounts: list[dict]) -> None:
+    """Merge the accounts' stats into the JSON status file (atomic replace)."""
+    for acct in accounts:
+        _status[acct["mail"]] = acct["stats"]
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(path.name + ".tmp")
+        tmp.write_text(json.dumps({"updated": int(time.time()), "accounts": _status}, indent=2), encoding="utf-8")
+        tmp.replace(path)
+    except OSError as e:
+        log(f"Failed to write status file {path}: {e}")
+
+
+async def report_latency(accounts: list[dict]) -> None:
+    while True:
+        await asyncio.sleep(REPORT_INTERVAL)
+        for acct in accounts:
+            st = acct["stats"]
+            log(
+                f"[{acct['login']}] {'up' if st['connected'] else 'down'} processed={st['processed']}"
+                f" latency last={st.get('last_latency_s', '-')}s avg={st.get('avg_latency_s', '-')}s"
+                f" max={st.get('max_latency_s', '-')}s errors={st['errors']}"
+            )
+
+
+async def watch_accounts(accounts: list[dict], workers: int) -> int:
+    """Watch all mailboxes concurrently from one event loop.
+
+    One connection per account; message handling that blocks (7z, starting
+    the agent) shares a pool of `workers` threads.
+    """
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers, thread_name_prefix="mail") as pool:
+        tasks = [asyncio.create_task(watch_account(acct, pool)) for acct in accounts]
+        tasks.append(asyncio.create_task(report_latency(accounts)))
+        await asyncio.gather(*tasks)
+    return 0
+
+
+def iter_bulk_jobs(source: Path):
+    """Yield (path, offset, length) for every message under source.
+
+    source is a directory (searched recursively for *.eml), an mbox file or
+    a single .eml. For mbox the file is scanned once for From_ lines and
+    only offsets are handed out, so workers read their own message and
+    nothing large crosses the process boundary. length -1 means whole file.
+    """
+    if source.is_dir():
+        for path in sorted(source.rglob("*.eml")):
+            if path.is_file():
+                yield str(path), 0, -1
+        return
+    with source.open("rb") as fh:
+        if not fh.read(5) == b"From ":
+            yield str(source), 0, -1
+            return
+        fh.seek(0)
+        start = None
+        offset = 0
+        blank = True
+        for line in fh:
+            if blank and line.startswith(b"From "):
+                if start is not None:
+                    yield str(source), start, offset - start
+                start = offset
+            blank = line in (b"\n", b"\r\n")
+            offset += len(line)
+        if start is not None:
+            yield str(source), start, offset - start
+
+
+def _header_text(value) -> str | None:
+    if value is None:
+        return None
+    out = []
+    for data, charset in decode_header(value):
+        if isinstance(data, str):
+            out.append(data)
+            continue
+        # Raw 8-bit headers come back as "unknown-8bit"; utf-8 is the best guess
+        if charset in (None, "unknown-8bit"):
+            charset = "utf-8"
+        try:
+            out.append(data.decode(charset, errors="replace"))
+        except LookupError:
+            out.append(data.decode("utf-8", errors="replace"))
+    return "".join(out)
+
+
+def analyze_message(job: tuple[str, int, int]) -> dict:
+    """Run the watcher's parsing on one stored message; never extracts or runs anything.
+
+    Archives are only measured and hashed in memory. Runs in a worker
+    process of bulk_analyze().
+    """
+    path, offset, length = job
+    record = {"source": path if length < 0 else f"{path}@{offset}"}
+    t0 = time.perf_counter()
+    try:
+        with open(path, "rb") as fh:
+            if length < 0:
+                raw = fh.read()
+            else:
+                fh.seek(offset)
+                # Drop the mbox From_ separator line
+                raw = fh.read(length).split(b"\n", 1)[-1]
+        t1 = time.perf_counter()
+        msg = email.message_from_bytes(raw)
+        t2 = time.perf_counter()
+        text = extract_all_text(msg)
+        archives = []
+        for part in msg.walk():
+            fname = part.get_filename()
+            if is_archive_part(part, fname):
+                data = part.get_payload(decode=True) or b""
+                archives.append({
+                    "filename": None if fname is None else str(fname),
+                    "content_type": part.get_content_type(),
+                    "size": len(data),
+                    "sha256": hashlib.sha256(data).hexdigest(),
+                })
+        t3 = time.perf_counter()
+        record.update({
+            "bytes": len(raw),
+            # Raw 8-bit headers come back as email.header.Header; keep only str in the record
+            "message_id": _header_text(msg.get("Message-ID")),
+            "from": _header_text(msg.get("From")),
+            "subject": _header_text(msg.get("Subject")),
+            "spam": {k: _header_text(msg.get(k)) for k in SPAM_HEADERS if msg.get(k) is not None},
+            "password": find_password(text),
+            "archives": archives,
+            "read_ms": round((t1 - t0) * 1000, 3),
+            "parse_ms": round((t2 - t1) * 1000, 3),
+            "analyze_ms": round((t3 - t2) * 1000, 3),
+        })
+    except Exception as e:
+        record["error"] = f"{type(e).__name__}: {e}"
+    record["total_ms"] = round((time.perf_counter() - t0) * 1000, 3)
+    return record
+
+
+def bulk_analyze(source: Path, report, jobs: int) -> int:
+    """Replay a corpus through analyze_message() in a process pool.
+
+    Writes one JSON line per message to report in input order and a
+    summary to stderr. At most jobs * 4 messages are in flight, so memory
+    does not grow with the corpus.
+    """
+    started = time.perf_counter()
+    count = errors = with_password = with_archives = 0
+    totals = []
+    window = collections.deque()
+
+    def emit(record: dict) -> None:
+        nonlocal count, errors, with_password, with_archives
+        count += 1
+        errors += "error" in record
+        with_password += bool(record.get("password"))
+        with_archives += bool(record.get("archives"))
+        totals.append(record.get("total_ms", 0))
+        try:
+            line = json.dumps(record, ensure_ascii=False)
+        except (TypeError, ValueError) as e:
+            # One unserialisable record must not abort the whole run
+            errors += "error" not in record
+            line = json.dumps({
+                "source": str(record.get("source")),
+                "error": f"{type(e).__name__}: {e}",
+                "total_ms": record.get("total_ms"),
+            }, ensure_ascii=False)
+        report.write(line + "\n")
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as pool:
+        for job in iter_bulk_jobs(source):
+            window.append(pool.submit(analyze_message, job))
+            if len(window) >= jobs * 4:
+                emit(window.popleft().result())
+        while window:
+            emit(window.popleft().result())
+
+    elapsed = time.perf_counter() - started
+    totals.sort()
+    p50 = totals[len(totals) // 2] if totals else 0
+    p95 = totals[int(len(totals) * 0.95)] if totals else 0
+    print(
+        f"{count} message(s) in {elapsed:.2f}s ({count / elapsed if elapsed else 0:.0f}/s, {jobs} job(s)); "
+        f"password={with_password} archives={with_archives} errors={errors}; "
+        f"per message p50={p50:.1f}ms p95={p95:.1f}ms",
+        file=sys.stderr,
+    )
+    return 1 if errors else 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Process new mail in the Junk folder")
+    parser.add_argument(
+        "--idle",
+        action="store_true",
+        default=WATCH_MODE == "idle",
+        help="stay connected and react to new mail via IMAP IDLE (env EMAIL_WATCH_MODE=idle)",
+    )
+    parser.add_argument(
+        "--accounts",
+        type=Path,
+        default=os.getenv("EMAIL_ACCOUNTS_FILE") or None,
+        help="watch every staff mailbox from this users.yml concurrently (env EMAIL_ACCOUNTS_FILE)",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=int(os.getenv("EMAIL_WORKERS", "4")),
+        help="worker threads for archive extraction in --accounts mode",
+    )
+    parser.add_argument(
+        "--bulk",
+        type=Path,
+        help="offline: analyze a directory of .eml files or an mbox instead of watching IMAP",
+    )
+    parser.add_argument("--report", default="-", help="JSONL report for --bulk (default: stdout)")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1, help="worker processes for --bulk")
+    args = parser.parse_args(argv)
+
+    if args.bulk:
+        if args.report == "-":
+            return bulk_analyze(args.bulk, sys.stdout, args.jobs)
+        with open(args.report, "w", encoding="utf-8") as report:
+            return bulk_analyze(args.bulk, report, args.jobs)
+
+    if args.accounts:
+        accounts = load_accounts(args.accounts)
+        if not accounts:
+            log(f"No usable accounts in {args.accounts}")
+            return 1
+        try:
+            return asyncio.run(watch_accounts(accounts, args.workers))
+        except KeyboardInterrupt:
+            return 0
+
+    pw = read_password()
+    if not pw:
+        log("No mailbox password available (env or ~/.imap_pass)")
+        return 1
+    if args.idle:
+        return watch(pw)
+    try:
+        imap = connect(pw)
+        rc = check_mailbox(imap)
         imap.logout()
-        return 0
+        return rc
     except Exception as e:
         log(f"IMAP error: {e}")
         return 1
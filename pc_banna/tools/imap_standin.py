@@ -0,0 +1,436 @@
+#!/usr/bin/env python3
+"""Local IMAP stand-in for testing email_watcher.py without the mail server.
+
+Serves a directory tree as IMAP4rev1 mailboxes:
+
+    ROOT/<user>/<Mailbox>/*.eml
+
+where <user> is the local part of the login name. Any password is accepted
+unless --password is given. Files dropped into a mailbox directory (written
+under a dot-name and renamed, or via the `deliver` subcommand) become new
+messages and are pushed to IDLE clients as `* N EXISTS` within --scan seconds.
+
+Implements the subset the watcher uses: CAPABILITY, LOGIN, SELECT/EXAMINE,
+SEARCH (ALL, UNSEEN, UID), FETCH (RFC822, FLAGS, UID, INTERNALDATE,
+BODYSTRUCTURE and BODY[.PEEK][section]<offset.length>), STORE, their UID variants, NOOP, IDLE
+and LOGOUT. UIDVALIDITY changes with every server start.
+
+    python3 imap_standin.py serve --root /tmp/mail --port 1143
+    python3 imap_standin.py deliver --root /tmp/mail b.anna Junk sample.eml
+"""
+import argparse
+import imaplib
+import os
+import re
+import select
+import shlex
+import socketserver
+import sys
+import threading
+import time
+from email import message_from_bytes
+from email.policy import compat32
+from pathlib import Path
+
+_BODY_ITEM_RE = re.compile(r"BODY(\.PEEK)?\[([^\]]*)\](?:<(\d+)\.(\d+)>)?$")
+
+
+class Mailbox:
+    """Messages of one mailbox directory in delivery (sequence) order."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.uidvalidity = int(time.time())
+        self.names: list[str] = []
+        self.uids: list[int] = []
+        self.flags: dict[str, set[str]] = {}
+
+    def scan(self) -> int:
+        with self.lock:
+            known = set(self.names)
+            try:
+                found = sorted(
+                    p.name for p in self.path.iterdir()
+                    if p.suffix == ".eml" and not p.name.startswith(".")
+                )
+            except FileNotFoundError:
+                found = []
+            for name in found:
+                if name not in known:
+                    self.names.append(name)
+                    self.uids.append(len(self.uids) + 1)
+                    self.flags[name] = set()
+            return len(self.names)
+
+    def read(self, seq: int) -> bytes:
+        return (self.path / self.names[seq - 1]).read_bytes()
+
+    def internaldate(self, seq: int) -> str:
+        # Delivery time is the file's mtime
+        return imaplib.Time2Internaldate((self.path / self.names[seq - 1]).stat().st_mtime)
+
+
+def parse_set(spec: str, maximum: int) -> list[int]:
+    """Expand an IMAP sequence set like '1:3,7,9:*' against maximum."""
+    out = []
+    for item in spec.split(","):
+        lo, _, hi = item.partition(":")
+        lo_n = maximum if lo == "*" else int(lo)
+        hi_n = lo_n if not hi else (maximum if hi == "*" else int(hi))
+        lo_n, hi_n = min(lo_n, hi_n), max(lo_n, hi_n)
+        out.extend(n for n in range(lo_n, hi_n + 1) if 1 <= n <= maximum)
+    return out
+
+
+def _raw(text: str) -> bytes:
+    # The parser decoded the message as ASCII with surrogateescape
+    return text.encode("ascii", "surrogateescape")
+
+
+def _quote(value) -> str:
+    if value is None:
+        return "NIL"
+    if isinstance(value, tuple):
+        # RFC 2231 (charset, language, value)
+        value = value[2]
+    return '"' + str(value).replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+def _param_list(pairs) -> str:
+    if not pairs:
+        return "NIL"
+    return "(" + " ".join(f"{_quote(k.upper())} {_quote(v)}" for k, v in pairs) + ")"
+
+
+def body_bytes(part) -> bytes:
+    # _payload, not get_payload(): compat32 charset-decodes 8bit bodies there
+    payload = part._payload
+    if isinstance(payload, list):
+        return b"".join(p.as_bytes() for p in payload)
+    return _raw(payload)
+
+
+def bodystructure(part) -> str:
+    """Render the RFC 3501 BODYSTRUCTURE of a parsed message."""
+    if part.get_content_maintype() == "multipart":
+        children = "".join(bodystructure(p) for p in part.get_payload())
+        return f"({children} {_quote(part.get_content_subtype().upper())})"
+    body = body_bytes(part)
+    fields = [
+        _quote(part.get_content_maintype().upper()),
+        _quote(part.get_content_subtype().upper()),
+        _param_list((part.get_params() or [])[1:]),
+        _quote(part.get("Content-ID")),
+        _quote(part.get("Content-Description")),
+        _quote(part.get("Content-Transfer-Encoding", "7bit").strip().upper()),
+        str(len(body)),
+    ]
+    if part.get_content_type() == "message/rfc822":
+        fields += ["NIL", bodystructure(part.get_payload(0)), str(body.count(b"\n"))]
+    elif part.get_content_maintype() == "text":
+        fields.append(str(body.count(b"\n")))
+    disposition = "NIL"
+    if part.get_content_disposition():
+        params = (part.get_params(header="content-disposition") or [])[1:]
+        disposition = f"({_quote(part.get_content_disposition().upper())} {_param_list(params)})"
+    fields += ["NIL", disposition, "NIL", "NIL"]
+    return "(" + " ".join(fields) + ")"
+
+
+def body_section(raw: bytes, msg, section: str) -> bytes:
+    """Bytes of BODY[section]: '', HEADER, TEXT or a part number like 2.1."""
+    head, sep, text = raw.partition(b"\r\n\r\n")
+    if not sep:
+        head, sep, text = raw.partition(b"\n\n")
+    if section == "":
+        return raw
+    if section.upper() == "HEADER":
+        return head + sep
+    if section.upper() == "TEXT":
+        return text
+    part = msg
+    for number in section.split("."):
+        if part.get_content_type() == "message/rfc822":
+            part = part.get_payload(0)
+        if part.is_multipart():
+            part = part.get_payload(int(number) - 1)
+        elif number != "1":
+            raise ValueError(f"no section {section}")
+    return body_bytes(part)
+
+
+class Session(socketserver.StreamRequestHandler):
+    def setup(self):
+        super().setup()
+        self.user = None
+        self.box = None
+        self.readonly = False
+        self.exists = 0
+        self._parsed = (None, b"", None)
+        self._sections = {}
+
+    def parsed(self, seq: int):
+        # Chunked clients fetch the same message many times in a row
+        name = self.box.names[seq - 1]
+        if self._parsed[0] != name:
+            raw = self.box.read(seq)
+            self._parsed = (name, raw, message_from_bytes(raw, policy=compat32))
+            self._sections = {}
+        return self._parsed[1], self._parsed[2]
+
+    def section(self, seq: int, section: str) -> bytes:
+        raw, msg = self.parsed(seq)
+        if section not in self._sections:
+            self._sections[section] = body_section(raw, msg, section)
+        return self._sections[section]
+
+    def send(self, data: str | bytes) -> None:
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        self.wfile.write(data + b"\r\n")
+        self.wfile.flush()
+
+    def notify(self) -> None:
+        # Report messages delivered since the client last heard about the box
+        if self.box is None:
+            return
+        count = self.box.scan()
+        if count > self.exists:
+            self.exists = count
+            self.send(f"* {count} EXISTS")
+
+    def handle(self):
+        self.send("* OK [CAPABILITY IMAP4rev1 IDLE] IMAP stand-in ready")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            tag, _, rest = line.decode("utf-8", "replace").rstrip("\r\n").partition(" ")
+            cmd, _, args = rest.partition(" ")
+            handler = getattr(self, "cmd_" + cmd.lower(), None)
+            if handler is None:
+                self.send(f"{tag} BAD unknown command {cmd}")
+                continue
+            if cmd.lower() not in ("capability", "login", "logout") and self.user is None:
+                self.send(f"{tag} NO not authenticated")
+                continue
+            try:
+                if handler(tag, args) is False:
+                    return
+            except (ValueError, IndexError, OSError) as e:
+                self.send(f"{tag} BAD {e}")
+
+    def cmd_capability(self, tag, args):
+        self.send("* CAPABILITY IMAP4rev1 IDLE")
+        self.send(f"{tag} OK CAPABILITY completed")
+
+    def cmd_login(self, tag, args):
+        user, password = shlex.split(args)
+        expected = self.server.password
+        if expected is not None and password != expected:
+            self.send(f"{tag} NO [AUTHENTICATIONFAILED] invalid credentials")
+            return
+        self.user = user.split("@", 1)[0]
+        self.send(f"{tag} OK LOGIN completed")
+
+    def cmd_logout(self, tag, args):
+        self.send("* BYE logging out")
+        self.send(f"{tag} OK LOGOUT completed")
+        return False
+
+    def seqs_for(self, spec: str, uid: bool) -> list[int]:
+        # Resolve a sequence set, or a UID set when uid is True, to sequence numbers
+        if not uid:
+            return parse_set(spec, self.exists)
+        uids = self.box.uids[:self.exists]
+        wanted = set(parse_set(spec, uids[-1] if uids else 0))
+        return [i + 1 for i, u in enumerate(uids) if u in wanted]
+
+    def cmd_uid(self, tag, args):
+        cmd, _, rest = args.partition(" ")
+        handler = {"fetch": self.cmd_fetch, "search": self.cmd_search, "store": self.cmd_store}.get(cmd.lower())
+        if handler is None:
+            self.send(f"{tag} BAD unsupported UID command {cmd}")
+            return
+        return handler(tag, rest, uid=True)
+
+    def cmd_select(self, tag, args, readonly=False):
+        name = shlex.split(args)[0]
+        path = self.server.root / self.user / name
+        if not path.is_dir():
+            self.box = None
+            self.send(f"{tag} NO mailbox {name} does not exist")
+            return
+        self.box = self.server.mailbox(path)
+        self.readonly = readonly
+        self.exists = self.box.scan()
+        self.send(f"* {self.exists} EXISTS")
+        self.send("* 0 RECENT")
+        self.send(f"* OK [UIDVALIDITY {self.box.uidvalidity}] UIDs valid")
+        self.send(f"* OK [UIDNEXT {len(self.box.uids) + 1}] predicted next UID")
+        self.send("* FLAGS (\\Answered \\Flagged \\Deleted \\Seen \\Draft)")
+        mode = "READ-ONLY" if readonly else "READ-WRITE"
+        self.send(f"{tag} OK [{mode}] {'EXAMINE' if readonly else 'SELECT'} completed")
+
+    def cmd_examine(self, tag, args):
+        return self.cmd_select(tag, args, readonly=True)
+
+    def cmd_noop(self, tag, args):
+        self.notify()
+        self.send(f"{tag} OK NOOP completed")
+
+    def cmd_search(self, tag, args, uid=False):
+        if self.box is None:
+            self.send(f"{tag} NO no mailbox selected")
+            return
+        self.notify()
+        seqs = list(range(1, self.exists + 1))
+        words = args.split()
+        for i, word in enumerate(words):
+            if word.upper() == "UNSEEN":
+                seqs = [n for n in seqs if "\\Seen" not in self.box.flags[self.box.names[n - 1]]]
+            elif word.upper() == "UID":
+                matched = set(self.seqs_for(words[i + 1], uid=True))
+                seqs = [n for n in seqs if n in matched]
+        found = [self.box.uids[n - 1] for n in seqs] if uid else seqs
+        self.send("* SEARCH" + "".join(f" {n}" for n in found))
+        self.send(f"{tag} OK SEARCH completed")
+
+    def cmd_fetch(self, tag, args, uid=False):
+        if self.box is None:
+            self.send(f"{tag} NO no mailbox selected")
+            return
+        spec, _, items = args.partition(" ")
+        items = items.strip().strip("()").upper().split()
+        if uid and "UID" not in items:
+            items.insert(0, "UID")
+        for seq in self.seqs_for(spec, uid):
+            name = self.box.names[seq - 1]
+            parts = []
+            for item in items:
+                if item == "UID":
+                    parts.append(b"UID %d" % self.box.uids[seq - 1])
+                elif item == "RFC822":
+                    data = self.box.read(seq)
+                    parts.append(b"RFC822 {%d}\r\n" % len(data) + data)
+                    if not self.readonly:
+                        self.box.flags[name].add("\\Seen")
+                elif item == "FLAGS":
+                    parts.append(f"FLAGS ({' '.join(sorted(self.box.flags[name]))})".encode())
+                elif item == "INTERNALDATE":
+                    parts.append(f"INTERNALDATE {self.box.internaldate(seq)}".encode())
+                elif item == "BODYSTRUCTURE":
+                    _, msg = self.parsed(seq)
+                    parts.append(b"BODYSTRUCTURE " + bodystructure(msg).encode("utf-8", "surrogateescape"))
+                elif _BODY_ITEM_RE.match(item):
+                    peek, section, offset, length = _BODY_ITEM_RE.match(item).groups()
+                    data = self.section(seq, section)
+                    key = f"BODY[{section}]"
+                    if offset is not None:
+                        data = data[int(offset):int(offset) + int(length)]
+                        key += f"<{offset}>"
+                    parts.append(key.encode() + b" {%d}\r\n" % len(data) + data)
+                    if not peek and not self.readonly:
+                        self.box.flags[name].add("\\Seen")
+                else:
+                    raise ValueError(f"unsupported fetch item {item}")
+            self.send(b"* %d FETCH (" % seq + b" ".join(parts) + b")")
+        self.send(f"{tag} OK FETCH completed")
+
+    def cmd_store(self, tag, args, uid=False):
+        if self.box is None:
+            self.send(f"{tag} NO no mailbox selected")
+            return
+        spec, op, flags = args.split(" ", 2)
+        flags = set(flags.strip("()").split())
+        for seq in self.seqs_for(spec, uid):
+            current = self.box.flags[self.box.names[seq - 1]]
+            if op.upper().startswith("+FLAGS"):
+                current |= flags
+            elif op.upper().startswith("-FLAGS"):
+                current -= flags
+            else:
+                current.clear()
+                current |= flags
+            if not op.upper().endswith(".SILENT"):
+                uid_item = f"UID {self.box.uids[seq - 1]} " if uid else ""
+                self.send(f"* {seq} FETCH ({uid_item}FLAGS ({' '.join(sorted(current))}))")
+        self.send(f"{tag} OK STORE completed")
+
+    def cmd_idle(self, tag, args):
+        self.send("+ idling")
+        while True:
+            ready, _, _ = select.select([self.connection], [], [], self.server.scan_interval)
+            if ready:
+                line = self.rfile.readline()
+                if not line:
+                    return False
+                if line.strip().upper() == b"DONE":
+                    self.send(f"{tag} OK IDLE terminated")
+                    return
+                self.send(f"{tag} BAD expected DONE")
+                return
+            self.notify()
+
+
+class Server(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, address, root: Path, password: str | None, scan_interval: float):
+        super().__init__(address, Session)
+        self.root = root
+        self.password = password
+        self.scan_interval = scan_interval
+        self._boxes: dict[Path, Mailbox] = {}
+        self._lock = threading.Lock()
+
+    def mailbox(self, path: Path) -> Mailbox:
+        with self._lock:
+            if path not in self._boxes:
+                self._boxes[path] = Mailbox(path)
+            return self._boxes[path]
+
+
+def deliver(root: Path, user: str, mailbox: str, source: Path) -> Path:
+    """Atomically drop source into the mailbox as the newest message."""
+    box = root / user / mailbox
+    box.mkdir(parents=True, exist_ok=True)
+    tmp = box / f".{os.getpid()}.tmp"
+    tmp.write_bytes(source.read_bytes())
+    dst = box / f"{time.time_ns()}.eml"
+    tmp.replace(dst)
+    return dst
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("serve", help="run the IMAP server")
+    p.add_argument("--root", type=Path, required=True)
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--port", type=int, default=1143)
+    p.add_argument("--password", help="only accept this password")
+    p.add_argument("--scan", type=float, default=0.1, help="mailbox rescan interval while idling")
+    p = sub.add_parser("deliver", help="append an .eml file to a mailbox")
+    p.add_argument("--root", type=Path, required=True)
+    p.add_argument("user")
+    p.add_argument("mailbox")
+    p.add_argument("eml", type=Path)
+    args = parser.parse_args(argv)
+
+    if args.command == "deliver":
+        print(deliver(args.root, args.user, args.mailbox, args.eml))
+        return 0
+    with Server((args.host, args.port), args.root, args.password, args.scan) as server:
+        print(f"IMAP stand-in on {args.host}:{server.server_address[1]} serving {args.root}", flush=True)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
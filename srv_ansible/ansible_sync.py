@@ -1,10 +1,82 @@
 #!/usr/bin/env python3
+import asyncio
+import atexit
+import datetime
+import gzip
 import os
+import queue
+import re
 import sys
+import json
+import hashlib
 import logging
+import logging.handlers
 import pathlib
 import shutil
 import subprocess
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+
+_log_listeners = []
+
+
+def _stop_log_listeners() -> None:
+    # Drain every queue before the interpreter exits
+    while _log_listeners:
+        _log_listeners.pop().stop()
+
+
+atexit.register(_stop_log_listeners)
+
+
+def gzip_rotator(source: str, dest: str) -> None:
+    # Copy + truncate instead of rename: the logs are bind-mounted single
+    # files in docker-compose and cannot be renamed inside the container
+    with open(source, "rb") as src, gzip.open(dest, "wb") as dst:
+        shutil.copyfileobj(src, dst, 1024 * 1024)
+    with open(source, "r+b") as fh:
+        fh.truncate(0)
+
+
+def rollover_gzip(path: pathlib.Path, backup_count: int) -> None:
+    """Shift path.N.gz -> path.N+1.gz and compress path into path.1.gz."""
+    for i in range(backup_count - 1, 0, -1):
+        src = path.with_name(f"{path.name}.{i}.gz")
+        if src.exists():
+            src.replace(path.with_name(f"{path.name}.{i + 1}.gz"))
+    if backup_count > 0:
+        gzip_rotator(str(path), str(path.with_name(f"{path.name}.1.gz")))
+    else:
+        with path.open("r+b") as fh:
+            fh.truncate(0)
+
+
+def make_file_handler(log_file: str) -> logging.Handler:
+    """Rotating file handler configured from LOG_MAX_BYTES / LOG_ROTATE_WHEN.
+
+    Rotated segments are gzip-compressed and LOG_BACKUP_COUNT of them are
+    kept; with 0 the log is truncated in place at every rollover.
+    LOG_ROTATE_WHEN (e.g. "midnight") switches from size- to time-based
+    rotation.
+    """
+    backups = int(os.environ.get("LOG_BACKUP_COUNT", "5"))
+    when = os.environ.get("LOG_ROTATE_WHEN", "").strip()
+    if when:
+        fh = logging.handlers.TimedRotatingFileHandler(log_file, when=when, backupCount=backups, encoding="utf-8")
+    else:
+        max_bytes = int(os.environ.get("LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+        fh = logging.handlers.RotatingFileHandler(log_file, maxBytes=max_bytes, backupCount=backups, encoding="utf-8")
+    fh.namer = lambda name: name + ".gz"
+    fh.rotator = gzip_rotator
+    if backups <= 0:
+        # The size handler never calls the rotator without backups and the
+        # timed one would keep every segment: drop them and let the reopen
+        # after rollover truncate the file (same inode, bind mounts are fine)
+        fh.rotator = lambda source, dest: None
+        fh.mode = "w"
+    return fh
 
 
 def setup_logger(log_file: str, name: str = "ansible_sync") -> logging.Logger:
@@ -16,25 +88,629 @@ def setup_logger(log_file: str, name: str = "ansible_sync") -> logging.Logger:
         fmt = logging.Formatter("%(asctime)s %(message)s", datefmt="%Y-%m-%d %H:%M:%S")
         sh = logging.StreamHandler(sys.stdout)
         sh.setFormatter(fmt)
-        fh = logging.FileHandler(log_file)
+        fh = make_file_handler(log_file)
         fh.setFormatter(fmt)
-        logger.addHandler(sh)
-        logger.addHandler(fh)
+        # Callers (the smbclient/ansible pipe readers) only enqueue records;
+        # a background thread does the formatting, writing and rotation
+        q = queue.SimpleQueue()
+        listener = logging.handlers.QueueListener(q, sh, fh)
+        listener.start()
+        _log_listeners.append(listener)
+        logger.addHandler(logging.handlers.QueueHandler(q))
     return logger
 
 
+def safe_resolved_path(path: pathlib.Path) -> pathlib.Path:
+    """Resolve a directory the sync may delete inside of.
+
+    Safety guard: raise RuntimeError for an empty path ("" or "."), one that
+    cannot be resolved, or one that resolves to the filesystem root.
+    """
+    if str(path).strip() in ("", "."):
+        raise RuntimeError(f"Refusing to use empty path: {str(path)!r}")
+    try:
+        resolved = path.resolve()
+    except (OSError, RuntimeError) as e:
+        raise RuntimeError(f"Refusing to use unresolvable path {path}: {e}") from e
+    if resolved == pathlib.Path(resolved.anchor):
+        raise RuntimeError(f"Refusing to use unsafe path: {resolved}")
+    return resolved
+
+
 def wipe_directory(path: pathlib.Path, logger: logging.Logger) -> None:
-    # Safety guard: never allow removing root or empty path
-    resolved = path.resolve()
-    if str(resolved) in ("/", ""):
-        raise RuntimeError(f"Refusing to wipe unsafe path: {resolved}")
+    safe_resolved_path(path)
     if path.exists():
         logger.info("Wiping local path: %s", str(path))
         shutil.rmtree(path)
     path.mkdir(parents=True, exist_ok=True)
 
 
-def main() -> int:
+def write_json_atomic(path: pathlib.Path, data) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    with tmp.open("w", encoding="utf-8") as fh:
+        json.dump(data, fh, ensure_ascii=False, separators=(",", ":"))
+        fh.flush()
+        os.fsync(fh.fileno())
+    tmp.replace(path)
+
+
+def read_json(path: pathlib.Path, default):
+    try:
+        with path.open("r", encoding="utf-8") as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        return default
+
+
+def warm_json(warm: dict, path: pathlib.Path, default):
+    """Return the in-memory copy of a state file, reading it from disk only once.
+
+    warm lives as long as the process: a single cron run loads every file
+    once, the daemon keeps them across cycles.
+    """
+    key = str(path)
+    if key not in warm:
+        warm[key] = read_json(path, default)
+    return warm[key]
+
+
+def save_warm(warm: dict, path: pathlib.Path, data) -> None:
+    warm[str(path)] = data
+    write_json_atomic(path, data)
+
+
+def sha256_file(path: pathlib.Path) -> str:
+    h = hashlib.sha256()
+    with path.open("rb") as fh:
+        for chunk in iter(lambda: fh.read(1024 * 1024), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+# Entry of a recursive smbclient 'ls', e.g.
+#   "  hosts.ini                           A      761  Mon Sep 22 17:41:31 2025"
+_LS_ENTRY_RE = re.compile(
+    r"^  (?P<name>.+?)\s+(?P<attr>[A-Z]*)\s+(?P<size>\d+)"
+    r"\s+(?P<mtime>\w{3} \w{3} [ \d]\d \d\d:\d\d:\d\d \d{4})$"
+)
+
+
+def parse_smb_listing(lines, remote_path: str):
+    """Turn 'recurse ON; ls' output into ({relpath: (size, mtime)}, {reldirs}).
+
+    Paths are relative to remote_path and use '/' separators.
+    """
+    prefix = "\\" + remote_path.strip("\\/").replace("/", "\\")
+    files = {}
+    dirs = set()
+    current = ""
+    for line in lines:
+        if line.startswith("\\"):
+            # Directory header printed before each recursed sub-listing
+            d = line.rstrip()
+            if d.lower().startswith(prefix.lower()):
+                d = d[len(prefix):]
+            current = d.strip("\\").replace("\\", "/")
+            continue
+        m = _LS_ENTRY_RE.match(line)
+        if not m:
+            continue
+        name = m.group("name")
+        if name in (".", ".."):
+            continue
+        rel = f"{current}/{name}" if current else name
+        if "D" in m.group("attr"):
+            dirs.add(rel)
+        else:
+            files[rel] = (int(m.group("size")), m.group("mtime"))
+    return files, dirs
+
+
+def local_file_changed(path: pathlib.Path, entry: dict, use_hash: bool) -> bool:
+    try:
+        st = path.stat()
+    except OSError:
+        return True
+    if st.st_size != entry.get("local_size") or st.st_mtime_ns != entry.get("local_mtime_ns"):
+        return True
+    if use_hash and entry.get("sha256") and sha256_file(path) != entry["sha256"]:
+        return True
+    return False
+
+
+def prune_local_tree(local_path: pathlib.Path, remote_files, remote_dirs, logger: logging.Logger) -> int:
+    """Delete local files and empty directories that no longer exist remotely."""
+    safe_resolved_path(local_path)
+    removed = 0
+    for root, dirnames, filenames in os.walk(local_path, topdown=False):
+        root_p = pathlib.Path(root)
+        rel_root = root_p.relative_to(local_path).as_posix()
+        rel_root = "" if rel_root == "." else rel_root
+        for fn in filenames:
+            rel = f"{rel_root}/{fn}" if rel_root else fn
+            if rel not in remote_files:
+                logger.info("Removing local file deleted on share: %s", rel)
+                (root_p / fn).unlink()
+                removed += 1
+        for dn in dirnames:
+            rel = f"{rel_root}/{dn}" if rel_root else dn
+            p = root_p / dn
+            if p.is_symlink():
+                p.unlink()
+                continue
+            if rel not in remote_dirs:
+                try:
+                    p.rmdir()
+                except OSError:
+                    pass
+    return removed
+
+
+def tree_fingerprint(path: pathlib.Path) -> str:
+    """Merkle-style digest of a directory tree.
+
+    Every file contributes the hash of its content, every directory the hash
+    of its sorted (type, name, digest) children, so any change anywhere below
+    path changes the root digest. A missing path hashes to a fixed marker.
+    """
+    if path.is_file():
+        return sha256_file(path)
+    if not path.is_dir():
+        return hashlib.sha256(b"missing").hexdigest()
+    h = hashlib.sha256()
+    for child in sorted(path.iterdir(), key=lambda c: c.name):
+        kind = "d" if child.is_dir() else "f"
+        h.update(f"{kind} {child.name} {tree_fingerprint(child)}\n".encode("utf-8", "surrogateescape"))
+    return h.hexdigest()
+
+
+def parse_playbook_deps(spec: str):
+    """Parse "stub.yml:healthcheck.yml;b.yml:a.yml,stub.yml" into {playbook: [deps]}."""
+    deps = {}
+    for item in spec.split(";"):
+        if ":" not in item:
+            continue
+        name, after = item.split(":", 1)
+        deps[name.strip()] = [d.strip() for d in after.split(",") if d.strip()]
+    return deps
+
+
+def cached_run_is_fresh(cached: dict | None, fingerprint: str, max_age: int, now: float) -> bool:
+    """True when a run_cache entry lets a playbook be skipped this cycle.
+
+    Only successful runs count: a failed one is retried on the next cycle
+    even if its inputs have not changed.
+    """
+    if max_age <= 0 or not cached or cached.get("fingerprint") != fingerprint or cached.get("rc") != 0:
+        return False
+    return 0 <= now - cached.get("last_run", 0) < max_age
+
+
+def run_with_dependencies(names, deps, workers: int, fn, logger: logging.Logger):
+    """Run fn(name) for every name on a thread pool, honouring deps.
+
+    A playbook starts once all of its dependencies have finished (whatever
+    their exit code); independent playbooks run concurrently. Returns
+    {name: result}.
+    """
+    known = set(names)
+    for name in names:
+        for d in deps.get(name, ()):
+            if d not in known:
+                logger.warning("Dependency %s of %s is not scheduled; ignoring", d, name)
+    pending = list(names)
+    results = {}
+    running = {}
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as ex:
+        while pending or running:
+            for name in list(pending):
+                if all(d in results or d not in known for d in deps.get(name, ())):
+                    pending.remove(name)
+                    running[ex.submit(fn, name)] = name
+            if not running:
+                logger.error("Dependency cycle between playbooks: %s; not running them", ", ".join(pending))
+                break
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for fut in finished:
+                name = running.pop(fut)
+                try:
+                    results[name] = fut.result()
+                except Exception as e:
+                    logger.error("ansible-playbook %s crashed: %s", name, e)
+                    results[name] = 1
+    return results
+
+
+def parse_inventory_hosts(path: pathlib.Path):
+    """Return [(name, address, port)] for every host line of an INI inventory."""
+    hosts = {}
+    section = ""
+    for raw in path.read_text(encoding="utf-8", errors="replace").splitlines():
+        line = raw.strip()
+        if not line or line.startswith(("#", ";")):
+            continue
+        if line.startswith("[") and line.endswith("]"):
+            section = line[1:-1]
+            continue
+        # [group:vars] holds variables, [group:children] holds group names
+        if ":" in section:
+            continue
+        parts = line.split()
+        name = parts[0]
+        hostvars = dict(p.split("=", 1) for p in parts[1:] if "=" in p)
+        try:
+            port = int(hostvars.get("ansible_port", "22"))
+        except ValueError:
+            port = 22
+        hosts.setdefault(name, (name, hostvars.get("ansible_host", name), port))
+    return list(hosts.values())
+
+
+async def _probe_tcp(address: str, port: int, timeout: float):
+    try:
+        _, writer = await asyncio.wait_for(asyncio.open_connection(address, port), timeout)
+    except asyncio.TimeoutError:
+        return "timeout"
+    except OSError as e:
+        return os.strerror(e.errno) if e.errno else str(e)
+    writer.close()
+    try:
+        await writer.wait_closed()
+    except OSError:
+        pass
+    return None
+
+
+async def _probe_all(targets, timeout: float):
+    return await asyncio.gather(*(_probe_tcp(addr, port, timeout) for _, addr, port in targets))
+
+
+def probe_ssh_hosts(hosts, host_state: dict, timeout: float, backoff: float, backoff_max: float, logger: logging.Logger):
+    """Probe SSH ports concurrently and return the names of reachable hosts.
+
+    host_state maps host name -> {"failures", "next_probe"}; hosts that keep
+    failing are only re-probed after an exponentially growing delay and
+    count as unreachable until then.
+    """
+    now = time.time()
+    due = [h for h in hosts if host_state.get(h[0], {}).get("next_probe", 0) <= now]
+    waiting = [h[0] for h in hosts if h not in due]
+    started = time.monotonic()
+    errors = asyncio.run(_probe_all(due, timeout)) if due else []
+    reachable = []
+    down = []
+    for (name, addr, port), err in zip(due, errors):
+        if err is None:
+            reachable.append(name)
+            host_state.pop(name, None)
+            continue
+        st = host_state.setdefault(name, {"failures": 0})
+        st["failures"] += 1
+        st["next_probe"] = now + min(backoff * 2 ** (st["failures"] - 1), backoff_max)
+        st["last_error"] = err
+        down.append(f"{name} ({addr}:{port} {err})")
+    logger.info(
+        "SSH probe: %d/%d host(s) reachable in %.2fs",
+        len(reachable),
+        len(hosts),
+        time.monotonic() - started,
+    )
+    if down:
+        logger.info("SSH probe unreachable: %s", ", ".join(down))
+    if waiting:
+        logger.info(
+            "SSH probe backing off: %s",
+            ", ".join(f"{n} (retry in {int(host_state[n]['next_probe'] - now)}s)" for n in waiting),
+        )
+    return reachable
+
+
+# Default (text) ansible-playbook output, one line at a time
+_PLAY_RE = re.compile(r"^PLAY \[(?P<name>.*)\] \**$")
+_TASK_RE = re.compile(r"^(?:TASK|RUNNING HANDLER) \[(?P<name>.*)\] \**$")
+_RESULT_RE = re.compile(r"^(?P<status>ok|changed|skipping|fatal|failed): \[(?P<host>[^\]]+)\]")
+
+
+def classify_ansible_line(line: str):
+    """Classify a line of ansible-playbook output.
+
+    Returns ("play", name), ("task", name), ("recap", None),
+    ("result", (host, status)) or None. status is one of ok, changed,
+    skipped, failed, unreachable.
+    """
+    if line.startswith("PLAY RECAP"):
+        return ("recap", None)
+    m = _RESULT_RE.match(line)
+    if m:
+        status = m.group("status")
+        if status in ("fatal", "failed"):
+            status = "unreachable" if "UNREACHABLE!" in line else "failed"
+        elif status == "skipping":
+            status = "skipped"
+        return ("result", (m.group("host"), status))
+    m = _TASK_RE.match(line)
+    if m:
+        return ("task", m.group("name"))
+    m = _PLAY_RE.match(line)
+    if m:
+        return ("play", m.group("name"))
+    return None
+
+
+def append_events(path: pathlib.Path, events) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    try:
+        if path.stat().st_size >= int(os.environ.get("LOG_MAX_BYTES", str(10 * 1024 * 1024))):
+            rollover_gzip(path, int(os.environ.get("LOG_BACKUP_COUNT", "5")))
+    except FileNotFoundError:
+        pass
+    with path.open("a", encoding="utf-8") as fh:
+        fh.write("".join(json.dumps(e, ensure_ascii=False, separators=(",", ":")) + "\n" for e in events))
+
+
+def report_events(path: pathlib.Path, top: int = 10, last_runs: int = 20, out=sys.stdout) -> int:
+    """Summarise an events file: slowest tasks, flapping hosts, run durations.
+
+    The file is streamed once; memory depends on the number of distinct
+    tasks and hosts, not on the number of events.
+    """
+    tasks = {}  # (playbook, task) -> [count, total, max]
+    hosts = {}  # host -> {"run", "up", "last", "flips", "runs", "down"}
+    runs = {}  # run id -> [start, end, playbooks, failed, unreachable]
+
+    def close_host_run(h):
+        if h["run"] is None:
+            return
+        h["runs"] += 1
+        if not h["up"]:
+            h["down"] += 1
+        if h["last"] is not None and h["last"] != h["up"]:
+            h["flips"] += 1
+        h["last"] = h["up"]
+
+    try:
+        fh = path.open("r", encoding="utf-8", errors="replace")
+    except OSError as e:
+        print(f"Cannot read events file {path}: {e}", file=out)
+        return 1
+    with fh:
+        for raw in fh:
+            try:
+                ev = json.loads(raw)
+                ev["start"] = float(ev["start"])
+                ev["end"] = float(ev["end"])
+            except (ValueError, TypeError, KeyError):
+                continue
+            run = ev.get("run")
+            if ev.get("type") == "run":
+                r = runs.setdefault(run, [ev["start"], ev["end"], 0, 0, 0])
+                r[0] = min(r[0], ev["start"])
+                r[1] = max(r[1], ev["end"])
+                r[2] += 1
+                r[3] += ev.get("failed", 0)
+                r[4] += ev.get("unreachable", 0)
+                if len(runs) > last_runs:
+                    del runs[next(iter(runs))]
+                continue
+            if not ev.get("host"):
+                continue
+            dur = max(0.0, ev["end"] - ev["start"])
+            t = tasks.setdefault((ev.get("playbook"), ev.get("task")), [0, 0.0, 0.0])
+            t[0] += 1
+            t[1] += dur
+            t[2] = max(t[2], dur)
+            h = hosts.setdefault(ev["host"], {"run": None, "up": False, "last": None, "flips": 0, "runs": 0, "down": 0})
+            if h["run"] != run:
+                close_host_run(h)
+                h["run"] = run
+                h["up"] = False
+            if ev.get("status") != "unreachable":
+                h["up"] = True
+    for h in hosts.values():
+        close_host_run(h)
+
+    print(f"Slowest tasks (top {top} by mean per-host duration):", file=out)
+    ranked = sorted(tasks.items(), key=lambda kv: kv[1][1] / kv[1][0], reverse=True)[:top]
+    for (pb, task), (n, total, mx) in ranked:
+        print(f"  {total / n:8.2f}s avg {mx:8.2f}s max {n:7d}x  {pb}: {task}", file=out)
+
+    print("Flapping hosts (reachability changes between runs):", file=out)
+    flapping = sorted(((n, h) for n, h in hosts.items() if h["flips"]), key=lambda x: x[1]["flips"], reverse=True)
+    if not flapping:
+        print("  none", file=out)
+    for name, h in flapping[:top]:
+        print(f"  {name:<20} {h['flips']:5d} flip(s), down in {h['down']}/{h['runs']} run(s)", file=out)
+
+    print(f"Run durations (last {len(runs)}):", file=out)
+    for run, (start, end, pbs, failed, unreachable) in runs.items():
+        stamp = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(start))
+        print(
+            f"  {stamp} {run:<24} {end - start:8.1f}s {pbs} playbook(s) failed={failed} unreachable={unreachable}",
+            file=out,
+        )
+    return 0
+
+
+# "2025-10-01 14:53:02 <message>" as written by setup_logger()
+_LOG_TS_RE = re.compile(r"^(\d{4}-\d\d-\d\d \d\d:\d\d:\d\d) ?")
+# Runner summary: "ansible-playbook site.yml exit code: 0 (12.3s, ok=...)"
+_PB_EXIT_RE = re.compile(
+    r"^ansible-playbook (?P<pb>\S+) (?:exit code: (?P<rc>-?\d+)(?: \((?P<seconds>\d+(?:\.\d+)?)s\b)?|skipped)"
+)
+# Bytes of a log's start kept as a digest to spot copy-and-truncate rotation
+_LOG_HEAD_BYTES = 4096
+_SMB_EXIT_RE = re.compile(r"^smbclient(?: \((?P<label>\w+)\))? exit code: (?P<rc>-?\d+)")
+
+
+def _log_ts(stamp: str) -> float:
+    try:
+        return datetime.datetime.fromisoformat(stamp).timestamp()
+    except ValueError:
+        return 0.0
+
+
+def _add_duration(stats: list, seconds: float) -> None:
+    # [count, total, min, max]
+    stats[0] += 1
+    stats[1] += seconds
+    stats[2] = seconds if stats[0] == 1 else min(stats[2], seconds)
+    stats[3] = max(stats[3], seconds)
+
+
+def new_analysis() -> dict:
+    return {
+        "files": {},
+        "hosts": {},  # host -> [playbook runs seen, runs reachable]
+        "tasks": {},  # task -> {status: count}
+        "playbooks": {},  # playbook -> {"rc": {rc: n}, "dur": [count, total, min, max]}
+        "smb_rc": {},  # auth label -> {rc: n}
+        "sync": {"dur": [0, 0.0, 0.0, 0.0], "ok": 0, "failed": 0},
+    }
+
+
+def _close_playbook_run(agg: dict, ctx: dict, pb, rc, end: float, seconds: float | None = None) -> None:
+    for host, up in ctx["run_hosts"].items():
+        h = agg["hosts"].setdefault(host, [0, 0])
+        h[0] += 1
+        h[1] += 1 if up else 0
+    if pb:
+        st = agg["playbooks"].setdefault(pb, {"rc": {}, "dur": [0, 0.0, 0.0, 0.0]})
+        if rc is not None:
+            st["rc"][rc] = st["rc"].get(rc, 0) + 1
+        if seconds is not None:
+            _add_duration(st["dur"], seconds)
+        elif ctx["run_start"] and end:
+            _add_duration(st["dur"], end - ctx["run_start"])
+    ctx["run_hosts"] = {}
+    ctx["run_start"] = None
+    ctx["recap"] = False
+
+
+def _analyze_runner_line(agg: dict, ctx: dict, stamp: str, msg: str) -> None:
+    # The runner log carries one summary line per run (rc and duration); the
+    # per-playbook logs carry the ansible output (plays, tasks, hosts)
+    m = _PB_EXIT_RE.match(msg)
+    if m:
+        if m.group("rc") is not None:
+            seconds = m.group("seconds")
+            _close_playbook_run(
+                agg, ctx, m.group("pb"), m.group("rc"), _log_ts(stamp), None if seconds is None else float(seconds)
+            )
+        return
+    kind = classify_ansible_line(msg)
+    if kind is None:
+        return
+    if kind[0] == "play" and ctx["recap"]:
+        # Per-playbook logs have no exit code line; a new PLAY after a
+        # recap starts the next run
+        _close_playbook_run(agg, ctx, None, None, 0.0)
+    if ctx["run_start"] is None:
+        ctx["run_start"] = _log_ts(stamp)
+    if kind[0] == "recap":
+        ctx["recap"] = True
+    elif kind[0] == "task":
+        ctx["task"] = kind[1]
+    elif kind[0] == "result":
+        host, status = kind[1]
+        t = agg["tasks"].setdefault(ctx.get("task") or "?", {})
+        t[status] = t.get(status, 0) + 1
+        ctx["run_hosts"][host] = ctx["run_hosts"].get(host, False) or status != "unreachable"
+
+
+def _analyze_sync_line(agg: dict, ctx: dict, stamp: str, msg: str) -> None:
+    if msg.startswith("Syncing //"):
+        if ctx["run_start"] is not None:
+            # A new run began without "Done": the previous one failed
+            agg["sync"]["failed"] += 1
+        ctx["run_start"] = _log_ts(stamp)
+        return
+    m = _SMB_EXIT_RE.match(msg)
+    if m:
+        label = m.group("label") or "user"
+        codes = agg["smb_rc"].setdefault(label, {})
+        codes[m.group("rc")] = codes.get(m.group("rc"), 0) + 1
+        return
+    if msg.startswith("Done (via smbclient)") and ctx["run_start"] is not None:
+        _add_duration(agg["sync"]["dur"], _log_ts(stamp) - ctx["run_start"])
+        agg["sync"]["ok"] += 1
+        ctx["run_start"] = None
+
+
+def _head_digest(fh, length: int) -> str:
+    fh.seek(0)
+    return hashlib.sha256(fh.read(length)).hexdigest()
+
+
+def analyze_log(path: pathlib.Path, kind: str, agg: dict) -> int:
+    """Fold new complete lines of a log into agg and return bytes consumed.
+
+    Reading resumes from the offset saved in agg["files"]. A file shorter
+    than that offset, or whose first bytes no longer match the saved digest
+    (gzip_rotator() truncates in place, so the file may have grown past the
+    offset again), was rotated and is read from the start.
+    """
+    handler = _analyze_runner_line if kind == "runner" else _analyze_sync_line
+    with path.open("rb") as fh:
+        ctx = agg["files"].get(str(path))
+        size = os.fstat(fh.fileno()).st_size
+        if (
+            ctx is None
+            or ctx.get("kind") != kind
+            or size < ctx["offset"]
+            or ("head" in ctx and _head_digest(fh, ctx["head_len"]) != ctx["head"])
+        ):
+            ctx = {"kind": kind, "offset": 0, "run_start": None, "run_hosts": {}, "recap": False, "task": None}
+            agg["files"][str(path)] = ctx
+        start = ctx["offset"]
+        fh.seek(start)
+        offset = start
+        for raw in fh:
+            if not raw.endswith(b"\n"):
+                break  # partial line still being written
+            offset += len(raw)
+            line = raw.decode("utf-8", "replace").rstrip("\r\n")
+            m = _LOG_TS_RE.match(line)
+            if not m:
+                continue
+            stamp = m.group(1)
+            msg = line[m.end():]
+            handler(agg, ctx, stamp, msg)
+        ctx["offset"] = offset
+        ctx["head_len"] = min(offset, _LOG_HEAD_BYTES)
+        ctx["head"] = _head_digest(fh, ctx["head_len"])
+    return offset - start
+
+
+def print_analysis(agg: dict, out=sys.stdout) -> None:
+    print("Host reachability (playbook runs reachable / seen):", file=out)
+    for host, (seen, up) in sorted(agg["hosts"].items()):
+        print(f"  {host:<20} {up:7d}/{seen:<7d} {100.0 * up / seen if seen else 0:6.1f}%", file=out)
+    print("Task results:", file=out)
+    for task, statuses in sorted(agg["tasks"].items()):
+        summary = " ".join(f"{k}={v}" for k, v in sorted(statuses.items()))
+        print(f"  {task}: {summary}", file=out)
+    print("Playbook runs:", file=out)
+    for pb, st in sorted(agg["playbooks"].items()):
+        n, total, mn, mx = st["dur"]
+        rcs = " ".join(f"rc{k}={v}" for k, v in sorted(st["rc"].items()))
+        avg = total / n if n else 0.0
+        print(f"  {pb:<24} {rcs}  duration avg {avg:.1f}s min {mn:.1f}s max {mx:.1f}s", file=out)
+    print("smbclient exit codes:", file=out)
+    for label, codes in sorted(agg["smb_rc"].items()):
+        print(f"  {label:<10} " + " ".join(f"rc{k}={v}" for k, v in sorted(codes.items())), file=out)
+    n, total, mn, mx = agg["sync"]["dur"]
+    print(
+        f"Sync runs: ok={agg['sync']['ok']} failed={agg['sync']['failed']} "
+        f"duration avg {total / n if n else 0:.1f}s min {mn:.1f}s max {mx:.1f}s",
+        file=out,
+    )
+
+
+def sync_cycle(warm: dict) -> int:
+    """Sync the workspace and run playbooks once; warm carries state between cycles."""
+    cycle = {"started": time.time(), "playbooks": {}}
+    warm["cycle"] = cycle
     # Env and defaults
     sync_log_file = os.environ.get("LOG_FILE", "/var/log/get_ansible_workspace.log")
     logger = setup_logger(sync_log_file, name="ansible_sync")
@@ -49,51 +725,23 @@ def main() -> int:
     workgroup = os.environ.get("WORKGROUP", "WORKGROUP")
     remote_path = os.environ.get("REMOTE_PATH", "it")
     local_path = pathlib.Path(os.environ.get("LOCAL_PATH", "/workspace"))
+    state_dir = pathlib.Path(os.environ.get("STATE_DIR", "/var/lib/ansible_sync"))
+    # delta: list the share and transfer only new/changed files; full: wipe + mget *
+    sync_mode = os.environ.get("SYNC_MODE", "delta").strip().lower()
+    sync_hash = os.environ.get("SYNC_HASH", "0").strip().lower() in ("1", "true", "yes")
 
     samba_user = os.environ.get("SAMBA_USER", "")
     samba_password = os.environ.get("SAMBA_PASSWORD", "")
     smb_debug = os.environ.get("SMB_DEBUGLEVEL", "2")
     smb_protocol = os.environ.get("SMB_PROTOCOL", "SMB3")
 
-    # Always wipe local workspace before syncing
-    try:
-        wipe_directory(local_path, logger)
-    except Exception as e:
-        logger.error("Failed to wipe local path %s: %s", str(local_path), e)
-        return 1
-
-    logger.info(
-        "Syncing //%s/%s/%s -> %s", samba_server, samba_share, remote_path, str(local_path)
-    )
-    # Directory already recreated by wipe
-
-    # smbclient command script: use '; ' separator for -c
-    # smbclient expects multiple commands in a single string separated by ';'
-    # Newlines are not reliably parsed when passed via -c
-    cmd_list = [
-        "pwd",
-        "ls",
-        f"cd \"{remote_path}\"",
-        "prompt OFF",
-        "recurse ON",
-        f"lcd \"{local_path}\"",
-        "mget *",
-    ]
-    cmds = "; ".join(cmd_list)
+    manifest_file = state_dir / "manifest.json"
 
     if not samba_user or not samba_password:
         logger.warning(
             "Warning: SAMBA_USER/PASSWORD not set; trying anonymous if allowed"
         )
 
-    logger.info(
-        "smbclient connecting to //%s/%s as %s",
-        samba_server,
-        samba_share,
-        samba_user if samba_user else "<anon>",
-    )
-    logger.info("smbclient commands: %s", cmds)
-
     cmd = [
         "smbclient",
         f"//{samba_server}/{samba_share}",
@@ -110,10 +758,45 @@ def main() -> int:
         cmd += ["-U", f"{samba_user}%{samba_password}"]
     else:
         cmd += ["-N"]
-    cmd += ["-c", cmds]
+
+    # Auth variants in the order they are tried: (label, argv without -c)
+    auth_variants = [("", cmd)]
+    if samba_user or samba_password:
+        # keep anonymous/guest attempts minimal; some servers behave differently
+        auth_variants.append(("anonymous", ["smbclient", f"//{samba_server}/{samba_share}", "-N"]))
+        auth_variants.append(("guest", ["smbclient", f"//{samba_server}/{samba_share}", "-U", "guest%"]))
+
+    # The variant that last worked is tried first. After SMB_BREAKER_THRESHOLD
+    # calls in a row fail with every variant the breaker opens and the share
+    # is left alone until open_until; then a single probe with the preferred
+    # variant decides whether it closes again or stays open for twice as long.
+    auth_file = state_dir / "smb_auth.json"
+    auth = warm_json(warm, auth_file, {})
+    breaker_threshold = int(os.environ.get("SMB_BREAKER_THRESHOLD", "3"))
+    breaker_backoff = float(os.environ.get("SMB_BREAKER_BACKOFF", "60"))
+    breaker_backoff_max = float(os.environ.get("SMB_BREAKER_BACKOFF_MAX", "1800"))
+    preferred = auth.get("preferred")
+    if preferred is not None:
+        auth_variants.sort(key=lambda v: v[0] != preferred)
+    half_open = False
+    if auth.get("open_until"):
+        wait_s = auth["open_until"] - time.time()
+        if wait_s > 0:
+            logger.warning(
+                "smbclient circuit open after %d failed attempt(s); next probe in %ds",
+                auth.get("failures", 0),
+                wait_s,
+            )
+            cycle["sync_rc"] = 75
+            cycle["smb_circuit"] = "open"
+            return 75
+        half_open = True
+        logger.info("smbclient circuit half-open; probing //%s/%s", samba_server, samba_share)
+        auth_variants = auth_variants[:1]
+    smb_attempts = []
 
     # Stream output to both stdout and log via logger
-    def run_smbclient(args):
+    def run_smbclient(args, collect=None):
         try:
             p = subprocess.Popen(
                 args,
@@ -128,36 +811,197 @@ def main() -> int:
             return 127
         assert p.stdout is not None
         for line in p.stdout:
-            logger.info(line.rstrip("\n"))
+            line = line.rstrip("\n")
+            if collect is not None:
+                # Listings can be huge; keep them out of the log
+                collect.append(line)
+            else:
+                logger.info(line)
         p.wait()
         return p.returncode
 
-    rc = run_smbclient(cmd)
-    logger.info("smbclient exit code: %s", rc)
-    if rc != 0 and (samba_user or samba_password):
-        logger.warning("Auth failed with provided credentials; retrying anonymously (-N) if share allows guests")
-        cmd_noauth = [
-            # keep anonymous attempt minimal; some servers behave differently
-            "smbclient",
-            f"//{samba_server}/{samba_share}",
-            "-N",
-            "-c",
-            cmds,
+    def run_with_fallback(cmds, variants, collect=None):
+        """Run a command script, falling back through auth variants.
+
+        Returns (rc, variants that are still worth trying for follow-up calls).
+        """
+        rc = 1
+        for i, (label, base) in enumerate(variants):
+            if i > 0 and label == "anonymous":
+                logger.warning("Auth failed with provided credentials; retrying anonymously (-N) if share allows guests")
+            elif i > 0 and label == "guest":
+                logger.warning("Anonymous auth failed; retrying as explicit guest user")
+            elif i > 0:
+                logger.warning("Retrying with provided credentials")
+            if collect is not None:
+                collect.clear()
+            t0 = time.monotonic()
+            rc = run_smbclient(base + ["-c", cmds], collect)
+            elapsed = time.monotonic() - t0
+            smb_attempts.append((label or "default", rc, elapsed))
+            logger.info("smbclient%s exit code: %s in %.2fs", f" ({label})" if label else "", rc, elapsed)
+            if rc == 0:
+                if auth.get("preferred") != label or auth.get("failures") or auth.get("open_until"):
+                    auth.update({"preferred": label, "failures": 0, "open_until": 0})
+                    write_json_atomic(auth_file, auth)
+                return rc, variants[i:]
+        auth["failures"] = auth.get("failures", 0) + 1
+        if half_open or auth["failures"] >= breaker_threshold:
+            over = auth["failures"] - breaker_threshold
+            delay = min(breaker_backoff * 2 ** max(0, over), breaker_backoff_max)
+            auth["open_until"] = time.time() + delay
+            logger.warning(
+                "smbclient failed with every auth variant %d time(s) in a row; circuit open for %ds",
+                auth["failures"],
+                delay,
+            )
+        write_json_atomic(auth_file, auth)
+        return rc, variants
+
+    # smbclient command script: use '; ' separator for -c
+    # smbclient expects multiple commands in a single string separated by ';'
+    # Newlines are not reliably parsed when passed via -c
+    def full_sync() -> int:
+        # Wipe local workspace before a full copy
+        try:
+            wipe_directory(local_path, logger)
+        except Exception as e:
+            logger.error("Failed to wipe local path %s: %s", str(local_path), e)
+            return 1
+        # Contents no longer match any manifest; next delta run starts over
+        warm.pop(str(manifest_file), None)
+        try:
+            manifest_file.unlink()
+        except FileNotFoundError:
+            pass
+        cmd_list = [
+            "pwd",
+            "ls",
+            f"cd \"{remote_path}\"",
+            "prompt OFF",
+            "recurse ON",
+            f"lcd \"{local_path}\"",
+            "mget *",
         ]
-        rc = run_smbclient(cmd_noauth)
-        logger.info("smbclient (anonymous) exit code: %s", rc)
+        cmds = "; ".join(cmd_list)
+        logger.info("smbclient commands: %s", cmds)
+        rc, _ = run_with_fallback(cmds, auth_variants)
+        return rc
+
+    def delta_sync() -> int:
+        try:
+            safe_resolved_path(local_path)
+        except RuntimeError as e:
+            logger.error("Not syncing into local path %r: %s", str(local_path), e)
+            return 1
+        local_path.mkdir(parents=True, exist_ok=True)
+        cmds = "; ".join([f"cd \"{remote_path}\"", "recurse ON", "ls"])
+        logger.info("smbclient commands: %s", cmds)
+        listing = []
+        rc, variants = run_with_fallback(cmds, auth_variants, collect=listing)
         if rc != 0:
-            logger.warning("Anonymous auth failed; retrying as explicit guest user")
-            cmd_guest = [
-                "smbclient",
-                f"//{samba_server}/{samba_share}",
-                "-U",
-                "guest%",
-                "-c",
-                cmds,
-            ]
-            rc = run_smbclient(cmd_guest)
-            logger.info("smbclient (guest) exit code: %s", rc)
+            for line in listing[-20:]:
+                logger.info(line)
+            return rc
+        remote_files, remote_dirs = parse_smb_listing(listing, remote_path)
+        del listing
+        if not remote_files and not remote_dirs:
+            # An empty share and an unparsable listing look the same; pruning
+            # against either would empty the workspace
+            logger.error("Remote listing of %s is empty or could not be parsed; not pruning", remote_path)
+            return 1
+        if any(('"' in rel or ";" in rel) for rel in remote_files):
+            logger.warning("Remote names contain characters unsafe for smbclient -c; falling back to full sync")
+            return full_sync()
+
+        manifest = warm_json(warm, manifest_file, {})
+        if manifest.get("local_path") != str(local_path):
+            manifest = {}
+        entries = manifest.get("files", {})
+
+        removed = prune_local_tree(local_path, remote_files, remote_dirs, logger)
+        for rel in list(entries):
+            if rel not in remote_files:
+                del entries[rel]
+        for rel in remote_dirs:
+            (local_path / rel).mkdir(parents=True, exist_ok=True)
+
+        to_fetch = []
+        for rel, (size, mtime) in remote_files.items():
+            entry = entries.get(rel)
+            if (
+                entry is None
+                or entry.get("size") != size
+                or entry.get("mtime") != mtime
+                or local_file_changed(local_path / rel, entry, sync_hash)
+            ):
+                to_fetch.append(rel)
+
+        fetched_bytes = 0
+        batch_size = 200
+        for i in range(0, len(to_fetch), batch_size):
+            batch = to_fetch[i:i + batch_size]
+            cmd_list = [f"cd \"{remote_path}\"", "prompt OFF"]
+            for rel in batch:
+                dst = local_path / rel
+                dst.parent.mkdir(parents=True, exist_ok=True)
+                if dst.is_dir() and not dst.is_symlink():
+                    shutil.rmtree(dst)
+                elif dst.is_symlink():
+                    dst.unlink()
+                cmd_list.append(f"get \"{rel.replace('/', chr(92))}\" \"{dst}\"")
+            rc, variants = run_with_fallback("; ".join(cmd_list), variants)
+            for rel in batch:
+                dst = local_path / rel
+                size, mtime = remote_files[rel]
+                try:
+                    st = dst.stat()
+                except OSError:
+                    entries.pop(rel, None)
+                    continue
+                if st.st_size != size:
+                    # Partial transfer: retry on the next run
+                    entries.pop(rel, None)
+                    continue
+                entry = {"size": size, "mtime": mtime, "local_size": st.st_size, "local_mtime_ns": st.st_mtime_ns}
+                if sync_hash:
+                    entry["sha256"] = sha256_file(dst)
+                entries[rel] = entry
+                fetched_bytes += size
+            if rc != 0:
+                save_warm(warm, manifest_file, {"local_path": str(local_path), "files": entries})
+                return rc
+
+        save_warm(warm, manifest_file, {"local_path": str(local_path), "files": entries})
+        logger.info(
+            "Delta sync: %d remote file(s), fetched %d (%d bytes), deleted %d, unchanged %d",
+            len(remote_files),
+            len(to_fetch),
+            fetched_bytes,
+            removed,
+            len(remote_files) - len(to_fetch),
+        )
+        return 0
+
+    logger.info(
+        "Syncing //%s/%s/%s -> %s (%s)", samba_server, samba_share, remote_path, str(local_path), sync_mode
+    )
+    logger.info(
+        "smbclient connecting to //%s/%s as %s",
+        samba_server,
+        samba_share,
+        samba_user if samba_user else "<anon>",
+    )
+    sync_started = time.monotonic()
+    rc = delta_sync() if sync_mode == "delta" else full_sync()
+    cycle["sync_seconds"] = round(time.monotonic() - sync_started, 3)
+    cycle["sync_rc"] = rc
+    cycle["smb_attempts"] = [{"auth": a, "rc": r, "seconds": round(t, 3)} for a, r, t in smb_attempts]
+    logger.info(
+        "smbclient attempts: %d (%s)",
+        len(smb_attempts),
+        ", ".join(f"{a} rc{r} {t:.2f}s" for a, r, t in smb_attempts),
+    )
     if rc != 0:
         return rc
     logger.info("Done (via smbclient). Files are in %s", str(local_path))
@@ -179,10 +1023,68 @@ def main() -> int:
 
     ansible_password = os.environ.get("ANSIBLE_PASSWORD", "")
 
+    # Probe SSH on every inventory host first so playbooks only target live
+    # hosts instead of paying a connect timeout per dead one
+    limit = ""
+    if os.environ.get("SSH_PROBE", "1").strip().lower() in ("1", "true", "yes"):
+        hosts = parse_inventory_hosts(inventory)
+        host_state_file = state_dir / "hosts.json"
+        host_state = warm_json(warm, host_state_file, {})
+        probe_started = time.monotonic()
+        reachable = probe_ssh_hosts(
+            hosts,
+            host_state,
+            float(os.environ.get("SSH_PROBE_TIMEOUT", "1.0")),
+            float(os.environ.get("SSH_PROBE_BACKOFF", "60")),
+            float(os.environ.get("SSH_PROBE_BACKOFF_MAX", "3600")),
+            runner,
+        )
+        cycle["probe_seconds"] = round(time.monotonic() - probe_started, 3)
+        cycle["reachable"] = f"{len(reachable)}/{len(hosts)}"
+        write_json_atomic(host_state_file, host_state)
+        if hosts and not reachable:
+            runner.info("No reachable hosts; skipping playbooks")
+            return 0
+        if len(reachable) < len(hosts):
+            limit = ",".join(sorted(reachable))
+
+    # Playbooks are re-run only when their inputs change, the last run failed
+    # or it is older than PLAYBOOK_MAX_AGE seconds (0 = always run)
+    max_age = int(os.environ.get("PLAYBOOK_MAX_AGE", "3600"))
+    run_cache_file = state_dir / "run_cache.json"
+    run_cache = warm_json(warm, run_cache_file, {})
+    inputs_fp = hashlib.sha256(
+        (tree_fingerprint(inventory.parent) + tree_fingerprint(playbook_dir) + limit).encode("utf-8")
+    ).hexdigest()
+
+    # Independent playbooks run concurrently; PLAYBOOK_DEPS serialises those
+    # that must wait for others. Each playbook logs to its own file and
+    # leaves a one-line summary in the runner log.
+    playbooks = [n.strip() for n in os.environ.get("PLAYBOOKS", "healthcheck.yml,stub.yml").split(",") if n.strip()]
+    playbook_deps = parse_playbook_deps(os.environ.get("PLAYBOOK_DEPS", ""))
+    workers = int(os.environ.get("PLAYBOOK_WORKERS", "4"))
+    playbook_log_dir = pathlib.Path(os.environ.get("ANSIBLE_LOG_DIR", "/var/log/ansible"))
+    cache_lock = threading.Lock()
+    # Structured per-host/per-task results, one JSON object per line
+    events_file = pathlib.Path(os.environ.get("EVENTS_FILE", "/var/log/ansible_events.jsonl"))
+    events_lock = threading.Lock()
+    run_id = time.strftime("%Y%m%dT%H%M%S") + f"-{os.getpid()}"
+
     def run_playbook(pb: pathlib.Path) -> int:
         if not pb.is_file():
             runner.info("Playbook not found: %s (skip)", str(pb))
             return 0
+        cached = run_cache.get(pb.name)
+        now = time.time()
+        if cached_run_is_fresh(cached, inputs_fp, max_age, now):
+            runner.info(
+                "ansible-playbook %s skipped: inputs unchanged (%s), last run %ds ago",
+                pb.name,
+                inputs_fp[:12],
+                now - cached["last_run"],
+            )
+            cycle["playbooks"][pb.name] = {"rc": 0, "skipped": True}
+            return 0
         cmd_pb = [
             "ansible-playbook",
             "-i",
@@ -191,8 +1093,14 @@ def main() -> int:
             "-u",
             "root",
         ]
+        if limit:
+            cmd_pb += ["--limit", limit]
         if ansible_password:
             cmd_pb += ["--extra-vars", f"ansible_password={ansible_password}"]
+        pb_log_file = playbook_log_dir / f"{pb.stem}.log"
+        pb_logger = setup_logger(str(pb_log_file), name=f"playbook.{pb.stem}")
+        started = time.monotonic()
+        started_at = time.time()
         try:
             p = subprocess.Popen(
                 cmd_pb,
@@ -208,19 +1116,205 @@ def main() -> int:
             runner.error("ansible-playbook not found. Install ansible in the image.")
             return 127
         assert p.stdout is not None
+        counts = {"ok": 0, "changed": 0, "skipped": 0, "failed": 0, "unreachable": 0}
+        events = []
+        play = task = None
+        task_start = started_at
         for line in p.stdout:
-            runner.info(line.rstrip("\n"))
+            line = line.rstrip("\n")
+            pb_logger.info(line)
+            kind = classify_ansible_line(line)
+            if kind is None:
+                continue
+            now = time.time()
+            if kind[0] == "play":
+                play = kind[1]
+            elif kind[0] == "task":
+                task, task_start = kind[1], now
+            elif kind[0] == "result":
+                host, status = kind[1]
+                counts[status] += 1
+                events.append({
+                    "type": "task",
+                    "run": run_id,
+                    "playbook": pb.name,
+                    "play": play,
+                    "task": task,
+                    "host": host,
+                    "status": status,
+                    "start": round(task_start, 3),
+                    "end": round(now, 3),
+                })
         p.wait()
         rc_pb = p.returncode
-        runner.info("ansible-playbook %s exit code: %s", pb.name, rc_pb)
+        events.append({
+            "type": "run",
+            "run": run_id,
+            "playbook": pb.name,
+            "rc": rc_pb,
+            "start": round(started_at, 3),
+            "end": round(time.time(), 3),
+            "failed": counts["failed"],
+            "unreachable": counts["unreachable"],
+        })
+        with events_lock:
+            try:
+                append_events(events_file, events)
+            except OSError as e:
+                runner.error("Failed to write events to %s: %s", str(events_file), e)
+        runner.info(
+            "ansible-playbook %s exit code: %s (%.1fs, ok=%d changed=%d failed=%d unreachable=%d, log: %s)",
+            pb.name,
+            rc_pb,
+            time.monotonic() - started,
+            counts["ok"],
+            counts["changed"],
+            counts["failed"],
+            counts["unreachable"],
+            str(pb_log_file),
+        )
+        with cache_lock:
+            cycle["playbooks"][pb.name] = {"rc": rc_pb, "seconds": round(time.monotonic() - started, 3)}
+            run_cache[pb.name] = {"fingerprint": inputs_fp, "last_run": time.time(), "rc": rc_pb}
+            write_json_atomic(run_cache_file, run_cache)
         return rc_pb
 
-    # Execute healthcheck and stub sequentially; don't fail the whole run
-    run_playbook(playbook_dir / "healthcheck.yml")
-    run_playbook(playbook_dir / "stub.yml")
+    # Don't fail the whole run on playbook errors
+    playbooks_started = time.monotonic()
+    run_with_dependencies(
+        playbooks, playbook_deps, workers, lambda name: run_playbook(playbook_dir / name), runner
+    )
+    cycle["playbook_seconds"] = round(time.monotonic() - playbooks_started, 3)
+
+    return 0
+
+
+def main() -> int:
+    return sync_cycle({})
+
+
+def run_daemon() -> int:
+    """Run sync cycles forever from one resident process.
+
+    Cycles start every SYNC_INTERVAL seconds (+/- SYNC_JITTER as a fraction),
+    measured from the start of the previous cycle. After a failed sync the
+    interval doubles per consecutive failure up to SYNC_BACKOFF_MAX. The
+    state files are loaded once and kept warm; a summary of the last cycle
+    is written to STATUS_FILE.
+    """
+    import fcntl
+    import random
+    import signal
+
+    interval = float(os.environ.get("SYNC_INTERVAL", "60"))
+    jitter = float(os.environ.get("SYNC_JITTER", "0.1"))
+    backoff_max = float(os.environ.get("SYNC_BACKOFF_MAX", "900"))
+    status_file = pathlib.Path(os.environ.get("STATUS_FILE", "/var/run/ansible_sync/status.json"))
+    lock_file = os.environ.get("SYNC_LOCK_FILE", "/var/run/ansible-workspace.lock")
+    logger = setup_logger(os.environ.get("LOG_FILE", "/var/log/get_ansible_workspace.log"), name="ansible_sync")
+
+    # Same lock as the cron entry, so the two never overlap
+    lock_fh = open(lock_file, "a")
+    try:
+        fcntl.flock(lock_fh, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        logger.error("Another ansible_sync instance holds %s; exiting", lock_file)
+        return 1
+
+    stop = threading.Event()
 
+    def request_stop(signum, _frame):
+        logger.info("Received signal %s; stopping after the current cycle", signum)
+        stop.set()
+
+    signal.signal(signal.SIGTERM, request_stop)
+    signal.signal(signal.SIGINT, request_stop)
+
+    warm = {}
+    failures = 0
+    cycles = 0
+    logger.info("ansible_sync daemon started (pid %s, interval %ss)", os.getpid(), interval)
+    # Spread the first cycle so restarted containers don't fire together
+    stop.wait(random.uniform(0, interval * jitter))
+    while not stop.is_set():
+        started = time.time()
+        try:
+            rc = sync_cycle(warm)
+        except Exception as e:
+            logger.exception("Cycle failed: %s", e)
+            rc = 1
+        cycles += 1
+        failures = failures + 1 if rc != 0 else 0
+        delay = interval * 2 ** min(failures, 16) if failures else interval
+        delay = min(delay, max(backoff_max, interval)) * (1 + random.uniform(-jitter, jitter))
+        next_run = started + delay
+        status = {
+            "pid": os.getpid(),
+            "cycles": cycles,
+            "last_start": round(started, 3),
+            "last_duration": round(time.time() - started, 3),
+            "last_rc": rc,
+            "consecutive_failures": failures,
+            "next_run": round(next_run, 3),
+            "last_cycle": warm.get("cycle", {}),
+        }
+        try:
+            write_json_atomic(status_file, status)
+        except OSError as e:
+            logger.error("Failed to write status file %s: %s", str(status_file), e)
+        stop.wait(max(0.0, next_run - time.time()))
+    logger.info("ansible_sync daemon stopped after %d cycle(s)", cycles)
     return 0
 
 
+def cli(argv=None) -> int:
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Sync the Ansible workspace from Samba and run playbooks")
+    sub = parser.add_subparsers(dest="command")
+    sub.add_parser("sync", help="sync once and run playbooks (default)")
+    sub.add_parser("daemon", help="stay resident and sync on an internal schedule")
+    rep = sub.add_parser("report", help="summarise structured playbook events")
+    rep.add_argument("--events", default=os.environ.get("EVENTS_FILE", "/var/log/ansible_events.jsonl"))
+    rep.add_argument("--top", type=int, default=10)
+    rep.add_argument("--runs", type=int, default=20)
+    ana = sub.add_parser("analyze", help="stream-analyse the text logs, resuming from the last offset")
+    ana.add_argument(
+        "--runner-log",
+        action="append",
+        help="ansible runner or per-playbook log (repeatable; default: ANSIBLE_LOG_FILE and ANSIBLE_LOG_DIR/*.log)",
+    )
+    ana.add_argument("--sync-log", action="append", help="workspace sync log (repeatable)")
+    ana.add_argument("--state", default=str(pathlib.Path(os.environ.get("STATE_DIR", "/var/lib/ansible_sync")) / "analyze.json"))
+    ana.add_argument("--reset", action="store_true", help="ignore saved offsets and totals")
+    args = parser.parse_args(argv)
+    if args.command == "analyze":
+        state_file = pathlib.Path(args.state)
+        agg = new_analysis() if args.reset else read_json(state_file, None) or new_analysis()
+        runner_logs = args.runner_log
+        if not runner_logs:
+            # Runner summaries plus the per-playbook logs written by sync_cycle()
+            runner_logs = [os.environ.get("ANSIBLE_LOG_FILE", "/var/log/ansible_runner.log")]
+            log_dir = pathlib.Path(os.environ.get("ANSIBLE_LOG_DIR", "/var/log/ansible"))
+            runner_logs += [str(p) for p in sorted(log_dir.glob("*.log")) if str(p) not in runner_logs]
+        logs = [("runner", p) for p in runner_logs]
+        logs += [("sync", p) for p in args.sync_log or [os.environ.get("LOG_FILE", "/var/log/get_ansible_workspace.log")]]
+        for kind, p in logs:
+            try:
+                consumed = analyze_log(pathlib.Path(p), kind, agg)
+            except OSError as e:
+                print(f"Skipping {p}: {e}", file=sys.stderr)
+                continue
+            print(f"{p}: {consumed} new byte(s) analysed", file=sys.stderr)
+        write_json_atomic(state_file, agg)
+        print_analysis(agg)
+        return 0
+    if args.command == "daemon":
+        return run_daemon()
+    if args.command == "report":
+        return report_events(pathlib.Path(args.events), args.top, args.runs)
+    return main()
+
+
 if __name__ == "__main__":
-    sys.exit(main())
+    sys.exit(cli())
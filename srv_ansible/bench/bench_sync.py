@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""Offline benchmark of the ansible_sync.py share sync.
+
+Generates synthetic it/ trees, serves them through fake_smbclient.py on
+PATH and runs ansible_sync.py against them in several scenarios:
+
+  full        SYNC_MODE=full (wipe + mget *), the pre-delta behaviour
+  delta-cold  SYNC_MODE=delta with an empty workspace and manifest
+  delta-warm  SYNC_MODE=delta again with nothing changed on the share
+  delta-1pct  SYNC_MODE=delta after touching 1% and deleting 0.1% of files
+
+For every run it reports wall time, bytes moved by smbclient, number of
+smbclient invocations and the peak RSS of the ansible_sync.py process.
+
+    python3 bench_sync.py --sizes 10,1000,100000 --latency 0.05
+"""
+import argparse
+import json
+import os
+import pathlib
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+HERE = pathlib.Path(__file__).resolve().parent
+SYNC_SCRIPT = HERE.parent / "ansible_sync.py"
+FAKE_SMBCLIENT = HERE / "fake_smbclient.py"
+
+
+def random_size(rng: random.Random) -> int:
+    # Mostly small config/text files with a tail of larger artifacts
+    r = rng.random()
+    if r < 0.80:
+        return rng.randint(0, 2048)
+    if r < 0.98:
+        return rng.randint(2048, 32 * 1024)
+    return rng.randint(32 * 1024, 256 * 1024)
+
+
+def generate_tree(root: pathlib.Path, count: int, seed: int, per_dir: int = 100):
+    """Create count files under root/it spread over nested directories."""
+    rng = random.Random(seed)
+    base = root / "it"
+    files = []
+    total = 0
+    for i in range(count):
+        d = base / f"d{i // (per_dir * per_dir):03d}" / f"s{(i // per_dir) % per_dir:03d}"
+        if i % per_dir == 0:
+            d.mkdir(parents=True, exist_ok=True)
+        path = d / f"file{i:06d}.dat"
+        size = random_size(rng)
+        path.write_bytes(rng.randbytes(size))
+        files.append(path)
+        total += size
+    return files, total
+
+
+def mutate_tree(files, seed: int):
+    """Append to 1% of the files and delete 0.1% (at least one of each)."""
+    rng = random.Random(seed + 1)
+    changed = rng.sample(files, max(1, len(files) // 100))
+    for path in changed:
+        with path.open("ab") as fh:
+            fh.write(b"changed\n")
+    survivors = [f for f in files if f not in set(changed)]
+    deleted = rng.sample(survivors, max(1, len(files) // 1000)) if len(survivors) > 1 else []
+    for path in deleted:
+        path.unlink()
+    return len(changed), len(deleted)
+
+
+def run_sync(env: dict, stats_file: pathlib.Path):
+    stats_file.write_text("")
+    started = time.perf_counter()
+    p = subprocess.Popen(
+        [sys.executable, str(SYNC_SCRIPT), "sync"],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    _, status, rusage = os.wait4(p.pid, 0)
+    wall = time.perf_counter() - started
+    p.returncode = os.waitstatus_to_exitcode(status)
+    moved = calls = 0
+    for line in stats_file.read_text().splitlines():
+        calls += 1
+        moved += json.loads(line)["bytes"]
+    return {
+        "rc": p.returncode,
+        "wall_s": round(wall, 3),
+        "bytes": moved,
+        "smb_calls": calls,
+        "peak_rss_mib": round(rusage.ru_maxrss / 1024, 1),
+    }
+
+
+def bench_size(count: int, args, workdir: pathlib.Path):
+    share = workdir / "share"
+    bindir = workdir / "bin"
+    bindir.mkdir(parents=True, exist_ok=True)
+    wrapper = bindir / "smbclient"
+    wrapper.write_text(f'#!/bin/sh\nexec "{sys.executable}" "{FAKE_SMBCLIENT}" "$@"\n')
+    wrapper.chmod(0o755)
+
+    t0 = time.perf_counter()
+    files, total = generate_tree(share, count, args.seed)
+    print(f"# {count} files, {total / 1048576:.1f} MiB generated in {time.perf_counter() - t0:.1f}s", file=sys.stderr)
+
+    stats_file = workdir / "smb_stats.jsonl"
+    env = dict(os.environ)
+    env.update({
+        "PATH": f"{bindir}{os.pathsep}{env.get('PATH', '')}",
+        "FAKE_SMB_ROOT": str(share),
+        "FAKE_SMB_STATS": str(stats_file),
+        "FAKE_SMB_LATENCY": str(args.latency),
+        "FAKE_SMB_LATENCY_PER_FILE": str(args.latency_per_file),
+        "REMOTE_PATH": "it",
+        "LOCAL_PATH": str(workdir / "workspace"),
+        "STATE_DIR": str(workdir / "state"),
+        "LOG_FILE": str(workdir / "sync.log"),
+        "ANSIBLE_LOG_FILE": str(workdir / "runner.log"),
+        "SAMBA_USER": "",
+        "SAMBA_PASSWORD": "",
+    })
+
+    results = []
+
+    def scenario(name: str, mode: str):
+        r = run_sync(dict(env, SYNC_MODE=mode), stats_file)
+        r.update({"files": count, "scenario": name})
+        results.append(r)
+        print(
+            f"{count:>8} {name:<11} rc={r['rc']:<3} {r['wall_s']:>9.3f}s {r['bytes']:>12} B "
+            f"{r['smb_calls']:>4} call(s) {r['peak_rss_mib']:>8.1f} MiB",
+            flush=True,
+        )
+
+    scenario("full", "full")
+    shutil.rmtree(workdir / "workspace", ignore_errors=True)
+    shutil.rmtree(workdir / "state", ignore_errors=True)
+    scenario("delta-cold", "delta")
+    scenario("delta-warm", "delta")
+    changed, deleted = mutate_tree(files, args.seed)
+    print(f"# mutated: {changed} changed, {deleted} deleted", file=sys.stderr)
+    scenario("delta-1pct", "delta")
+    return results
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="10,1000,100000", help="comma-separated file counts")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds per smbclient connection")
+    parser.add_argument("--latency-per-file", type=float, default=0.0, help="seconds per transferred file")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="also write all results to this file")
+    parser.add_argument("--keep", action="store_true", help="keep the generated trees")
+    args = parser.parse_args()
+
+    print(f"{'files':>8} {'scenario':<11} {'rc':<6} {'wall':>10} {'moved':>14} {'calls':>10} {'peak RSS':>12}")
+    all_results = []
+    for count in [int(s) for s in args.sizes.split(",") if s.strip()]:
+        workdir = pathlib.Path(tempfile.mkdtemp(prefix=f"bench_sync_{count}_"))
+        try:
+            all_results += bench_size(count, args, workdir)
+        finally:
+            if args.keep:
+                print(f"# kept {workdir}", file=sys.stderr)
+            else:
+                shutil.rmtree(workdir, ignore_errors=True)
+    if args.json:
+        pathlib.Path(args.json).write_text(json.dumps(all_results, indent=2) + "\n", encoding="utf-8")
+    return 0 if all(r["rc"] == 0 for r in all_results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""Offline stand-in for smbclient used by bench_sync.py.
+
+Serves FAKE_SMB_ROOT as the share and understands the subset of the -c
+command language ansible_sync.py uses: pwd, ls, cd, lcd, prompt, recurse,
+get and mget. Output mimics smbclient closely enough for the sync parser.
+
+Environment:
+  FAKE_SMB_ROOT              directory that plays the role of the share (required)
+  FAKE_SMB_AUTH              accepted auth modes: user,anonymous,guest (default: all)
+  FAKE_SMB_LATENCY           seconds added per connection (session setup)
+  FAKE_SMB_LATENCY_PER_FILE  seconds added per transferred file
+  FAKE_SMB_STATS             append one JSON line per invocation with bytes/files moved
+"""
+import json
+import os
+import pathlib
+import shlex
+import shutil
+import sys
+import time
+
+
+def fmt_entry(path: pathlib.Path, name: str) -> str:
+    st = path.stat()
+    is_dir = path.is_dir()
+    attr = "D" if is_dir else "A"
+    size = 0 if is_dir else st.st_size
+    stamp = time.strftime("%a %b %e %H:%M:%S %Y", time.localtime(st.st_mtime))
+    return f"  {name:<35} {attr:>7} {size:>8}  {stamp}"
+
+
+def auth_mode(args) -> str:
+    if "-N" in args:
+        return "anonymous"
+    if "-U" in args:
+        user = args[args.index("-U") + 1]
+        return "guest" if user.split("%", 1)[0].lower() == "guest" else "user"
+    return "anonymous"
+
+
+def main() -> int:
+    args = sys.argv[1:]
+    root = pathlib.Path(os.environ["FAKE_SMB_ROOT"])
+    share = args[0] if args and args[0].startswith("//") else "//fake/Share"
+    cmds = args[args.index("-c") + 1] if "-c" in args else ""
+    latency = float(os.environ.get("FAKE_SMB_LATENCY", "0"))
+    per_file = float(os.environ.get("FAKE_SMB_LATENCY_PER_FILE", "0"))
+    allowed = {m.strip() for m in os.environ.get("FAKE_SMB_AUTH", "user,anonymous,guest").split(",")}
+
+    if latency:
+        time.sleep(latency)
+    if auth_mode(args) not in allowed:
+        print("session setup failed: NT_STATUS_ACCESS_DENIED")
+        return 1
+
+    stats = {"bytes": 0, "files": 0, "listed": 0}
+    cwd = pathlib.PurePosixPath(".")
+    lcd = pathlib.Path.cwd()
+    recurse = False
+    rc = 0
+
+    def remote(rel) -> pathlib.Path:
+        return root / cwd / str(rel).replace("\\", "/")
+
+    def win(rel) -> str:
+        return "\\" + str(rel).replace("/", "\\").lstrip(".\\")
+
+    def fetch(src: pathlib.Path, dst: pathlib.Path, shown: str) -> None:
+        if per_file:
+            time.sleep(per_file)
+        shutil.copyfile(src, dst)
+        size = src.stat().st_size
+        stats["bytes"] += size
+        stats["files"] += 1
+        print(f"getting file {shown} of size {size} as {dst} (0.0 KiloBytes/sec) (average 0.0 KiloBytes/sec)")
+
+    def listing(rel: pathlib.PurePosixPath, header: bool) -> None:
+        d = root / rel
+        if header:
+            print("")
+            print(win(rel))
+        print(fmt_entry(d, "."))
+        print(fmt_entry(d, ".."))
+        subdirs = []
+        for child in sorted(d.iterdir(), key=lambda c: c.name):
+            print(fmt_entry(child, child.name))
+            stats["listed"] += 1
+            if child.is_dir():
+                subdirs.append(rel / child.name)
+        if recurse:
+            for sub in subdirs:
+                listing(sub, True)
+
+    for command in cmds.split(";"):
+        parts = shlex.split(command.strip())
+        if not parts:
+            continue
+        op = parts[0]
+        try:
+            if op == "pwd":
+                print(f"Current directory is \\{share.lstrip('/').replace('/', chr(92))}{win(cwd)}")
+            elif op == "cd":
+                target = cwd / parts[1].replace("\\", "/")
+                if not (root / target).is_dir():
+                    print(f"cd {parts[1]}: NT_STATUS_OBJECT_NAME_NOT_FOUND")
+                    rc = 1
+                    continue
+                cwd = target
+            elif op == "lcd":
+                lcd = pathlib.Path(parts[1])
+            elif op == "recurse":
+                recurse = parts[1].upper() == "ON"
+            elif op == "prompt":
+                pass
+            elif op == "ls":
+                listing(cwd, False)
+                print("")
+                print("\t\t1953382396 blocks of size 1024. 1065299328 blocks available")
+            elif op == "get":
+                src = remote(parts[1])
+                dst = pathlib.Path(parts[2]) if len(parts) > 2 else lcd / src.name
+                if not dst.is_absolute():
+                    dst = lcd / dst
+                fetch(src, dst, win(cwd / parts[1].replace("\\", "/")))
+            elif op == "mget":
+                base = root / cwd
+                for src in sorted(base.rglob("*") if recurse else base.glob("*")):
+                    rel = src.relative_to(base)
+                    if src.is_dir():
+                        (lcd / rel).mkdir(parents=True, exist_ok=True)
+                        continue
+                    (lcd / rel).parent.mkdir(parents=True, exist_ok=True)
+                    fetch(src, lcd / rel, win(cwd / rel))
+            else:
+                print(f"{op}: command not found")
+                rc = 1
+        except OSError as e:
+            print(f"NT_STATUS_OBJECT_NAME_NOT_FOUND ({e})")
+            rc = 1
+
+    stats_file = os.environ.get("FAKE_SMB_STATS")
+    if stats_file:
+        with open(stats_file, "a", encoding="utf-8") as fh:
+            fh.write(json.dumps(stats) + "\n")
+    return rc
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -16,6 +16,10 @@ sed -i 's/^#\?PermitRootLogin.*/PermitRootLogin no/' /etc/ssh/sshd_config
 mkdir -p /run/sshd
 ssh-keygen -A
 
+# ANSIBLE_SYNC_RUNNER=daemon (default): one resident process with its own
+# scheduler; cron: the legacy per-minute cron entry
+ANSIBLE_SYNC_RUNNER=${ANSIBLE_SYNC_RUNNER:-daemon}
+
 cat > /etc/cron.d/ansible_runner << EOF
 SHELL=/bin/bash
 PATH=/usr/local/sbin:/usr/local/bin:/usr/sbin:/usr/bin:/sbin:/bin
@@ -31,10 +35,31 @@ SAMBA_USER=${SAMBA_USER}
 SAMBA_PASSWORD=${SAMBA_PASSWORD}
 SMB_DEBUGLEVEL=${SMB_DEBUGLEVEL:-2}
 SMB_PROTOCOL=${SMB_PROTOCOL:-SMB3}
+SYNC_MODE=${SYNC_MODE:-delta}
+SYNC_HASH=${SYNC_HASH:-0}
+STATE_DIR=${STATE_DIR:-/var/lib/ansible_sync}
+PLAYBOOK_MAX_AGE=${PLAYBOOK_MAX_AGE:-3600}
+PLAYBOOKS=${PLAYBOOKS:-healthcheck.yml,stub.yml}
+PLAYBOOK_DEPS=${PLAYBOOK_DEPS:-}
+PLAYBOOK_WORKERS=${PLAYBOOK_WORKERS:-4}
+ANSIBLE_LOG_DIR=/var/log/ansible
+SSH_PROBE=${SSH_PROBE:-1}
+SSH_PROBE_TIMEOUT=${SSH_PROBE_TIMEOUT:-1.0}
+SSH_PROBE_BACKOFF=${SSH_PROBE_BACKOFF:-60}
+SSH_PROBE_BACKOFF_MAX=${SSH_PROBE_BACKOFF_MAX:-3600}
+SMB_BREAKER_THRESHOLD=${SMB_BREAKER_THRESHOLD:-3}
+SMB_BREAKER_BACKOFF=${SMB_BREAKER_BACKOFF:-60}
+SMB_BREAKER_BACKOFF_MAX=${SMB_BREAKER_BACKOFF_MAX:-1800}
 LOG_FILE=/var/log/get_ansible_workspace.log
 ANSIBLE_LOG_FILE=/var/log/ansible_runner.log
-* * * * * root flock -n /var/run/ansible-workspace.lock -c "/usr/bin/env python3 /usr/local/bin/ansible_sync.py"
+EVENTS_FILE=/var/log/ansible_events.jsonl
+LOG_MAX_BYTES=${LOG_MAX_BYTES:-10485760}
+LOG_BACKUP_COUNT=${LOG_BACKUP_COUNT:-5}
+LOG_ROTATE_WHEN=${LOG_ROTATE_WHEN:-}
 EOF
+if [ "$ANSIBLE_SYNC_RUNNER" = "cron" ]; then
+  echo '* * * * * root flock -n /var/run/ansible-workspace.lock -c "/usr/bin/env python3 /usr/local/bin/ansible_sync.py"' >> /etc/cron.d/ansible_runner
+fi
 chmod 0644 /etc/cron.d/ansible_runner
 service cron restart || service cron start || true
 
@@ -42,5 +67,15 @@ service cron restart || service cron start || true
 echo "" > /var/log/get_ansible_workspace.log
 echo "" > /var/log/ansible_runner.log
 
+if [ "$ANSIBLE_SYNC_RUNNER" = "daemon" ]; then
+  # Restart the daemon if it ever exits; it logs to the files above itself
+  (
+    while true; do
+      /usr/bin/env python3 /usr/local/bin/ansible_sync.py daemon >/dev/null 2>&1 || true
+      sleep 5
+    done
+  ) &
+fi
+
 # Keep running: sshd in foreground
 exec /usr/sbin/sshd -D
@@ -0,0 +1,82 @@
+"""The log analyzer follows copy-and-truncate rotation and the current log layout."""
+import json
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "srv_ansible"))
+
+import ansible_sync  # noqa: E402
+
+RUNNER = (
+    "2025-10-01 14:53:02 ansible-playbook healthcheck.yml exit code: 0 "
+    "(12.5s, ok=3 changed=0 failed=0 unreachable=0, log: /var/log/ansible/healthcheck.log)\n"
+    "2025-10-01 14:53:04 ansible-playbook stub.yml exit code: 2 "
+    "(2.0s, ok=0 changed=0 failed=1 unreachable=0, log: /var/log/ansible/stub.log)\n"
+    "2025-10-01 15:53:02 ansible-playbook stub.yml skipped: inputs unchanged (abcdef012345), last run 5s ago\n"
+)
+
+PLAYBOOK = (
+    "2025-10-01 14:52:50 PLAY [all] *********\n"
+    "2025-10-01 14:52:51 TASK [ping] *********\n"
+    "2025-10-01 14:52:52 ok: [web]\n"
+    "2025-10-01 14:52:53 fatal: [db]: UNREACHABLE! => {}\n"
+    "2025-10-01 14:53:01 PLAY RECAP *********\n"
+    "2025-10-01 15:52:50 PLAY [all] *********\n"
+)
+
+
+def test_runner_summary_gives_rc_and_duration(tmp_path):
+    log = tmp_path / "ansible_runner.log"
+    log.write_text(RUNNER)
+    agg = ansible_sync.new_analysis()
+    ansible_sync.analyze_log(log, "runner", agg)
+    assert agg["playbooks"]["healthcheck.yml"] == {"rc": {"0": 1}, "dur": [1, 12.5, 12.5, 12.5]}
+    assert agg["playbooks"]["stub.yml"] == {"rc": {"2": 1}, "dur": [1, 2.0, 2.0, 2.0]}
+
+
+def test_playbook_log_gives_hosts_and_tasks(tmp_path):
+    log = tmp_path / "healthcheck.log"
+    log.write_text(PLAYBOOK)
+    agg = ansible_sync.new_analysis()
+    ansible_sync.analyze_log(log, "runner", agg)
+    assert agg["hosts"] == {"web": [1, 1], "db": [1, 0]}
+    assert agg["tasks"] == {"ping": {"ok": 1, "unreachable": 1}}
+
+
+def test_truncated_log_that_grew_back_is_reread(tmp_path):
+    log = tmp_path / "ansible_runner.log"
+    log.write_text(RUNNER.splitlines(keepends=True)[0])
+    agg = ansible_sync.new_analysis()
+    ansible_sync.analyze_log(log, "runner", agg)
+    # gzip_rotator(): same inode, truncated, then more than the old offset written
+    with log.open("r+") as fh:
+        fh.truncate(0)
+    with log.open("a") as fh:
+        fh.write(RUNNER.splitlines(keepends=True)[1] * 3)
+    consumed = ansible_sync.analyze_log(log, "runner", agg)
+    assert consumed == log.stat().st_size
+    assert agg["playbooks"]["stub.yml"]["rc"] == {"2": 3}
+    # Appending without rotation resumes from the offset
+    with log.open("a") as fh:
+        fh.write(RUNNER.splitlines(keepends=True)[0])
+    ansible_sync.analyze_log(log, "runner", agg)
+    assert agg["playbooks"]["healthcheck.yml"]["rc"] == {"0": 2}
+    assert agg["playbooks"]["stub.yml"]["rc"] == {"2": 3}
+
+
+def test_analyze_reads_playbook_logs_by_default(tmp_path, monkeypatch):
+    (tmp_path / "ansible").mkdir()
+    (tmp_path / "ansible_runner.log").write_text(RUNNER)
+    (tmp_path / "ansible" / "healthcheck.log").write_text(PLAYBOOK)
+    (tmp_path / "sync.log").write_text("")
+    monkeypatch.setenv("ANSIBLE_LOG_FILE", str(tmp_path / "ansible_runner.log"))
+    monkeypatch.setenv("ANSIBLE_LOG_DIR", str(tmp_path / "ansible"))
+    monkeypatch.setenv("LOG_FILE", str(tmp_path / "sync.log"))
+    state = tmp_path / "analyze.json"
+    assert ansible_sync.cli(["analyze", "--state", str(state)]) == 0
+    agg = json.loads(state.read_text())
+    assert sorted(agg["files"]) == sorted(
+        str(tmp_path / p) for p in ("ansible_runner.log", "ansible/healthcheck.log", "sync.log")
+    )
+    assert agg["hosts"]["web"] == [1, 1]
+    assert agg["playbooks"]["healthcheck.yml"]["dur"] == [1, 12.5, 12.5, 12.5]
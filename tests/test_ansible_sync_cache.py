@@ -0,0 +1,28 @@
+"""Playbook runs are skipped from run_cache.json only after a successful run."""
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "srv_ansible"))
+
+import ansible_sync  # noqa: E402
+
+FP = "a" * 64
+
+
+def test_failed_run_is_retried_next_cycle():
+    # Cycle 1 ran the playbook and it failed; cycle 2 a minute later, same inputs
+    cached = {"fingerprint": FP, "last_run": 1000.0, "rc": 2}
+    assert not ansible_sync.cached_run_is_fresh(cached, FP, 3600, 1060.0)
+    # Cycle 2 succeeded; cycle 3 can skip it
+    cached = {"fingerprint": FP, "last_run": 1060.0, "rc": 0}
+    assert ansible_sync.cached_run_is_fresh(cached, FP, 3600, 1120.0)
+
+
+def test_changed_inputs_expired_or_disabled_cache_runs():
+    cached = {"fingerprint": FP, "last_run": 1000.0, "rc": 0}
+    assert not ansible_sync.cached_run_is_fresh(cached, "b" * 64, 3600, 1060.0)
+    assert not ansible_sync.cached_run_is_fresh(cached, FP, 3600, 1000.0 + 3600)
+    assert not ansible_sync.cached_run_is_fresh(cached, FP, 0, 1060.0)
+    assert not ansible_sync.cached_run_is_fresh(None, FP, 3600, 1060.0)
+    # Entries written before rc was recorded are not trusted either
+    assert not ansible_sync.cached_run_is_fresh({"fingerprint": FP, "last_run": 1000.0}, FP, 3600, 1060.0)
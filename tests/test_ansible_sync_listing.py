@@ -0,0 +1,57 @@
+"""Recursive smbclient 'ls' output becomes relative file and directory sets."""
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "srv_ansible"))
+
+import ansible_sync  # noqa: E402
+
+LISTING = """\
+  .                                   D        0  Mon Sep 22 17:41:31 2025
+  ..                                  D        0  Mon Sep 22 17:41:31 2025
+  hosts.ini                           A      761  Mon Sep 22 17:41:31 2025
+  site copy.yml                       N       12  Wed Oct  1 09:05:00 2025
+  roles                               D        0  Mon Sep 22 17:41:31 2025
+
+\\Ansible\\roles
+  .                                   D        0  Mon Sep 22 17:41:31 2025
+  ..                                  D        0  Mon Sep 22 17:41:31 2025
+  web                                DA        0  Mon Sep 22 17:41:31 2025
+
+\\Ansible\\roles\\web
+  .                                   D        0  Mon Sep 22 17:41:31 2025
+  main.yml                            A     1024  Tue Sep 23 08:00:59 2025
+
+\t\t10218772 blocks of size 1024. 4567008 blocks available
+"""
+
+
+def test_parse_smb_listing_relative_paths():
+    files, dirs = ansible_sync.parse_smb_listing(LISTING.splitlines(), "/ansible/")
+    assert files == {
+        "hosts.ini": (761, "Mon Sep 22 17:41:31 2025"),
+        "site copy.yml": (12, "Wed Oct  1 09:05:00 2025"),
+        "roles/web/main.yml": (1024, "Tue Sep 23 08:00:59 2025"),
+    }
+    assert dirs == {"roles", "roles/web"}
+
+
+def test_parse_smb_listing_nested_remote_path():
+    lines = [
+        "  group_vars                          D        0  Mon Sep 22 17:41:31 2025",
+        "",
+        "\\share\\ansible\\group_vars",
+        "  all.yml                             A       42  Mon Sep 22 17:41:31 2025",
+    ]
+    files, dirs = ansible_sync.parse_smb_listing(lines, "share/ansible")
+    assert files == {"group_vars/all.yml": (42, "Mon Sep 22 17:41:31 2025")}
+    assert dirs == {"group_vars"}
+
+
+def test_parse_smb_listing_ignores_noise():
+    lines = [
+        "Try \"help\" to get a list of possible commands.",
+        "NT_STATUS_ACCESS_DENIED listing \\ansible\\secret",
+        "\t\t10218772 blocks of size 1024. 4567008 blocks available",
+    ]
+    assert ansible_sync.parse_smb_listing(lines, "ansible") == ({}, set())
@@ -0,0 +1,46 @@
+"""Delta sync prunes only inside a real workspace directory."""
+import logging
+import pathlib
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "srv_ansible"))
+
+import ansible_sync  # noqa: E402
+
+LOGGER = logging.getLogger("test_ansible_sync_prune")
+
+
+@pytest.mark.parametrize("path", ["", ".", "/", "/.", "/tmp/.."])
+def test_safe_resolved_path_refuses_root_and_empty(path):
+    with pytest.raises(RuntimeError):
+        ansible_sync.safe_resolved_path(pathlib.Path(path))
+
+
+def test_safe_resolved_path_accepts_workspace(tmp_path):
+    assert ansible_sync.safe_resolved_path(tmp_path / "ws" / ".." / "ws") == (tmp_path / "ws").resolve()
+
+
+def test_prune_refuses_empty_path(tmp_path, monkeypatch):
+    (tmp_path / "keep.txt").write_text("x")
+    monkeypatch.chdir(tmp_path)
+    with pytest.raises(RuntimeError):
+        ansible_sync.prune_local_tree(pathlib.Path(""), {}, set(), LOGGER)
+    assert (tmp_path / "keep.txt").exists()
+
+
+def test_prune_removes_only_what_is_gone(tmp_path):
+    (tmp_path / "roles" / "old").mkdir(parents=True)
+    (tmp_path / "roles" / "web").mkdir()
+    (tmp_path / "site.yml").write_text("x")
+    (tmp_path / "stale.yml").write_text("x")
+    (tmp_path / "roles" / "web" / "main.yml").write_text("x")
+    removed = ansible_sync.prune_local_tree(
+        tmp_path, {"site.yml": (1, ""), "roles/web/main.yml": (1, "")}, {"roles", "roles/web"}, LOGGER
+    )
+    assert removed == 1
+    assert sorted(p.relative_to(tmp_path).as_posix() for p in tmp_path.rglob("*")) == [
+        "roles", "roles/web", "roles/web/main.yml", "site.yml",
+    ]
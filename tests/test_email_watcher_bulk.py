@@ -0,0 +1,45 @@
+"""--bulk must survive raw 8-bit headers, which are common in spam corpora."""
+import io
+import json
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "pc_banna" / "tools"))
+
+import email_watcher  # noqa: E402
+
+RAW_8BIT = (
+    "From: Анна Боярина <b.anna@darkstore.local>\r\n"
+    "To: boss@darkstore.local\r\n"
+    "Subject: Счёт на оплату\r\n"
+    "Message-ID: <8bit-1@darkstore.local>\r\n"
+    "X-Spam-Status: Yes, score=9.1 тест\r\n"
+    "MIME-Version: 1.0\r\n"
+    "Content-Type: text/plain; charset=utf-8\r\n"
+    "Content-Transfer-Encoding: 8bit\r\n"
+    "\r\n"
+    "Пароль: s3cr3t\r\n"
+).encode("utf-8")
+
+
+def test_analyze_message_8bit_headers_are_str(tmp_path):
+    eml = tmp_path / "spam.eml"
+    eml.write_bytes(RAW_8BIT)
+    record = email_watcher.analyze_message((str(eml), 0, -1))
+    assert "error" not in record
+    assert record["from"] == "Анна Боярина <b.anna@darkstore.local>"
+    assert record["subject"] == "Счёт на оплату"
+    assert record["message_id"] == "<8bit-1@darkstore.local>"
+    assert all(isinstance(v, str) for v in record["spam"].values())
+    json.dumps(record, ensure_ascii=False)
+
+
+def test_bulk_analyze_8bit_corpus(tmp_path):
+    corpus = tmp_path / "corpus"
+    corpus.mkdir()
+    (corpus / "a.eml").write_bytes(RAW_8BIT)
+    (corpus / "b.eml").write_bytes(RAW_8BIT.replace(b"8bit-1", b"8bit-2"))
+    report = io.StringIO()
+    assert email_watcher.bulk_analyze(corpus, report, jobs=1) == 0
+    lines = [json.loads(line) for line in report.getvalue().splitlines()]
+    assert [r["message_id"] for r in lines] == ["<8bit-1@darkstore.local>", "<8bit-2@darkstore.local>"]
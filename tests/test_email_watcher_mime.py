@@ -0,0 +1,131 @@
+"""BODYSTRUCTURE parsing and the single-pass part splitter used with EMAIL_SAVE_EML."""
+import os
+import sys
+from email.message import EmailMessage
+from email.policy import compat32
+from email import message_from_bytes
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "pc_banna" / "tools"))
+
+import email_watcher  # noqa: E402
+import imap_standin  # noqa: E402
+
+ZIP = b"PK\x03\x04" + os.urandom(50000)
+INNER_ZIP = b"PK\x03\x04" + os.urandom(3000)
+
+
+def fixture_message() -> bytes:
+    inner = EmailMessage()
+    inner["Subject"] = "fwd"
+    inner.set_content("Inner text\n")
+    inner.add_attachment(INNER_ZIP, maintype="application", subtype="zip", filename="inner.zip")
+
+    msg = EmailMessage()
+    msg["From"] = "a@darkstore.local"
+    msg["To"] = "b.anna@darkstore.local"
+    msg["Subject"] = "Документы"
+    msg.set_content("Пароль: Secret123\n\n--not a boundary\n", cte="quoted-printable")
+    msg.add_alternative("<p>Пароль: Secret123</p>", subtype="html", cte="base64")
+    msg.add_attachment(ZIP, maintype="application", subtype="zip", filename="docs.zip")
+    msg.add_attachment(inner)
+    return bytes(msg).replace(b"\r\n", b"\n").replace(b"\n", b"\r\n")
+
+
+def fetch_response(raw: bytes):
+    # What imaplib hands back for "UID FETCH n (UID BODYSTRUCTURE)"
+    msg = message_from_bytes(raw, policy=compat32)
+    structure = imap_standin.bodystructure(msg).encode("utf-8", "surrogateescape")
+    return [b"1 (UID 7 BODYSTRUCTURE " + structure + b")"], msg
+
+
+def test_parse_fetch_literals_and_nil():
+    data = [(b'1 (UID 5 BODY[1]<0> {5}', b"he)(l"), b' FLAGS (\\Seen) INTERNALDATE "01-Jan-2024 00:00:00 +0000" X NIL)']
+    item = email_watcher.parse_fetch(data)[0]
+    assert item == {
+        "UID": "5",
+        "BODY[1]<0>": b"he)(l",
+        "FLAGS": ["\\Seen"],
+        "INTERNALDATE": b"01-Jan-2024 00:00:00 +0000",
+        "X": None,
+    }
+
+
+def test_walk_structure_sections():
+    data, _ = fetch_response(fixture_message())
+    item = email_watcher.parse_fetch(data)[0]
+    assert item["UID"] == "7"
+    leaves = {section: (part["type"], part["encoding"], part["filename"])
+              for section, part in email_watcher.walk_structure(item["BODYSTRUCTURE"])}
+    assert leaves == {
+        "1.1": ("text/plain", "quoted-printable", None),
+        "1.2": ("text/html", "base64", None),
+        "2": ("application/zip", "base64", "docs.zip"),
+        "3": ("message/rfc822", "8bit", None),
+        "3.1": ("text/plain", "7bit", None),
+        "3.2": ("application/zip", "base64", "inner.zip"),
+    }
+    texts, archives = email_watcher.classify_parts(item["BODYSTRUCTURE"])
+    assert [s for s, _ in texts] == ["1.1", "1.2", "3.1"]
+    assert [s for s, _ in archives] == ["2", "3.2"]
+
+
+@pytest.mark.parametrize("chunk", [1, 7, 76, 4096, 1 << 20])
+def test_mime_splitter_matches_section_fetches(chunk):
+    raw = fixture_message()
+    data, msg = fetch_response(raw)
+    structure = email_watcher.parse_fetch(data)[0]["BODYSTRUCTURE"]
+    got = {}
+    sinks = {}
+    for section, _ in email_watcher.walk_structure(structure):
+        if section != "3":
+            got[section] = []
+            sinks[section] = [lambda data, final=False, out=got[section]: out.append(data)]
+    feed = email_watcher.mime_splitter(sinks)
+    for i in range(0, len(raw), chunk):
+        feed(raw[i:i + chunk])
+    feed(b"", final=True)
+    for section, pieces in got.items():
+        assert b"".join(pieces) == imap_standin.body_section(raw, msg, section), section
+
+
+def test_full_pass_decodes_parts_to_disk(tmp_path):
+    raw = fixture_message()
+    data, _ = fetch_response(raw)
+    structure = email_watcher.parse_fetch(data)[0]["BODYSTRUCTURE"]
+    with email_watcher.full_pass(structure, tmp_path) as (feed, result):
+        for i in range(0, len(raw), 1000):
+            feed(raw[i:i + 1000])
+    assert result["password"] == "Secret123"
+    assert result["saved"] == [tmp_path / "docs.zip", tmp_path / "inner.zip"]
+    assert (tmp_path / "docs.zip").read_bytes() == ZIP
+    assert (tmp_path / "inner.zip").read_bytes() == INNER_ZIP
+    assert (tmp_path / "email.eml").read_bytes().startswith(b"From: a@darkstore.local\r\n")
+
+
+def test_full_pass_failure_leaves_no_archive(tmp_path):
+    raw = fixture_message()
+    data, _ = fetch_response(raw)
+    structure = email_watcher.parse_fetch(data)[0]["BODYSTRUCTURE"]
+    with pytest.raises(ConnectionError):
+        with email_watcher.full_pass(structure, tmp_path) as (feed, result):
+            feed(raw[:len(raw) // 2])
+            raise ConnectionError("gone")
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["email.eml"]
+
+
+def test_mime_splitter_binary_body_without_newlines(monkeypatch):
+    monkeypatch.setattr(email_watcher, "FETCH_CHUNK", 1024)
+    blob = bytes(b for b in os.urandom(20000) if b not in b"\r\n")
+    raw = (b"Content-Type: multipart/mixed; boundary=XX\r\n\r\n--XX\r\n"
+           b"Content-Type: application/zip; name=a.zip\r\nContent-Transfer-Encoding: binary\r\n\r\n"
+           + blob + b"\r\n--XX--\r\n")
+    out = []
+    feed = email_watcher.mime_splitter({"1": [lambda data, final=False: out.append(data)]})
+    for i in range(0, len(raw), 300):
+        feed(raw[i:i + 300])
+    feed(b"", final=True)
+    assert b"".join(out) == blob
+    assert max(len(piece) for piece in out) < 3 * 1024
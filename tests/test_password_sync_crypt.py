@@ -0,0 +1,71 @@
+"""The built-in SHA512-CRYPT engine against the published test vectors and the repo's hashes."""
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import password_sync_with_postfix as sync  # noqa: E402
+
+# From Drepper's "Unix crypt using SHA-256 and SHA-512" specification
+VECTORS = [
+    ("Hello world!", "$6$saltstring",
+     "$6$saltstring$svn8UoSVapNtMuq1ukKS4tPQd8iKwSMHWjl/O817G3uBnIFNjnQJuesI68u4OTLiBFdcbYEdFCoEOfaS35inz1"),
+    ("Hello world!", "$6$rounds=10000$saltstringsaltstring",
+     "$6$rounds=10000$saltstringsaltst$OW1/O6BYHV6BcXZu8QVeXbDWra3Oeqh0sbHbbMCVNSnCM/UrjmM0Dp8vOuZeHBy/"
+     "YTBmSK6H9qs/y3RnOaw5v."),
+    ("This is just a test", "$6$rounds=5000$toolongsaltstring",
+     "$6$rounds=5000$toolongsaltstrin$lQ8jolhgVRVhY4b5pZKaysCLi0QBxGoNeKQzQ3glMhwllF7oGDZxUhx1yxdYcz/"
+     "e1JSbq3y6JMxxl8audkUEm0"),
+    ("a very much longer text to encrypt.  This one even stretches over morethan one line.",
+     "$6$rounds=1400$anotherlongsaltstring",
+     "$6$rounds=1400$anotherlongsalts$POfYwTEok97VWcjxIiSOjiykti.o/pQs.wPvMxQ6Fm7I6IoYN3CmLs66x9t0oSwbtEW7o7UmJEiDwGqd8p4ur1"),
+    ("we have a short salt string but not a short password", "$6$rounds=77777$short",
+     "$6$rounds=77777$short$WuQyW2YR.hBNpjjRhpYD/ifIw05xdfeEyQoMxIXbkvr0gge1a1x3yRULJ5CCaUeOxFmtlcGZelFl5CxtgfiAc0"),
+    ("the minimum number is still observed", "$6$rounds=10$roundstoolow",
+     "$6$rounds=1000$roundstoolow$kUMsbe306n21p9R.FRkW3IGn.S9NPN0x50YhH1xhLsPuWGsUSklZt58jaTfF4ZEQpyUNGc0dqbpBYYBaHHrsX."),
+]
+
+
+def repo_account(email):
+    env = sync.load_dotenv(ROOT / ".env")
+    lines = (ROOT / "srv_mailcow" / "config" / "postfix-accounts.cf").read_text().splitlines()
+    rest = dict(sync.parse_accounts(lines))[email]
+    return env[sync.env_key_for_email(email)], sync.current_hash(rest)
+
+
+@pytest.fixture(params=["libc", "builtin"])
+def engine(request, monkeypatch):
+    if request.param == "builtin":
+        monkeypatch.setattr(sync, "_os_crypt", lambda: None)
+    elif sync._os_crypt() is None:
+        pytest.skip("crypt module not available")
+    return request.param
+
+
+@pytest.mark.parametrize("password,setting,expected", VECTORS)
+def test_builtin_matches_published_vectors(password, setting, expected):
+    assert sync.sha512_crypt_builtin(password, setting) == expected
+
+
+def test_verify_published_vector_with_default_rounds(engine):
+    password, _, expected = VECTORS[0]
+    assert sync.sha512_crypt_verify(password, expected)
+    assert not sync.sha512_crypt_verify(password + " ", expected)
+
+
+def test_verify_existing_repo_hash(engine):
+    # The .env value keeps "$$" literally; that is what the hash was made from
+    password, hashed = repo_account("petrovich@darkstore.local")
+    assert hashed.startswith("$6$rounds=656000$")
+    assert sync.sha512_crypt_verify(password, hashed)
+    assert not sync.sha512_crypt_verify(password.replace("$$", "$"), hashed)
+
+
+def test_hash_round_trip(engine):
+    hashed = sync.sha512_crypt_hash("Annab3lla", rounds=1000)
+    assert hashed.startswith("$6$rounds=1000$")
+    assert sync.sha512_crypt_verify("Annab3lla", hashed)
+    assert sync.sha512_crypt_builtin("Annab3lla", hashed) == hashed
@@ -0,0 +1,90 @@
+"""--provision merges the account source, postfix-accounts.cf and the fingerprint cache."""
+import argparse
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import password_sync_with_postfix as sync  # noqa: E402
+
+REPO_ACCOUNTS = (ROOT / "srv_mailcow" / "config" / "postfix-accounts.cf").read_text().splitlines()
+ENV = sync.load_dotenv(ROOT / ".env")
+
+
+def line_for(email):
+    return next(line for line in REPO_ACCOUNTS if line.startswith(email + "|"))
+
+
+@pytest.fixture
+def cheap_hashes(monkeypatch):
+    # New hashes only need to verify; 656000 rounds would just slow the test down
+    real = sync.sha512_crypt_hash
+    monkeypatch.setattr(sync, "sha512_crypt_hash", lambda password: real(password, rounds=1000))
+
+
+def run(tmp_path, source_text):
+    source = tmp_path / "accounts.csv"
+    source.write_text(source_text)
+    args = argparse.Namespace(
+        provision=source, accounts=tmp_path / "postfix-accounts.cf", cache=tmp_path / "cache.tsv", jobs=1
+    )
+    assert sync.provision(args, ENV) == 0
+    return args.accounts.read_text().splitlines()
+
+
+def test_provision_merge(tmp_path, cheap_hashes, capsys, monkeypatch):
+    (tmp_path / "postfix-accounts.cf").write_text("\n".join([
+        "# managed by password_sync",
+        "gone@darkstore.local|{SHA512-CRYPT}$6$rounds=1000$x$y",
+        line_for("petrovich@darkstore.local"),
+        line_for("boss@darkstore.local"),
+        line_for("trust@darkstore.local"),
+    ]) + "\n")
+    source = (
+        "email,password,password_env\n"
+        "Petrovich@darkstore.local,,\n"
+        "boss@darkstore.local,NewBossPass1!,\n"
+        "new@darkstore.local,,TRUST_PASSWORD\n"
+        "trust@darkstore.local,,NO_SUCH_KEY\n"
+        "nopw@darkstore.local,,\n"
+        "petrovich@darkstore.local,other,\n"
+    )
+    lines = run(tmp_path, source)
+    out = capsys.readouterr().out
+    for part in ("1 added", "1 updated", "1 unchanged", "1 removed", "1 kept", "1 skipped", "1 duplicate"):
+        assert part in out
+    assert [line.split("|")[0] for line in lines] == [
+        "# managed by password_sync",
+        "boss@darkstore.local",
+        "new@darkstore.local",
+        "petrovich@darkstore.local",
+        "trust@darkstore.local",
+    ]
+    accounts = dict(sync.parse_accounts(lines))
+    # Same password (or none in the source): the existing line is kept byte for byte
+    assert lines[3] == line_for("petrovich@darkstore.local")
+    assert lines[4] == line_for("trust@darkstore.local")
+    assert sync.sha512_crypt_verify("NewBossPass1!", sync.current_hash(accounts["boss@darkstore.local"]))
+    assert sync.sha512_crypt_verify(ENV["TRUST_PASSWORD"], sync.current_hash(accounts["new@darkstore.local"]))
+
+    # Second run: every password is answered from the fingerprint cache
+    mtime = (tmp_path / "postfix-accounts.cf").stat().st_mtime_ns
+
+    def no_verify(password, hashed):
+        raise AssertionError("cache miss")
+
+    monkeypatch.setattr(sync, "sha512_crypt_verify", no_verify)
+    assert run(tmp_path, source) == lines
+    assert "No account changes" in capsys.readouterr().out
+    assert (tmp_path / "postfix-accounts.cf").stat().st_mtime_ns == mtime
+
+
+def test_provision_cache_is_checked_against_password(tmp_path, cheap_hashes):
+    (tmp_path / "postfix-accounts.cf").write_text(line_for("b.anna@darkstore.local") + "\n")
+    run(tmp_path, "email,password\nb.anna@darkstore.local,Annab3lla\n")
+    lines = run(tmp_path, "email,password\nb.anna@darkstore.local,Changed1\n")
+    assert lines != [line_for("b.anna@darkstore.local")]
+    assert sync.sha512_crypt_verify("Changed1", sync.current_hash(dict(sync.parse_accounts(lines))["b.anna@darkstore.local"]))
@@ -0,0 +1,130 @@
+"""translate_csv resumes from its checkpoint after a crash; TokenBucket paces requests."""
+import csv
+import sys
+import types
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import translation  # noqa: E402
+
+FIELDNAMES = ['ID', 'name']
+
+
+class Crash(Exception):
+    pass
+
+
+def make_csv(path, n):
+    with open(path, 'w', encoding='utf-8-sig', newline='') as f:
+        writer = csv.DictWriter(f, delimiter=';', fieldnames=FIELDNAMES)
+        writer.writeheader()
+        for i in range(n):
+            writer.writerow({'ID': f'T{i:04d}', 'name': f'Technique {i}; "quoted"\nsecond line'})
+
+
+def translate_rows(rows):
+    return [dict(row, name=row['name'].upper()) for row in rows]
+
+
+def test_resume_after_crash_gives_identical_output(tmp_path):
+    expected = tmp_path / 'expected.csv'
+    make_csv(expected, 25)
+    assert translation.translate_csv(expected, translate_rows, FIELDNAMES, chunk_rows=10) == 25
+
+    src = tmp_path / 'techniques.csv'
+    make_csv(src, 25)
+    before = src.read_bytes()
+    seen = []
+
+    def crashing(rows):
+        seen.append([row['ID'] for row in rows])
+        if len(seen) == 2:
+            raise Crash
+        return translate_rows(rows)
+
+    with pytest.raises(Crash):
+        translation.translate_csv(src, crashing, FIELDNAMES, chunk_rows=10)
+    assert src.read_bytes() == before
+    # Simulate a torn write after the last checkpoint
+    with open(src.with_name(src.name + '.partial'), 'ab') as f:
+        f.write(b'T0010;HALF')
+
+    seen.clear()
+
+    def recording(rows):
+        seen.append([row['ID'] for row in rows])
+        return translate_rows(rows)
+
+    assert translation.translate_csv(src, recording, FIELDNAMES, chunk_rows=10) == 25
+    assert seen[0][0] == 'T0010'
+    assert sum(len(ids) for ids in seen) == 15
+    assert src.read_bytes() == expected.read_bytes()
+    assert not src.with_name(src.name + '.partial').exists()
+    assert not src.with_name(src.name + '.checkpoint').exists()
+
+
+def test_checkpoint_of_other_input_starts_over(tmp_path):
+    src = tmp_path / 'techniques.csv'
+    make_csv(src, 25)
+
+    def crashing(rows):
+        if rows[0]['ID'] == 'T0010':
+            raise Crash
+        return translate_rows(rows)
+
+    with pytest.raises(Crash):
+        translation.translate_csv(src, crashing, FIELDNAMES, chunk_rows=10)
+    make_csv(src, 12)  # the input changed before the rerun
+    calls = []
+    assert translation.translate_csv(
+        src, lambda rows: calls.append(len(rows)) or translate_rows(rows), FIELDNAMES, chunk_rows=10) == 12
+    assert calls == [10, 2]
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+        self.slept = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(translation, 'time', types.SimpleNamespace(monotonic=fake.monotonic, sleep=fake.sleep))
+    return fake
+
+
+def test_token_bucket_burst_then_rate(clock):
+    bucket = translation.TokenBucket(rate=4, burst=3)
+    for _ in range(3):
+        bucket.acquire()
+    assert clock.slept == []
+    for _ in range(4):
+        bucket.acquire()
+    assert clock.now == pytest.approx(101.0)
+    # An idle period refills at most `burst` tokens
+    clock.now += 60
+    clock.slept.clear()
+    for _ in range(3):
+        bucket.acquire()
+    assert clock.slept == []
+    bucket.acquire()
+    assert sum(clock.slept) == pytest.approx(0.25)
+
+
+def test_token_bucket_unlimited(clock):
+    bucket = translation.TokenBucket(rate=0, burst=1)
+    for _ in range(1000):
+        bucket.acquire()
+    assert clock.slept == []
@@ -0,0 +1,107 @@
+"""Pipeline error handling: split fallback only for bad replies, stop and resume on bans."""
+import csv
+import sys
+import threading
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import translation  # noqa: E402
+
+FIELDNAMES = ['ID', 'name']
+COLUMNS = [('name', 'name', 'whole')]
+
+
+class FakeBackend(translation.Backend):
+    name = 'fake'
+    max_batch_strings = 50
+    max_batch_chars = 5000
+
+    def __init__(self, mode='ok'):
+        super().__init__('en', 'ru')
+        self.mode = mode
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def request(self, text):
+        with self._lock:
+            self.calls.append(text)
+        if self.mode == 'banned':
+            raise translation.RetryableError('HTTP 429')
+        lines = [f'[ru] {line}' for line in text.split(self.delimiter)]
+        if self.mode == 'garble' and len(lines) > 1:
+            lines[:2] = [lines[0] + ' ' + lines[1]]
+        return self.delimiter.join(lines)
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(translation, 'BACKOFF_BASE', 0.0)
+
+
+def make_csv(path, n):
+    with open(path, 'w', encoding='utf-8-sig', newline='') as f:
+        writer = csv.DictWriter(f, delimiter=';', fieldnames=FIELDNAMES)
+        writer.writeheader()
+        for i in range(n):
+            writer.writerow({'ID': f'T{i:04d}', 'name': f'Technique {i}'})
+
+
+def read_csv(path):
+    with open(path, encoding='utf-8-sig', newline='') as f:
+        return list(csv.DictReader(f, delimiter=';'))
+
+
+def pipeline(backend, tmp_path, workers=4):
+    cache = translation.TranslationCache(tmp_path / 'cache.sqlite3')
+    return translation.Pipeline(backend, cache, COLUMNS, translation.TokenBucket(0), workers)
+
+
+def test_garbled_batch_falls_back_to_single_requests(tmp_path):
+    backend = FakeBackend('garble')
+    p = pipeline(backend, tmp_path, workers=1)
+    rows = p.translate_rows([{'ID': str(i), 'name': f'Technique {i}'} for i in range(3)])
+    assert [r['name'] for r in rows] == [f'[ru] Technique {i}' for i in range(3)]
+    assert p.stats['fallbacks'] == 1
+    assert len(backend.calls) == 1 + 3
+    p.cache.close()
+
+
+def test_exhausted_retries_stop_run_without_per_string_storm(tmp_path, monkeypatch):
+    src = tmp_path / 'techniques.csv'
+    make_csv(src, 30)
+    before = src.read_bytes()
+
+    # First chunk goes through, then the service starts answering 429
+    backend = FakeBackend()
+    p = pipeline(backend, tmp_path, workers=1)
+    real = p.translate_rows
+    chunks = []
+
+    def translate_rows(rows):
+        chunks.append(len(rows))
+        if len(chunks) == 2:
+            backend.mode = 'banned'
+        return real(rows)
+
+    monkeypatch.setattr(p, 'translate_rows', translate_rows)
+    assert p.run(src, FIELDNAMES, chunk_rows=10) is None
+    banned_calls = backend.calls[1:]
+    # one batch request with its retries, no per-string fallback
+    assert len(banned_calls) == translation.RETRIES + 1
+    assert all('\n' in call for call in banned_calls)
+    assert p.stats['failed'] == 10
+    assert src.read_bytes() == before
+    assert src.with_name(src.name + '.checkpoint').exists()
+    p.cache.close()
+
+    # The next run resumes after the checkpointed chunk and translates the rest
+    backend = FakeBackend()
+    p = pipeline(backend, tmp_path)
+    assert p.run(src, FIELDNAMES, chunk_rows=10) == 30
+    assert [r['name'] for r in read_csv(src)] == [f'[ru] Technique {i}' for i in range(30)]
+    assert len(backend.calls) == 2
+    p.cache.close()
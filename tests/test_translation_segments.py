@@ -0,0 +1,36 @@
+"""Description sentences must not be cut after abbreviations or initials."""
+import csv
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import translation  # noqa: E402
+
+
+def sentences(text):
+    return translation.split_segments(text, 'sentences')[::2]
+
+
+def test_abbreviations_do_not_end_a_sentence():
+    assert sentences('Adversaries may use e.g. PowerShell to run code. Then they win.') == [
+        'Adversaries may use e.g. PowerShell to run code.', 'Then they win.']
+    assert sentences('Compare Fig. 3 vs. Fig. 4, i.e. Windows. Done.') == [
+        'Compare Fig. 3 vs. Fig. 4, i.e. Windows.', 'Done.']
+    assert sentences('The U.S. Government and J. Smith. Next one!') == [
+        'The U.S. Government and J. Smith.', 'Next one!']
+
+
+def test_mitre_descriptions_with_abbreviations():
+    with open(ROOT / 'mitre_technics.csv', encoding='utf-8-sig', newline='') as fh:
+        rows = [row for row in csv.DictReader(fh, delimiter=';')
+                if any(a in row['описание'].lower() for a in ('e.g. ', 'i.e. ', 'etc. ', 'vs. ', 'fig. '))]
+    assert rows
+    for row in rows:
+        text = row['описание']
+        pieces = translation.split_segments(text, 'sentences')
+        assert ''.join(pieces) == text
+        for segment in pieces[::2]:
+            last = segment.rsplit(None, 1)[-1].lower() if segment.strip() else ''
+            assert last not in translation.ABBREVIATIONS, (row['ID'], segment)
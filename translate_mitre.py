@@ -1,45 +1,23 @@
-﻿import csv
-from deep_translator import GoogleTranslator
+﻿import os
+import sys
+from translation import Pipeline, TranslationCache, make_backend
 
 input_path = "mitre_technics.csv"
-translator = GoogleTranslator(source='auto', target='ru')
-cache = {}
 
-def translate(text):
-    if text is None:
-        return ''
-    if not text.strip():
-        return text
-    key = text.strip()
-    if key in cache:
-        return cache[key]
-    try:
-        translated = translator.translate(key)
-    except Exception:
-        translated = text
-    cache[key] = translated
-    # preserve leading/trailing whitespace
-    prefix_len = len(text) - len(text.lstrip())
-    suffix_len = len(text) - len(text.rstrip())
-    prefix = text[:prefix_len]
-    suffix = text[len(text) - suffix_len:]
-    return f"{prefix}{translated}{suffix}"
+# tactics are a comma-separated list from a small set and descriptions are
+# split into sentences (and lines), so repeats are translated once; backends
+# without batching get descriptions whole, see Pipeline
+columns = [('название', 'name', 'whole'), ('описание', 'description', 'sentences'), ('тактики', 'tactics', 'list')]
+fieldnames = ['ID', 'название', 'описание', 'тактики', 'platforms']
 
-rows = []
-with open(input_path, 'r', encoding='utf-8-sig', newline='') as f:
-    reader = csv.DictReader(f, delimiter=';')
-    for row in reader:
-        name_val = row.get('название') or row.get('name') or ''
-        desc_val = row.get('описание') or row.get('description') or ''
-        tactics_val = row.get('тактики') or row.get('tactics') or ''
-        row['название'] = translate(name_val)
-        row['описание'] = translate(desc_val)
-        row['тактики'] = translate(tactics_val)
-        rows.append(row)
+cache = TranslationCache()
+backend = make_backend(os.getenv('TRANSLATE_BACKEND', 'deep_translator'), 'auto', 'ru')
+pipeline = Pipeline(backend, cache, columns)
+rows = pipeline.run(input_path, fieldnames)
 
-fieldnames = ['ID', 'название', 'описание', 'тактики', 'platforms']
-with open(input_path, 'w', encoding='utf-8-sig', newline='') as f:
-    writer = csv.DictWriter(f, delimiter=';', fieldnames=fieldnames)
-    writer.writeheader()
-    for row in rows:
-        writer.writerow({field: row.get(field, '') for field in fieldnames})
+backend.close()
+cache.close()
+print(pipeline.summary())
+print(cache.summary())
+# stopped early: the checkpoint keeps the finished rows for the next run
+sys.exit(0 if rows is not None else 1)
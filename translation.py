@@ -0,0 +1,658 @@
+"""Translation pipeline shared by translate_mitre.py and translate_rest.py.
+
+A Backend sends strings to one translation service: DeepTranslatorBackend
+(deep_translator's GoogleTranslator) or GoogleRestBackend (the
+translate_a/single JSON endpoint, or bench/translate_standin.py when pointed
+at it); make_backend picks one by name. Pipeline runs a CSV through a
+backend with the helpers below.
+
+TranslationCache is a persistent SQLite cache of finished translations keyed
+by (backend, source language, target language, normalized text), so reruns
+only send strings that were never translated before. TokenBucket,
+call_with_retry and map_concurrent run requests on a thread pool while
+keeping the overall request rate within TRANSLATE_RATE. translate_csv
+streams a CSV through a translate function in checkpointed chunks, and
+split_segments/join_segments break cells into the sentences or list items
+that are actually sent, so repeated ones are translated once.
+"""
+import csv
+import os
+import random
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+CACHE_PATH = Path(os.getenv('TRANSLATION_CACHE', Path(__file__).resolve().parent / '.translation_cache.sqlite3'))
+# Eviction: least recently used entries beyond CACHE_MAX_ENTRIES, and entries
+# not used for CACHE_MAX_AGE_DAYS (0 disables the age limit)
+CACHE_MAX_ENTRIES = int(os.getenv('TRANSLATION_CACHE_MAX_ENTRIES', '200000'))
+CACHE_MAX_AGE_DAYS = float(os.getenv('TRANSLATION_CACHE_MAX_AGE_DAYS', '365'))
+COMMIT_EVERY = 100  # puts between commits, so a crash loses little work
+
+# Concurrency: WORKERS threads share one TokenBucket of RATE requests/s (BURST
+# at once); retryable failures back off exponentially with full jitter
+WORKERS = int(os.getenv('TRANSLATE_WORKERS', '8'))
+RATE = float(os.getenv('TRANSLATE_RATE', '10'))
+BURST = int(os.getenv('TRANSLATE_BURST', '10'))
+RETRIES = int(os.getenv('TRANSLATE_RETRIES', '5'))
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 30.0
+
+# Sentence ends followed by whitespace and something that starts a sentence,
+# or line breaks; list items are separated by commas. A period after a common
+# abbreviation or an initial (e.g., i.e., etc., vs., Fig., "U.S.") is not a
+# sentence end
+ABBREVIATIONS = ('e.g.', 'i.e.', 'etc.', 'vs.', 'fig.', 'cf.', 'al.')
+_NOT_ABBREVIATION = ''.join(rf'(?<!\b(?i:{re.escape(a)}))' for a in ABBREVIATIONS) + r'(?<!\b[A-Z]\.)'
+SENTENCE_SPLIT = re.compile(rf"((?<=[.!?]){_NOT_ABBREVIATION}\s+(?=[A-ZА-ЯЁ\"'(\[<`])|\s*\n\s*)")
+LIST_SPLIT = re.compile(r"(\s*,\s*)")
+
+# Rows per chunk in translate_csv: translated, written and checkpointed together
+CHUNK_ROWS = int(os.getenv('TRANSLATE_CHUNK_ROWS', '100'))
+
+GOOGLE_REST_URL = 'https://translate.googleapis.com/translate_a/single'
+# bench/translate_standin.py; serves /translate_a/single and deep_translator's /m
+STANDIN_URL = os.getenv('TRANSLATE_STANDIN_URL', 'http://127.0.0.1:8765')
+
+
+def normalize(text):
+    """Cache key form of text: NFC, inner whitespace runs collapsed, stripped."""
+    return ' '.join(unicodedata.normalize('NFC', text).split())
+
+
+class TranslationCache:
+    """SQLite-backed translation cache with hit/miss statistics and LRU/age eviction.
+
+    Safe to share between threads. Failed translations must not be put().
+    """
+
+    def __init__(self, path=CACHE_PATH, max_entries=CACHE_MAX_ENTRIES, max_age_days=CACHE_MAX_AGE_DAYS):
+        self.path = Path(path)
+        self.max_entries = max_entries
+        self.max_age_days = max_age_days
+        self.hits = 0
+        self.misses = 0
+        self.stored = 0
+        self.evicted = 0
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS translations ('
+            ' backend TEXT NOT NULL, sl TEXT NOT NULL, tl TEXT NOT NULL, source TEXT NOT NULL,'
+            ' translated TEXT NOT NULL, created REAL NOT NULL, used REAL NOT NULL,'
+            ' PRIMARY KEY (backend, sl, tl, source)) WITHOUT ROWID'
+        )
+        self._db.execute('CREATE INDEX IF NOT EXISTS translations_used ON translations (used)')
+        self._db.commit()
+
+    def get(self, backend, sl, tl, text):
+        """Cached translation of text, or None."""
+        key = (backend, sl, tl, normalize(text))
+        with self._lock:
+            row = self._db.execute(
+                'SELECT translated FROM translations WHERE backend=? AND sl=? AND tl=? AND source=?', key
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._db.execute(
+                'UPDATE translations SET used=? WHERE backend=? AND sl=? AND tl=? AND source=?', (time.time(),) + key
+            )
+            self._tick()
+            return row[0]
+
+    def put(self, backend, sl, tl, text, translated):
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                'INSERT INTO translations VALUES (?, ?, ?, ?, ?, ?, ?)'
+                ' ON CONFLICT (backend, sl, tl, source) DO UPDATE SET translated=excluded.translated, used=excluded.used',
+                (backend, sl, tl, normalize(text), translated, now, now),
+            )
+            self.stored += 1
+            self._tick()
+
+    def _tick(self):
+        self._pending += 1
+        if self._pending >= COMMIT_EVERY:
+            self._db.commit()
+            self._pending = 0
+
+    def evict(self):
+        """Apply the age and size limits; returns the number of entries removed."""
+        removed = 0
+        with self._lock:
+            if self.max_age_days:
+                cur = self._db.execute('DELETE FROM translations WHERE used < ?',
+                                       (time.time() - self.max_age_days * 86400,))
+                removed += cur.rowcount
+            (count,) = self._db.execute('SELECT COUNT(*) FROM translations').fetchone()
+            if self.max_entries and count > self.max_entries:
+                cur = self._db.execute(
+                    'DELETE FROM translations WHERE (backend, sl, tl, source) IN'
+                    ' (SELECT backend, sl, tl, source FROM translations ORDER BY used LIMIT ?)',
+                    (count - self.max_entries,),
+                )
+                removed += cur.rowcount
+            self._db.commit()
+            self._pending = 0
+            self.evicted += removed
+        return removed
+
+    def compact(self):
+        """Evict, then give the freed pages back to the filesystem."""
+        removed = self.evict()
+        if removed:
+            with self._lock:
+                self._db.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+                self._db.execute('VACUUM')
+        return removed
+
+    def summary(self):
+        lookups = self.hits + self.misses
+        rate = 100.0 * self.hits / lookups if lookups else 0.0
+        return (f'translation cache {self.path.name}: {self.hits} hits, {self.misses} misses ({rate:.1f}% hit rate), '
+                f'{self.stored} stored, {self.evicted} evicted')
+
+    def close(self):
+        self.compact()
+        with self._lock:
+            self._db.commit()
+            self._db.close()
+
+
+def split_segments(text, kind):
+    """Split a cell into [segment, separator, segment, ...]: kind is 'list'
+    (comma-separated items such as tactics), 'sentences' (descriptions) or
+    'whole'. Separators are kept verbatim for join_segments."""
+    if kind == 'list':
+        return LIST_SPLIT.split(text)
+    if kind == 'sentences':
+        return SENTENCE_SPLIT.split(text)
+    return [text]
+
+
+def join_segments(pieces, translate):
+    """Reassemble split_segments pieces, passing every segment through translate."""
+    return ''.join(translate(piece) if i % 2 == 0 else piece for i, piece in enumerate(pieces))
+
+
+def pack_batches(texts, max_cost, max_items, cost=len, sep_cost=1):
+    """Group texts, in order, into lists of at most max_items whose summed
+    cost(text) plus sep_cost per separator stays within max_cost. A text that
+    is too big on its own gets a batch of its own."""
+    batch, used = [], 0
+    for text in texts:
+        c = cost(text)
+        if batch and (len(batch) >= max_items or used + sep_cost + c > max_cost):
+            yield batch
+            batch, used = [], 0
+        used += c + (sep_cost if batch else 0)
+        batch.append(text)
+    if batch:
+        yield batch
+
+
+class TokenBucket:
+    """Thread-safe token bucket; acquire() blocks until one request may be sent.
+    A rate of 0 or less means unlimited."""
+
+    def __init__(self, rate=RATE, burst=BURST):
+        self.rate = rate
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self.stamp = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.stamp) * self.rate)
+                self.stamp = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class RetryableError(Exception):
+    """A failed request worth retrying (429, 5xx, connection trouble).
+    retry_after is the server's Retry-After in seconds, if it sent one."""
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def retry_after_seconds(value):
+    """Seconds from a Retry-After header (only the delta-seconds form), or None."""
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return None
+
+
+retries_done = 0  # retries across all call_with_retry calls, for reporting
+_retries_lock = threading.Lock()
+
+
+def call_with_retry(fn, *args, bucket=None, retries=RETRIES):
+    """fn(*args), taking a token from bucket before every attempt. RetryableError
+    is retried up to `retries` times with full-jitter exponential backoff (at
+    least retry_after); the last one is re-raised."""
+    global retries_done
+    for attempt in range(retries + 1):
+        if bucket is not None:
+            bucket.acquire()
+        try:
+            return fn(*args)
+        except RetryableError as e:
+            if attempt == retries:
+                raise
+            delay = random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+            if e.retry_after is not None:
+                delay = max(delay, min(e.retry_after, BACKOFF_MAX))
+            with _retries_lock:
+                retries_done += 1
+            time.sleep(delay)
+
+
+def map_concurrent(fn, items, workers=WORKERS):
+    """fn over items on a thread pool of `workers`, results in input order. The
+    first exception is re-raised once the running calls end; queued ones are
+    dropped."""
+    items = list(items)
+    if workers <= 1 or len(items) <= 1:
+        return [fn(item) for item in items]
+    with ThreadPoolExecutor(max_workers=min(workers, len(items))) as pool:
+        futures = [pool.submit(fn, item) for item in items]
+        try:
+            return [f.result() for f in futures]
+        except BaseException:
+            for f in futures:
+                f.cancel()
+            raise
+
+
+def _read_checkpoint(checkpoint, stamp):
+    """(rows done, ID of the last one, partial file offset) from the last complete
+    line of checkpoint, or None if it is missing or belongs to another input."""
+    try:
+        with open(checkpoint, encoding='utf-8') as f:
+            lines = f.read().split('\n')
+    except OSError:
+        return None
+    if not lines or lines[0] != stamp:
+        return None
+    last = None
+    for line in lines[1:-1]:  # the last element is '' or a torn write
+        parts = line.split('\t')
+        if len(parts) == 3 and parts[0].isdigit() and parts[2].isdigit():
+            last = (int(parts[0]), parts[1], int(parts[2]))
+    return last
+
+
+def translate_csv(path, translate_rows, fieldnames, delimiter=';', chunk_rows=CHUNK_ROWS):
+    """Translate the CSV at path in place, streaming.
+
+    Rows are read CHUNK_ROWS at a time, passed to translate_rows(rows) (which
+    returns them translated) and appended to <path>.partial. After each
+    chunk the partial file is fsynced and <path>.checkpoint records how many
+    rows are done. A rerun after a crash truncates the partial file to the
+    last checkpoint and skips that many input rows. The finished file
+    atomically replaces path; until then path is never written.
+    """
+    path = Path(path)
+    partial = path.with_name(path.name + '.partial')
+    checkpoint = path.with_name(path.name + '.checkpoint')
+    st = path.stat()
+    stamp = f'input\t{st.st_size}\t{st.st_mtime_ns}'
+    resume = _read_checkpoint(checkpoint, stamp) if partial.exists() else None
+
+    with open(path, 'r', encoding='utf-8-sig', newline='') as src:
+        reader = csv.DictReader(src, delimiter=delimiter)
+        skipped = 0
+        if resume:
+            rows_done, last_id, offset = resume
+            for row in reader:
+                skipped += 1
+                if skipped == rows_done:
+                    break
+            if skipped != rows_done or (row.get('ID') or '') != last_id:
+                print(f"{checkpoint.name} does not match {path.name}, starting over")
+                return _restart(path, partial, checkpoint, translate_rows, fieldnames, delimiter, chunk_rows)
+            with open(partial, 'r+b') as f:
+                f.truncate(offset)
+            out = open(partial, 'a', encoding='utf-8', newline='')
+            ckpt = open(checkpoint, 'a', encoding='utf-8')
+            print(f"Resuming {path.name} after {rows_done} rows")
+        else:
+            out = open(partial, 'w', encoding='utf-8-sig', newline='')
+            ckpt = open(checkpoint, 'w', encoding='utf-8')
+            ckpt.write(stamp + '\n')
+        with out, ckpt:
+            writer = csv.DictWriter(out, delimiter=delimiter, fieldnames=fieldnames, restval='', extrasaction='ignore')
+            if not resume:
+                writer.writeheader()
+            done = skipped
+            chunk = []
+            for row in reader:
+                chunk.append(row)
+                if len(chunk) >= chunk_rows:
+                    done = _write_chunk(translate_rows, chunk, writer, out, ckpt, done)
+                    chunk = []
+            if chunk:
+                done = _write_chunk(translate_rows, chunk, writer, out, ckpt, done)
+    os.replace(partial, path)
+    os.unlink(checkpoint)
+    print(f"{path.name}: {done} rows written, {skipped} of them resumed from the checkpoint")
+    return done
+
+
+def _restart(path, partial, checkpoint, translate_rows, fieldnames, delimiter, chunk_rows):
+    for stale in (partial, checkpoint):
+        try:
+            os.unlink(stale)
+        except FileNotFoundError:
+            pass
+    return translate_csv(path, translate_rows, fieldnames, delimiter, chunk_rows)
+
+
+def _write_chunk(translate_rows, chunk, writer, out, ckpt, done):
+    rows = translate_rows(chunk)
+    writer.writerows(rows)
+    out.flush()
+    os.fsync(out.fileno())
+    done += len(rows)
+    ckpt.write(f"{done}\t{rows[-1].get('ID') or ''}\t{os.fstat(out.fileno()).st_size}\n")
+    ckpt.flush()
+    os.fsync(ckpt.fileno())
+    return done
+
+
+# ---------------------------------------------------------------------------
+# Backends
+# ---------------------------------------------------------------------------
+
+class Backend:
+    """One translation service for a language pair.
+
+    request(text) returns the translation of text, which is a single string,
+    or several joined by `delimiter` when max_batch_strings > 1 (up to
+    max_batch_chars as measured by batch_cost). Failures worth retrying are
+    raised as RetryableError, anything else is final for that string.
+    """
+    name = ''
+    max_batch_strings = 1
+    max_batch_chars = 0
+    delimiter = '\n'
+
+    def __init__(self, sl, tl):
+        self.sl = sl
+        self.tl = tl
+
+    def batch_cost(self, text):
+        return len(text)
+
+    def request(self, text):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class DeepTranslatorBackend(Backend):
+    """deep_translator's GoogleTranslator: scrapes translate.google.com/m, one
+    string per request, and brings its own requests.get (no shared session)."""
+    name = 'deep_translator.google'
+
+    def __init__(self, sl='auto', tl='ru', base_url=None):
+        super().__init__(sl, tl)
+        import requests
+        from deep_translator import GoogleTranslator
+        from deep_translator.exceptions import RequestError, TooManyRequests
+
+        self._translator_class = GoogleTranslator
+        self._retryable = (TooManyRequests, RequestError, requests.ConnectionError, requests.Timeout)
+        self.base_url = base_url
+        # GoogleTranslator keeps per-call state on the instance, so one per thread
+        self._local = threading.local()
+
+    def request(self, text):
+        translator = getattr(self._local, 'translator', None)
+        if translator is None:
+            translator = self._local.translator = self._translator_class(source=self.sl, target=self.tl)
+            if self.base_url:
+                translator._base_url = self.base_url
+        try:
+            return translator.translate(text)
+        except self._retryable as e:
+            raise RetryableError(f"{type(e).__name__}: {e}")
+
+
+class GoogleRestBackend(Backend):
+    """The translate_a/single JSON endpoint over keep-alive connections shared by
+    the worker threads. Batches are newline-joined; the URL-encoded q is kept
+    below max_batch_chars so the GET stays well inside the endpoint's limit."""
+    name = 'google.translate_a'
+    max_batch_strings = 50
+    max_batch_chars = 5000
+
+    def __init__(self, sl='en', tl='ru', url=GOOGLE_REST_URL, name=None, workers=WORKERS):
+        super().__init__(sl, tl)
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        self._requests = requests
+        self.url = url
+        if name:
+            self.name = name
+        self.session = requests.Session()
+        for prefix in ('https://', 'http://'):
+            self.session.mount(prefix, HTTPAdapter(pool_connections=1, pool_maxsize=workers))
+
+    def batch_cost(self, text):
+        return len(urllib.parse.quote(text))
+
+    def request(self, text):
+        params = {
+            'client': 'gtx',
+            'sl': self.sl,
+            'tl': self.tl,
+            'dt': 't',
+            'q': text
+        }
+        try:
+            resp = self.session.get(self.url, params=params, timeout=10)
+        except (self._requests.ConnectionError, self._requests.Timeout) as e:
+            raise RetryableError(str(e))
+        if resp.status_code == 429 or resp.status_code >= 500:
+            raise RetryableError(f"HTTP {resp.status_code}", retry_after_seconds(resp.headers.get('Retry-After')))
+        resp.raise_for_status()
+        data = resp.json()
+        return ''.join(chunk[0] for chunk in data[0])
+
+    def close(self):
+        self.session.close()
+
+
+BACKENDS = ('deep_translator', 'rest', 'standin')
+
+
+def make_backend(kind, sl, tl):
+    """Backend by name: 'deep_translator', 'rest' (Google's JSON endpoint) or
+    'standin' (the same protocol against STANDIN_URL, cached separately)."""
+    if kind == 'deep_translator':
+        return DeepTranslatorBackend(sl, tl)
+    if kind == 'rest':
+        return GoogleRestBackend(sl, tl)
+    if kind == 'standin':
+        return GoogleRestBackend(sl, tl, url=STANDIN_URL.rstrip('/') + '/translate_a/single', name='standin')
+    raise ValueError(f"unknown translation backend {kind!r}, expected one of {', '.join(BACKENDS)}")
+
+
+# ---------------------------------------------------------------------------
+# Pipeline
+# ---------------------------------------------------------------------------
+
+class Pipeline:
+    """Translate CSV rows through a backend.
+
+    columns is a list of (column, fallback column, segment kind) as for
+    split_segments. Each chunk's distinct segments are looked up in the
+    cache; misses are packed into batches if the backend takes them and sent
+    on `workers` threads within the token bucket. Batches whose reply does not
+    split back cleanly are re-sent one string per request. A string the
+    backend rejects stays untranslated and uncached. A RetryableError that
+    outlasts its retries (rate limit, ban, connection trouble) stops the run
+    before the chunk is checkpointed, so the next run resumes with it.
+    """
+
+    def __init__(self, backend, cache, columns, bucket=None, workers=WORKERS):
+        self.backend = backend
+        self.cache = cache
+        # sentence segments only pay off when they can share a request
+        self.columns = [(col, alt, 'whole' if kind == 'sentences' and backend.max_batch_strings <= 1 else kind)
+                        for col, alt, kind in columns]
+        self.bucket = bucket if bucket is not None else TokenBucket()
+        self.workers = workers
+        self.done = {}  # stripped text -> translation for the current chunk, including failures kept as-is
+        self.stats = dict.fromkeys(('segments', 'sent', 'requests', 'batches', 'batched', 'fallbacks', 'failed'), 0)
+        self.elapsed = 0.0
+        self._retries_at_start = retries_done
+
+    def _request(self, text):
+        """The backend's reply for text, or None if it rejected it for good;
+        RetryableError propagates once the retries are spent."""
+        try:
+            return call_with_retry(self.backend.request, text, bucket=self.bucket)
+        except RetryableError:
+            raise
+        except Exception:
+            return None
+
+    def _translate_one(self, text):
+        backend = self.backend
+        translated = self._request(text)
+        if translated is None:
+            self.done[text] = text  # not cached, retried on the next run
+            return False
+        self.cache.put(backend.name, backend.sl, backend.tl, text, translated)
+        self.done[text] = translated
+        return True
+
+    def _process(self, batch):
+        """Worker: returns (requests, strings translated in a batch, fell back, failed)."""
+        if len(batch) == 1:
+            return 1, 0, False, int(not self._translate_one(batch[0]))
+        backend = self.backend
+        reply = self._request(backend.delimiter.join(batch))
+        if reply is None:
+            for text in batch:
+                self.done[text] = text
+            return 1, 0, False, len(batch)
+        parts = reply.split(backend.delimiter)
+        if len(parts) != len(batch) or not all(p.strip() for p in parts):
+            # the reply does not split back into one non-empty line per input
+            failed = sum(not self._translate_one(text) for text in batch)
+            return len(batch) + 1, 0, True, failed
+        for text, translated in zip(batch, parts):
+            self.cache.put(backend.name, backend.sl, backend.tl, text, translated.strip())
+            self.done[text] = translated.strip()
+        return 1, len(batch), False, 0
+
+    def translate_all(self, texts):
+        """Translate every distinct non-cached string of texts."""
+        backend = self.backend
+        todo = []
+        for text in texts:
+            key = (text or '').strip()
+            if not key or key in self.done:
+                continue
+            self.done[key] = self.cache.get(backend.name, backend.sl, backend.tl, key)
+            if self.done[key] is None:
+                todo.append(key)
+        self.stats['sent'] += len(todo)
+        if not todo:
+            return
+        delimiter = backend.delimiter
+        if backend.max_batch_strings > 1:
+            # strings containing the delimiter would make the split ambiguous
+            batchable = [t for t in todo if delimiter not in t and '\r' not in t]
+            batches = list(pack_batches(batchable, backend.max_batch_chars, backend.max_batch_strings,
+                                        cost=backend.batch_cost, sep_cost=backend.batch_cost(delimiter)))
+            batches += [[t] for t in todo if delimiter in t or '\r' in t]
+        else:
+            batches = [[t] for t in todo]
+        started = time.perf_counter()
+        try:
+            results = map_concurrent(self._process, batches, self.workers)
+        except RetryableError:
+            self.stats['failed'] += sum(self.done.get(t) is None for t in todo)
+            raise
+        finally:
+            self.elapsed += time.perf_counter() - started
+        for requests_made, batched, fell_back, failed in results:
+            self.stats['requests'] += requests_made
+            self.stats['batched'] += batched
+            self.stats['batches'] += bool(batched)
+            self.stats['fallbacks'] += fell_back
+            self.stats['failed'] += failed
+
+    def translate(self, text):
+        """text translated, keeping its leading/trailing whitespace."""
+        if text is None:
+            return ''
+        key = text.strip()
+        if not key:
+            return text
+        if self.done.get(key) is None:
+            self.translate_all([key])
+        prefix = text[:len(text) - len(text.lstrip())]
+        suffix = text[len(text.rstrip()):]
+        return f"{prefix}{self.done[key]}{suffix}"
+
+    def translate_rows(self, rows):
+        cells = [[split_segments(row.get(col) or row.get(alt) or '', kind) for col, alt, kind in self.columns]
+                 for row in rows]
+        segments = [piece for row_cells in cells for pieces in row_cells for piece in pieces[::2] if piece.strip()]
+        self.stats['segments'] += len(segments)
+        self.translate_all(segments)
+        for row, row_cells in zip(rows, cells):
+            for (col, alt, kind), pieces in zip(self.columns, row_cells):
+                row[col] = join_segments(pieces, self.translate)
+        self.done.clear()  # the cache has them; keeps memory flat over large files
+        return rows
+
+    def run(self, path, fieldnames, delimiter=';', chunk_rows=CHUNK_ROWS):
+        """translate_csv with this pipeline: rows written, or None if it stopped
+        on a request that kept failing (rerun to resume from the checkpoint)."""
+        try:
+            return translate_csv(path, self.translate_rows, fieldnames, delimiter, chunk_rows)
+        except RetryableError as e:
+            print(f"{Path(path).name}: stopped, requests keep failing ({e}); "
+                  f"rerun to resume from the last checkpoint")
+            return None
+
+    def summary(self):
+        st = self.stats
+        rate = st['sent'] / self.elapsed if self.elapsed else 0.0
+        per_batch = st['batched'] / st['batches'] if st['batches'] else 0.0
+        return (f"{self.backend.name}: {st['segments']} segments, {st['sent']} sent for translation in "
+                f"{st['requests']} requests (+{retries_done - self._retries_at_start} retries), "
+                f"{self.elapsed:.1f}s ({rate:.1f} strings/s; {st['batches']} batches of {per_batch:.1f} strings on "
+                f"average, {st['fallbacks']} split back to single requests, {st['failed']} failed; "
+                f"{self.workers} workers, {self.bucket.rate:g} requests/s limit)")